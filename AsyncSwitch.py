@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+#
+# (C) 2019 Yoichi Tanibayashi
+#
+'''
+asyncio front-end for Switch and RotaryEncoder
+
+    async for event in switch_events([pin1, pin2], timeout_sec=[0.7, 1]):
+        event.print()
+
+    async for v in encoder_steps(pin_a, pin_b):
+        print(RotaryEncoder.val2str(v))
+
+    event = await wait_for_press(pin, timeout=5)
+
+The events are passed from SwitchWatcher (or SwitchHub) to the event
+loop by loop.call_soon_threadsafe(), without any listener thread.
+The watchers are stopped (joined) in the default executor, not in
+the event loop.
+'''
+from Switch import Switch, SwitchWatcher, SwitchHub
+from Switch import setup_GPIO, cleanup_GPIO
+from RotaryEncoder import RotaryEncoder
+from GpioBackend import get_backend
+import asyncio
+
+import click
+
+from logging import getLogger, StreamHandler, Formatter, DEBUG, INFO, WARN
+logger = getLogger(__name__)
+logger.setLevel(INFO)
+handler = StreamHandler()
+handler.setLevel(DEBUG)
+handler_fmt = Formatter(
+    '%(asctime)s %(levelname)s %(name)s.%(funcName)s> %(message)s',
+    datefmt='%H:%M:%S')
+handler.setFormatter(handler_fmt)
+logger.addHandler(handler)
+logger.propagate = False
+def init_logger(name, debug):
+    l = logger.getChild(name)
+    if debug:
+        l.setLevel(DEBUG)
+    else:
+        l.setLevel(INFO)
+    return l
+
+class LoopQueue:
+    '''
+    eventq for SwitchWatcher and SwitchHub
+
+    put() can be called from any thread, and the item is put to
+    the asyncio.Queue in the event loop.
+    '''
+    def __init__(self, loop):
+        self.loop = loop
+        self.q    = asyncio.Queue()
+
+    def put(self, item):
+        self.loop.call_soon_threadsafe(self.q.put_nowait, item)
+
+    async def get(self):
+        return await self.q.get()
+
+def _watch(switch, eventq, loop_interval, edge, hub, debug):
+    if hub:
+        return SwitchHub.get(debug=debug).add(switch, eventq, loop_interval)
+    return SwitchWatcher(switch, eventq, loop_interval, debug, edge=edge)
+
+async def switch_events(pins, timeout_sec=[0.7, 1, 3, 5, 7],
+                        loop_interval=0.02, edge=False, hub=False,
+                        debug=False):
+    '''
+    async iterator of SwitchEvent
+
+    edge, hub: see SwitchListener
+    '''
+    lg = init_logger('switch_events', debug)
+    lg.debug('pins=%s', pins)
+
+    gpio = get_backend()	# clock of ts_detect
+    loop = asyncio.get_running_loop()
+    eventq = LoopQueue(loop)
+    switch = [Switch(p, timeout_sec, debug=debug) for p in pins]
+    watcher = _watch(switch, eventq, loop_interval, edge, hub, debug)
+    try:
+        while True:
+            event = await eventq.get()
+            event.ts_dispatch = gpio.monotonic_ns()
+            yield event
+    finally:
+        lg.debug('stop')
+        await loop.run_in_executor(None, watcher.stop)
+
+async def encoder_steps(pin_a, pin_b, loop_interval=0.002, edge=False,
+                        hub=False, resolution=2, debug=False):
+    '''
+    async iterator of RotaryEncoder.CW|CCW
+
+    resolution: steps per detent (see RotaryEncoder.QuadratureDecoder)
+    '''
+    lg = init_logger('encoder_steps', debug)
+    lg.debug('pin_a=%d, pin_b=%d', pin_a, pin_b)
+
+    loop = asyncio.get_running_loop()
+    valq = LoopQueue(loop)
+    rotenc = RotaryEncoder([pin_a, pin_b], valq, loop_interval, debug,
+                           hub=hub, edge=edge, resolution=resolution)
+    try:
+        # ignore initial input (same as RotaryEncoderListener)
+        await asyncio.sleep(0.1)
+        while not valq.q.empty():
+            valq.q.get_nowait()
+
+        while True:
+            yield await valq.get()
+    finally:
+        lg.debug('stop')
+        await loop.run_in_executor(None, rotenc.stop)
+
+async def wait_for_press(pin, timeout=None, loop_interval=0.02, edge=False,
+                         hub=False, debug=False):
+    '''
+    wait until the switch is pressed
+
+    return: SwitchEvent('pressed'), or None if timeout(sec)
+    '''
+    events = switch_events([pin], timeout_sec=[],
+                           loop_interval=loop_interval, edge=edge, hub=hub,
+                           debug=debug)
+
+    async def _wait():
+        async for event in events:
+            if event.name == 'pressed':
+                return event
+
+    try:
+        return await asyncio.wait_for(_wait(), timeout)
+    except asyncio.TimeoutError:
+        return None
+    finally:
+        await events.aclose()
+
+#####
+class app:
+    def __init__(self, pin, debug=False):
+        self.debug = debug
+        self.logger = init_logger(__class__.__name__, debug)
+        self.logger.debug('pin=%s', pin)
+
+        self.pin_re = pin[0:2]
+        self.pin_sw = pin[2]
+
+    async def main(self):
+        print('### wait_for_press(%d, 10)' % self.pin_sw)
+        event = await wait_for_press(self.pin_sw, 10, debug=self.debug)
+        if event is None:
+            print('timeout')
+        else:
+            event.print()
+
+        print('### encoder_steps + switch_events (long press to exit)')
+        await asyncio.gather(self.rotate(), self.switch())
+
+    async def rotate(self):
+        self.task_re = asyncio.current_task()
+        try:
+            async for v in encoder_steps(self.pin_re[0], self.pin_re[1],
+                                         debug=self.debug):
+                print(RotaryEncoder.val2str(v))
+        except asyncio.CancelledError:
+            pass
+
+    async def switch(self):
+        async for event in switch_events([self.pin_sw], debug=self.debug):
+            event.print()
+            if event.longpress_level() > 0:
+                self.task_re.cancel()
+                break
+
+#####
+CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
+@click.command(context_settings=CONTEXT_SETTINGS)
+@click.argument('pin', metavar='pin1 pin2 pin_sw', type=int, nargs=3)
+@click.option('--debug', '-d', 'debug', is_flag=True, default=False,
+              help='debug flag')
+def main(pin, debug):
+    logger.setLevel(INFO)
+    if debug:
+        logger.setLevel(DEBUG)
+
+    setup_GPIO()
+    try:
+        asyncio.run(app(pin, debug=debug).main())
+    finally:
+        cleanup_GPIO()
+
+if __name__ == '__main__':
+    main()
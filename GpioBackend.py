@@ -0,0 +1,535 @@
+#!/usr/bin/env python3
+#
+# (C) 2019 Yoichi Tanibayashi
+#
+'''
+GPIO backends
+
+Switch, SwitchWatcher, RotaryEncoder, Led .. use GPIO, the clock and
+their threads only through the backend (get_backend()).
+
+  RPiGpioBackend: RPi.GPIO, time.monotonic_ns(), time.sleep() and
+                  real threads
+  SimGpioBackend: simulated pins and a virtual clock. Nothing runs in
+                  threads: the loops are called as tasks (step(now))
+                  in virtual time, so scripted input waveforms run
+                  much faster than real time.
+
+    gpio = set_backend('sim')
+    sw = Switch(17)
+    sl = SwitchListener([sw], cb)
+    gpio.waveform(17, press_wave(2.0))    # 2 sec long press
+    gpio.run(10)                          # 10 sec (virtual)
+
+interface:
+    init(), cleanup()
+    setup(pin, mode, pull_up_down=None)
+    input(pin), output(pin, val)
+    output_bits(set_mask, clear_mask)
+                                  output many pins at once
+                                  (bit n = pin n)
+    add_event_detect(pin, cb)     cb(pin) on both edges
+    remove_event_detect(pin)
+    monotonic_ns(), sleep(sec)
+    spawn(obj), join(obj)         run obj.run() (thread) or obj.step()
+    wake(obj)                     simulator: call obj.step() now
+                                  (threads wake up by themselves)
+    pwm(pin, freq)                PWM output: duty(d) (0.0 .. 1.0),
+                                  stop(). None if the backend has no
+                                  PWM (see Led.SoftPwm)
+    spi(bus, dev, speed_hz)       SPI output: write(buf) (one bulk
+                                  transfer), close()
+'''
+import heapq
+import time
+
+import click
+
+from logging import getLogger, StreamHandler, Formatter, DEBUG, INFO, WARN
+logger = getLogger(__name__)
+logger.setLevel(INFO)
+handler = StreamHandler()
+handler.setLevel(DEBUG)
+handler_fmt = Formatter(
+    '%(asctime)s %(levelname)s %(name)s.%(funcName)s> %(message)s',
+    datefmt='%H:%M:%S')
+handler.setFormatter(handler_fmt)
+logger.addHandler(handler)
+logger.propagate = False
+def init_logger(name, debug):
+    l = logger.getChild(name)
+    if debug:
+        l.setLevel(DEBUG)
+    else:
+        l.setLevel(INFO)
+    return l
+
+class RPiPwm:
+    '''
+    GPIO.PWM (RPi.GPIO)
+    '''
+    def __init__(self, GPIO, pin, freq):
+        self.p = GPIO.PWM(pin, freq)
+        self.p.start(0)
+
+    def duty(self, d):
+        self.p.ChangeDutyCycle(d * 100)
+
+    def stop(self):
+        self.p.stop()
+
+class PigpioHwPwm:
+    '''
+    hardware PWM of the pigpio daemon (GPIO 12, 13, 18, 19)
+    '''
+    def __init__(self, pi, pin, freq):
+        self.pi   = pi
+        self.pin  = pin
+        self.freq = freq
+        self.duty(0)
+
+    def duty(self, d):
+        self.pi.hardware_PWM(self.pin, self.freq, int(d * 1000000))
+
+    def stop(self):
+        self.pi.hardware_PWM(self.pin, 0, 0)	# the connection is shared
+
+class SpidevSpi:
+    '''
+    SPI with spidev (/dev/spidev<bus>.<dev>)
+
+    write() sends at most bufsiz bytes (parameter of the spidev kernel
+    module, default 4096). spidev would split a longer buffer into
+    several transfers, and the gap between them latches a WS2812 strip
+    or a 74HC595 chain in the middle of the frame, so ValueError is
+    raised instead. Set a larger one with spidev.bufsiz=<bytes> in
+    /boot/cmdline.txt.
+    '''
+    BUFSIZ_PATH = '/sys/module/spidev/parameters/bufsiz'
+    BUFSIZ      = 4096
+
+    def __init__(self, bus, dev, speed_hz):
+        import spidev
+        self.spi = spidev.SpiDev()
+        self.spi.open(bus, dev)
+        self.spi.max_speed_hz = speed_hz
+        self.spi.mode = 0
+
+        self.bufsiz = self.BUFSIZ
+        try:
+            with open(self.BUFSIZ_PATH) as f:
+                self.bufsiz = int(f.read())
+        except (OSError, ValueError):
+            pass
+
+    def write(self, buf):
+        if len(buf) > self.bufsiz:
+            raise ValueError('%d bytes: longer than spidev bufsiz %d'
+                             % (len(buf), self.bufsiz))
+        self.spi.writebytes2(buf)	# buffer protocol (no list)
+
+    def close(self):
+        self.spi.close()
+
+class SimSpi:
+    '''
+    stand-in SPI device: the written bytes are captured
+
+    frames: [(ns, bytes), ..]
+    '''
+    def __init__(self, gpio, bus, dev, speed_hz):
+        self.gpio     = gpio
+        self.bus      = bus
+        self.dev      = dev
+        self.speed_hz = speed_hz
+        self.frames   = []
+
+    def write(self, buf):
+        self.frames.append((self.gpio.monotonic_ns(), bytes(buf)))
+
+    def close(self):
+        pass
+
+class RPiGpioBackend:
+    '''
+    RPi.GPIO and real time
+
+    pwm(): pigpio hardware PWM on HW_PWM_PINS if the pigpio daemon is
+           running, else GPIO.PWM
+    output_bits(): the set/clear registers of the pigpio daemon
+                   (set_bank_1(), clear_bank_1()) if it is running,
+                   else one GPIO.output(pins, values) call
+    pigpio(): the one connection to the pigpio daemon of the backend
+    '''
+    NAME = 'RPi.GPIO'
+
+    IN       = 1
+    OUT      = 0
+    LOW      = 0
+    HIGH     = 1
+    PUD_OFF  = 20
+    PUD_DOWN = 21
+    PUD_UP   = 22
+
+    HW_PWM_PINS = (12, 13, 18, 19)
+
+    def __init__(self, debug=False):
+        self.logger = init_logger(__class__.__name__, debug)
+        self.logger.debug('')
+
+        import RPi.GPIO as GPIO
+        self.GPIO = GPIO
+
+        self.IN       = GPIO.IN
+        self.OUT      = GPIO.OUT
+        self.PUD_OFF  = GPIO.PUD_OFF
+        self.PUD_DOWN = GPIO.PUD_DOWN
+        self.PUD_UP   = GPIO.PUD_UP
+
+        self.pi = None	# pigpio (see pigpio()), False: not available
+
+    def init(self):
+        self.GPIO.setwarnings(False)
+        self.GPIO.setmode(self.GPIO.BCM)
+
+    def cleanup(self):
+        self.GPIO.cleanup()
+        if self.pi:
+            self.pi.stop()
+        self.pi = None
+
+    def setup(self, pin, mode, pull_up_down=None):
+        if pull_up_down is None:
+            self.GPIO.setup(pin, mode)
+        else:
+            self.GPIO.setup(pin, mode, pull_up_down=pull_up_down)
+
+    def input(self, pin):
+        return self.GPIO.input(pin)
+
+    def output(self, pin, val):
+        self.GPIO.output(pin, val)
+
+    def pigpio(self):
+        '''
+        return: the connection to the pigpio daemon (one per backend),
+                or None (not installed, or the daemon is not running)
+        '''
+        if self.pi is None:
+            self.pi = False
+            try:
+                import pigpio
+                pi = pigpio.pi()
+                if pi.connected:
+                    self.pi = pi
+                else:
+                    pi.stop()
+            except (ImportError, AttributeError):
+                pass	# AttributeError: pigpio/ of this repository
+
+        return self.pi or None
+
+    def output_bits(self, set_mask, clear_mask):
+        pi = self.pigpio()
+        if pi is not None:
+            if set_mask:
+                pi.set_bank_1(set_mask)
+            if clear_mask:
+                pi.clear_bank_1(clear_mask)
+            return
+
+        pins = []
+        vals = []
+        for mask, val in [(set_mask, self.HIGH), (clear_mask, self.LOW)]:
+            while mask:
+                b = mask & -mask
+                pins.append(b.bit_length() - 1)
+                vals.append(val)
+                mask ^= b
+        if len(pins) > 0:
+            self.GPIO.output(pins, vals)
+
+    def add_event_detect(self, pin, cb):
+        self.GPIO.add_event_detect(pin, self.GPIO.BOTH, callback=cb)
+
+    def remove_event_detect(self, pin):
+        self.GPIO.remove_event_detect(pin)
+
+    def monotonic_ns(self):
+        return time.monotonic_ns()
+
+    def sleep(self, sec):
+        time.sleep(sec)
+
+    def spawn(self, obj):
+        obj.start()
+
+    def join(self, obj):
+        obj.join()
+
+    def wake(self, obj):
+        pass
+
+    def pwm(self, pin, freq):
+        if pin in self.HW_PWM_PINS:
+            pi = self.pigpio()
+            if pi is not None:
+                return PigpioHwPwm(pi, pin, freq)
+
+        return RPiPwm(self.GPIO, pin, freq)
+
+    def spi(self, bus, dev, speed_hz):
+        return SpidevSpi(bus, dev, speed_hz)
+
+class SimGpioBackend(RPiGpioBackend):
+    '''
+    simulated pins and virtual clock
+
+    set_input(pin, level)   : change an input now (edge callbacks)
+    waveform(pin, steps)    : schedule [(sec, level), ..] from now
+                              (each level is held for sec)
+    call_later(sec, func)   : schedule func()
+    run(sec)                : advance the virtual clock by sec
+                              (run the scheduled inputs and the tasks)
+    history                 : [(ns, pin, val), ..] of output()
+    spi_dev                 : {(bus, dev): SimSpi} (captured bytes)
+
+    tasks (spawn(obj)): obj.step(now) is called at every time point
+    that something happens, and it returns the time(ns) to be called
+    next (None: only when something happens).
+    '''
+    NAME = 'sim'
+
+    def __init__(self, start_ns=1000000000, debug=False):
+        self.logger = init_logger(__class__.__name__, debug)
+        self.logger.debug('start_ns:%d', start_ns)
+
+        self.now     = start_ns
+        self.level   = {}	# pin -> level
+        self.mode    = {}	# pin -> IN|OUT
+        self.edge_cb = {}	# pin -> cb(pin)
+        self.history = []
+        self.sched   = []	# (ns, seq, func)
+        self.seq     = 0
+        self.task    = []	# [obj, wake_ns]
+        self.running = set()
+        self.spi_dev = {}	# (bus, dev) -> SimSpi
+
+    def init(self):
+        pass
+
+    def cleanup(self):
+        self.edge_cb = {}
+
+    def setup(self, pin, mode, pull_up_down=None):
+        self.mode[pin] = mode
+        if pin not in self.level:
+            self.level[pin] = 1 if pull_up_down == self.PUD_UP else 0
+
+    def input(self, pin):
+        return self.level.get(pin, 0)
+
+    def output(self, pin, val):
+        self.level[pin] = 1 if val else 0
+        self.history.append((self.now, pin, self.level[pin]))
+
+    def output_bits(self, set_mask, clear_mask):
+        for mask, val in [(set_mask, 1), (clear_mask, 0)]:
+            while mask:
+                b = mask & -mask
+                self.output(b.bit_length() - 1, val)
+                mask ^= b
+
+    def add_event_detect(self, pin, cb):
+        self.edge_cb[pin] = cb
+
+    def remove_event_detect(self, pin):
+        self.edge_cb.pop(pin, None)
+
+    def monotonic_ns(self):
+        return self.now
+
+    def sleep(self, sec):
+        self.run(sec)
+
+    def spawn(self, obj):
+        self.task.append([obj, self.now])
+
+    def join(self, obj):
+        self.task = [t for t in self.task if t[0] is not obj]
+
+    def pwm(self, pin, freq):
+        return None
+
+    def spi(self, bus, dev, speed_hz):
+        self.spi_dev[(bus, dev)] = SimSpi(self, bus, dev, speed_hz)
+        return self.spi_dev[(bus, dev)]
+
+    def wake(self, obj):
+        for t in self.task:
+            if t[0] is obj:
+                t[1] = self.now
+
+    def set_input(self, pin, level):
+        if self.level.get(pin) == level:
+            return
+        self.level[pin] = level
+        cb = self.edge_cb.get(pin)
+        if cb is not None:
+            cb(pin)
+        for t in self.task:	# 全タスクを起こす
+            t[1] = self.now
+
+    def call_at(self, ns, func):
+        self.seq += 1
+        heapq.heappush(self.sched, (ns, self.seq, func))
+
+    def call_later(self, sec, func):
+        self.call_at(self.now + int(sec * 1000000000), func)
+
+    def waveform(self, pin, steps):
+        '''
+        steps: [(sec, level), ..]
+        '''
+        t = self.now
+        for sec, level in steps:
+            self.call_at(t, lambda l=level: self.set_input(pin, l))
+            t += int(sec * 1000000000)
+        return t
+
+    def run(self, sec):
+        self.run_until(self.now + int(sec * 1000000000))
+
+    def run_until(self, end_ns):
+        while True:
+            while self.due():
+                while len(self.sched) > 0 and self.sched[0][0] <= self.now:
+                    heapq.heappop(self.sched)[2]()
+                self.run_tasks()
+
+            t = [w for o, w in self.task
+                 if w is not None and o not in self.running]
+            if len(self.sched) > 0:
+                t.append(self.sched[0][0])
+            if len(t) == 0 or min(t) > end_ns:
+                break
+            self.now = max(min(t), self.now)
+        self.now = max(end_ns, self.now)
+
+    def due(self):
+        if len(self.sched) > 0 and self.sched[0][0] <= self.now:
+            return True
+        for o, w in self.task:
+            if w is not None and w <= self.now and o not in self.running:
+                return True
+        return False
+
+    def run_tasks(self):
+        '''
+        call the tasks that are due, and the tasks waiting for
+        something to happen (wake: None), in the order of spawn()
+        '''
+        for t in list(self.task):
+            obj, wake = t
+            if wake is not None and wake > self.now:
+                continue
+            if obj in self.running:
+                continue
+            self.running.add(obj)
+            try:
+                t[1] = obj.step(self.now)
+            finally:
+                self.running.discard(obj)
+
+def press_wave(hold_sec, bounce=3, bounce_sec=0.001, release_sec=0.5):
+    '''
+    steps of a switch press (pull-up: ON = 0) with bounces
+    '''
+    steps = []
+    for i in range(bounce):
+        steps += [(bounce_sec, 0), (bounce_sec, 1)]
+    steps.append((hold_sec, 0))
+    for i in range(bounce):
+        steps += [(bounce_sec, 1), (bounce_sec, 0)]
+    steps.append((release_sec, 1))
+    return steps
+
+def quadrature_wave(n, period_sec=0.01):
+    '''
+    steps of the 2 pins for n detents (n < 0: the other direction)
+
+    return: (steps_a, steps_b)
+    '''
+    seq = [(1, 1), (0, 1), (0, 0), (1, 0)]
+    if n < 0:
+        seq = [(1, 1), (1, 0), (0, 0), (0, 1)]
+    dt = period_sec / 4
+    steps_a, steps_b = [], []
+    for i in range(abs(n)):
+        for a, b in seq[1:] + seq[:1]:
+            steps_a.append((dt, a))
+            steps_b.append((dt, b))
+    return steps_a, steps_b
+
+BACKEND = {
+    RPiGpioBackend.NAME: RPiGpioBackend,
+    SimGpioBackend.NAME: SimGpioBackend
+}
+
+_backend = None
+
+def set_backend(name, debug=False):
+    '''
+    name: 'RPi.GPIO' | 'sim' | backend object
+
+    return: the backend
+    '''
+    global _backend
+    if isinstance(name, str):
+        name = BACKEND[name](debug=debug)
+    _backend = name
+    return _backend
+
+def get_backend():
+    '''
+    the current backend (default: RPi.GPIO)
+    '''
+    if _backend is None:
+        set_backend(RPiGpioBackend.NAME)
+    return _backend
+
+#####
+CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
+@click.command(context_settings=CONTEXT_SETTINGS)
+@click.option('--sec', '-s', 'sec', type=float, default=60,
+              help='virtual seconds')
+@click.option('--debug', '-d', 'debug', is_flag=True, default=False,
+              help='debug flag')
+def main(sec, debug):
+    '''long-press a simulated switch every 8 sec'''
+    logger.setLevel(INFO)
+    if debug:
+        logger.setLevel(DEBUG)
+
+    # the backend of the imported module (not __main__)
+    import GpioBackend
+    from Switch import Switch, SwitchListener
+
+    gpio = GpioBackend.set_backend(SimGpioBackend.NAME, debug=debug)
+    events = []
+    sw = Switch(17, debug=debug)
+    sl = SwitchListener([sw], events.append, debug=debug)
+
+    t1 = time.perf_counter()
+    end_ns = gpio.now + int(sec * 1000000000)
+    while gpio.now < end_ns:
+        gpio.waveform(17, press_wave(7.5))
+        gpio.run(8)
+    t_real = time.perf_counter() - t1
+    sl.stop()
+
+    print('%d events in %.1f virtual sec, %.3f real sec (x%.0f)' %
+          (len(events), sec, t_real, sec / t_real))
+
+if __name__ == '__main__':
+    main()
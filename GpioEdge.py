@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+#
+# (C) 2019 Yoichi Tanibayashi
+#
+'''
+Edge sources for the edge mode
+
+  RPiGpioEdgeSource : GPIO.add_event_detect() callbacks (RPi.GPIO)
+                      timestamp: monotonic_ns() in the callback
+                      (through the backend, see GpioBackend.py)
+  GpioChipEdgeSource: GPIO character device (/dev/gpiochipN)
+                      line events are read with poll(), and the kernel
+                      timestamps (CLOCK_MONOTONIC, Linux 5.7 or later)
+                      are used
+
+    src = get_edge_source('chardev', pins)
+    for pin, ts in src.wait(timeout_sec):
+        ...
+    level = src.level(pin)
+    src.close()
+'''
+from GpioBackend import get_backend
+import select
+import struct
+import fcntl
+import queue
+import os
+
+import click
+
+from logging import getLogger, StreamHandler, Formatter, DEBUG, INFO, WARN
+logger = getLogger(__name__)
+logger.setLevel(INFO)
+handler = StreamHandler()
+handler.setLevel(DEBUG)
+handler_fmt = Formatter(
+    '%(asctime)s %(levelname)s %(name)s.%(funcName)s> %(message)s',
+    datefmt='%H:%M:%S')
+handler.setFormatter(handler_fmt)
+logger.addHandler(handler)
+logger.propagate = False
+def init_logger(name, debug):
+    l = logger.getChild(name)
+    if debug:
+        l.setLevel(DEBUG)
+    else:
+        l.setLevel(INFO)
+    return l
+
+class RPiGpioEdgeSource:
+    '''
+    RPi.GPIO edge detection
+
+    wait(timeout_sec): [(pin, ts), ..] ... [] if timeout or wake()
+    level(pin)       : input level
+    wake()           : wake up wait() (from another thread)
+    '''
+    NAME = 'RPi.GPIO'
+
+    def __init__(self, pins, debug=False):
+        self.logger = init_logger(__class__.__name__, debug)
+        self.logger.debug('pins:%s', pins)
+
+        self.gpio  = get_backend()
+        self.pins  = pins
+        self.edgeq = queue.Queue()
+        for p in self.pins:
+            self.gpio.add_event_detect(p, self.cb_edge)
+
+    def cb_edge(self, pin):
+        self.edgeq.put((pin, self.gpio.monotonic_ns()))
+
+    def wait(self, timeout_sec=None):
+        edges = []
+        try:
+            edge = self.edgeq.get(timeout=timeout_sec)
+            while edge is not None:
+                edges.append(edge)
+                edge = self.edgeq.get_nowait()
+        except queue.Empty:
+            pass
+        return edges
+
+    def level(self, pin):
+        return self.gpio.input(pin)
+
+    def wake(self):
+        self.edgeq.put(None)
+
+    def close(self):
+        self.logger.debug('')
+        for p in self.pins:
+            self.gpio.remove_event_detect(p)
+
+class GpioLineEvent:
+    '''
+    line event fd of the GPIO character device (uAPI v1)
+
+    read()     : [(ts, level), ..] ... ts: kernel timestamp(ns)
+    get_value(): current level
+    '''
+    # linux/gpio.h
+    GPIOHANDLE_REQUEST_INPUT         = 1 << 0
+    GPIOHANDLE_REQUEST_BIAS_PULL_UP  = 1 << 5
+    GPIOEVENT_REQUEST_BOTH_EDGES     = 0x03
+    GPIOEVENT_EVENT_RISING_EDGE      = 0x01
+    GPIO_GET_LINEEVENT_IOCTL         = 0xC030B404
+    GPIOHANDLE_GET_LINE_VALUES_IOCTL = 0xC040B408
+
+    REQUEST_FMT = '=III32si'	# struct gpioevent_request
+    EVENT_FMT   = '=QI4x'	# struct gpioevent_data
+    EVENT_SIZE  = struct.calcsize(EVENT_FMT)
+    READ_EVENTS = 64
+
+    @classmethod
+    def request(cls, chip_fd, pin, pull_up=True, label='LedSwitch'):
+        flags = cls.GPIOHANDLE_REQUEST_INPUT
+        if pull_up:
+            flags |= cls.GPIOHANDLE_REQUEST_BIAS_PULL_UP
+
+        req = bytearray(struct.pack(cls.REQUEST_FMT, pin, flags,
+                                    cls.GPIOEVENT_REQUEST_BOTH_EDGES,
+                                    label.encode(), 0))
+        fcntl.ioctl(chip_fd, cls.GPIO_GET_LINEEVENT_IOCTL, req, True)
+        fd = struct.unpack(cls.REQUEST_FMT, req)[4]
+        return cls(pin, fd)
+
+    def __init__(self, pin, fd):
+        '''
+        fd: line event fd (or any fd that gives gpioevent_data records)
+        '''
+        self.pin = pin
+        self.fd  = fd
+
+    def fileno(self):
+        return self.fd
+
+    def read(self):
+        data = os.read(self.fd, self.EVENT_SIZE * self.READ_EVENTS)
+        n = len(data) - len(data) % self.EVENT_SIZE
+        return [(ts, 1 if ev_id == self.GPIOEVENT_EVENT_RISING_EDGE else 0)
+                for ts, ev_id in struct.iter_unpack(self.EVENT_FMT,
+                                                    data[:n])]
+
+    def get_value(self):
+        data = bytearray(64)
+        fcntl.ioctl(self.fd, self.GPIOHANDLE_GET_LINE_VALUES_IOCTL, data,
+                    True)
+        return data[0]
+
+    def close(self):
+        os.close(self.fd)
+
+class GpioChipEdgeSource:
+    '''
+    GPIO character device: poll() on the line event fds
+
+    wait(timeout_sec): [(pin, ts), ..] ... [] if timeout or wake()
+    level(pin)       : current level of the line
+    wake()           : wake up wait() (from another thread)
+    '''
+    NAME = 'chardev'
+
+    def __init__(self, pins, chip='/dev/gpiochip0', pull_up=True,
+                 lines=None, debug=False):
+        '''
+        lines: GpioLineEvent list (instead of requesting pins on chip)
+        '''
+        self.logger = init_logger(__class__.__name__, debug)
+        self.logger.debug('pins:%s, chip:%s', pins, chip)
+
+        if lines is None:
+            chip_fd = os.open(chip, os.O_RDWR)
+            try:
+                lines = [GpioLineEvent.request(chip_fd, p, pull_up)
+                         for p in pins]
+            finally:
+                os.close(chip_fd)
+
+        self.line   = {l.fd: l for l in lines}
+        self.line_p = {l.pin: l for l in lines}
+        self.last   = {}	# pin -> last level (from the events)
+
+        self.wake_r, self.wake_w = os.pipe()
+        self.poll = select.poll()
+        self.poll.register(self.wake_r, select.POLLIN)
+        for fd in self.line:
+            self.poll.register(fd, select.POLLIN | select.POLLPRI)
+
+    def wait(self, timeout_sec=None):
+        timeout_ms = None
+        if timeout_sec is not None:
+            timeout_ms = max(timeout_sec * 1000, 0)
+
+        edges = []
+        for fd, ev in self.poll.poll(timeout_ms):
+            if fd == self.wake_r:
+                os.read(self.wake_r, 64)
+                continue
+
+            line = self.line[fd]
+            for ts, lv in line.read():
+                edges.append((line.pin, ts))
+                self.last[line.pin] = lv
+        return edges
+
+    def level(self, pin):
+        try:
+            return self.line_p[pin].get_value()
+        except OSError:
+            # not a real line (e.g. pipe): level of the last event
+            return self.last.get(pin, 1)
+
+    def wake(self):
+        os.write(self.wake_w, b'w')
+
+    def close(self):
+        self.logger.debug('')
+        for l in self.line.values():
+            l.close()
+        os.close(self.wake_r)
+        os.close(self.wake_w)
+
+EDGE_SOURCE = {
+    RPiGpioEdgeSource.NAME:  RPiGpioEdgeSource,
+    GpioChipEdgeSource.NAME: GpioChipEdgeSource
+}
+
+def get_edge_source(name, pins, debug=False):
+    '''
+    name: 'RPi.GPIO' | 'chardev' | True (= 'RPi.GPIO') | edge source object
+    '''
+    if name is True:
+        name = RPiGpioEdgeSource.NAME
+    if not isinstance(name, str):
+        return name
+    return EDGE_SOURCE[name](pins, debug=debug)
+
+#####
+CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
+@click.command(context_settings=CONTEXT_SETTINGS)
+@click.argument('pin', metavar='<pin>', type=int, nargs=-1)
+@click.option('--source', '-s', 'source', type=click.Choice(EDGE_SOURCE),
+              default=GpioChipEdgeSource.NAME, help='edge source')
+@click.option('--debug', '-d', 'debug', is_flag=True, default=False,
+              help='debug flag')
+def main(pin, source, debug):
+    '''print edges'''
+    logger.setLevel(INFO)
+    if debug:
+        logger.setLevel(DEBUG)
+
+    gpio = get_backend()
+    gpio.init()
+    for p in pin:
+        gpio.setup(p, gpio.IN, pull_up_down=gpio.PUD_UP)
+
+    src = get_edge_source(source, pin, debug=debug)
+    try:
+        while True:
+            for p, ts in src.wait():
+                print('%.6f %d: %d' % (ts / 1000000000, p, src.level(p)))
+    finally:
+        src.close()
+        gpio.cleanup()
+
+if __name__ == '__main__':
+    main()
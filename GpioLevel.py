@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+#
+# (C) 2019 Yoichi Tanibayashi
+#
+'''
+Read the levels of many GPIO pins at once
+
+read() returns a bitmask of the input levels (bit n = GPIO n).
+
+  GpioLevelReader: GPIO.input() for each pin (RPi.GPIO, fallback)
+  GpioMemReader  : one read of the GPLEV0 register through /dev/gpiomem
+                   (BCM2835/6/7/2711: GPIO0-31)
+
+    reader = get_reader('gpiomem', pins)
+    bits = reader.read()
+'''
+from GpioBackend import get_backend
+import mmap
+import os
+import time
+
+import click
+
+from logging import getLogger, StreamHandler, Formatter, DEBUG, INFO, WARN
+logger = getLogger(__name__)
+logger.setLevel(INFO)
+handler = StreamHandler()
+handler.setLevel(DEBUG)
+handler_fmt = Formatter(
+    '%(asctime)s %(levelname)s %(name)s.%(funcName)s> %(message)s',
+    datefmt='%H:%M:%S')
+handler.setFormatter(handler_fmt)
+logger.addHandler(handler)
+logger.propagate = False
+def init_logger(name, debug):
+    l = logger.getChild(name)
+    if debug:
+        l.setLevel(DEBUG)
+    else:
+        l.setLevel(INFO)
+    return l
+
+class GpioLevelReader:
+    '''
+    RPi.GPIO: one GPIO.input() call per pin (through the backend)
+    '''
+    NAME = 'RPi.GPIO'
+
+    def __init__(self, pins, debug=False):
+        self.logger = init_logger(__class__.__name__, debug)
+        self.logger.debug('pins:%s', pins)
+
+        self.gpio = get_backend()
+        self.pins = pins
+
+    def read(self):
+        bits = 0
+        for p in self.pins:
+            if self.gpio.input(p):
+                bits |= 1 << p
+        return bits
+
+class GpioMemReader(GpioLevelReader):
+    '''
+    /dev/gpiomem: GPLEV0 register (one read for GPIO0-31)
+
+    The pins must be set up as inputs (GPIO.setup()) beforehand.
+    '''
+    NAME = 'gpiomem'
+
+    GPLEV0   = 0x34
+    MAP_SIZE = 4096
+
+    def __init__(self, pins, path='/dev/gpiomem', debug=False):
+        super().__init__(pins, debug=debug)
+        self.logger = init_logger(__class__.__name__, debug)
+        self.logger.debug('path:%s', path)
+
+        for p in pins:
+            if p >= 32:
+                raise ValueError('pin %d: only GPIO0-31 in GPLEV0' % p)
+
+        fd = os.open(path, os.O_RDWR | os.O_SYNC)
+        try:
+            self.mem = mmap.mmap(fd, self.MAP_SIZE, mmap.MAP_SHARED,
+                                 mmap.PROT_READ | mmap.PROT_WRITE)
+        finally:
+            os.close(fd)
+
+        # 32bit word view of the registers
+        self.reg = memoryview(self.mem).cast('I')
+        self.lev = self.GPLEV0 // 4
+
+    def read(self):
+        return self.reg[self.lev]
+
+READER = {
+    GpioLevelReader.NAME: GpioLevelReader,
+    GpioMemReader.NAME:   GpioMemReader
+}
+
+def get_reader(name, pins, debug=False):
+    '''
+    name: 'gpiomem' | 'RPi.GPIO' | reader object | None
+
+    return: reader object, or None if name is None.
+            falls back to GpioLevelReader, if the reader is not
+            available on this system.
+    '''
+    if name is None or not isinstance(name, str):
+        return name
+
+    try:
+        return READER[name](pins, debug=debug)
+    except (OSError, ValueError) as e:
+        logger.warning('%s: %s: fall back to %s',
+                       name, e, GpioLevelReader.NAME)
+        return GpioLevelReader(pins, debug=debug)
+
+#####
+CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
+@click.command(context_settings=CONTEXT_SETTINGS)
+@click.argument('pin', metavar='<pin>', type=int, nargs=-1)
+@click.option('--count', '-n', 'n', type=int, default=10000,
+              help='number of reads')
+@click.option('--debug', '-d', 'debug', is_flag=True, default=False,
+              help='debug flag')
+def main(pin, n, debug):
+    '''read time of each reader'''
+    logger.setLevel(INFO)
+    if debug:
+        logger.setLevel(DEBUG)
+
+    gpio = get_backend()
+    gpio.init()
+    try:
+        for p in pin:
+            gpio.setup(p, gpio.IN, pull_up_down=gpio.PUD_UP)
+
+        for name in READER:
+            reader = get_reader(name, pin, debug=debug)
+            t1 = time.perf_counter()
+            for i in range(n):
+                bits = reader.read()
+            t_read = (time.perf_counter() - t1) / n
+            print('%-10s %8.2f us/read  bits=%08X' %
+                  (reader.NAME, t_read * 1e6, bits))
+    finally:
+        gpio.cleanup()
+
+if __name__ == '__main__':
+    main()
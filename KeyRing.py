@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+#
+# (C) 2019 Yoichi Tanibayashi
+#
+'''
+Character ring for RotaryKey: pages and predictive entry
+
+The characters are grouped into pages (e.g. 'A-Z', 'a-z', '0-9').
+The ring that the knob walks through is:
+
+    [next chars] + [rest of the page] + [page markers] + [completions]
+     ^ index 0 (CW)                                       ^ index -1 (CCW)
+
+next chars : with a CharTrie, the likely next characters (from any
+             page) ranked first. Without a trie, none.
+completions: with a CharTrie, the most frequent words that start with
+             the current word, one detent CCW from the cursor.
+page marker: selecting it switches the page (no output).
+
+    ring = KeyRing(PAGES_ASCII, CharTrie(words))
+    ring.move(delta)
+    out = ring.select()     # characters to output ('' for a page)
+    ring.backspace(); ring.enter()
+'''
+import string
+
+import click
+
+from logging import getLogger, StreamHandler, Formatter, DEBUG, INFO, WARN
+logger = getLogger(__name__)
+logger.setLevel(INFO)
+handler = StreamHandler()
+handler.setLevel(DEBUG)
+handler_fmt = Formatter(
+    '%(asctime)s %(levelname)s %(name)s.%(funcName)s> %(message)s',
+    datefmt='%H:%M:%S')
+handler.setFormatter(handler_fmt)
+logger.addHandler(handler)
+logger.propagate = False
+def init_logger(name, debug):
+    l = logger.getChild(name)
+    if debug:
+        l.setLevel(DEBUG)
+    else:
+        l.setLevel(INFO)
+    return l
+
+PAGES_ASCII = {
+    'a-z': string.ascii_lowercase,
+    'A-Z': string.ascii_uppercase,
+    '0-9': string.digits,
+    'sym': ' _-.@!#$%&*+=/?:;,~^()[]{}<>|\'"`\\'
+}
+
+PAGES_KANA = {
+    'あ': 'あいうえおぁぃぅぇぉ',
+    'か': 'かきくけこがぎぐげご',
+    'さ': 'さしすせそざじずぜぞ',
+    'た': 'たちつてとだぢづでどっ',
+    'な': 'なにぬねの',
+    'は': 'はひふへほばびぶべぼぱぴぷぺぽ',
+    'ま': 'まみむめも',
+    'や': 'やゆよゃゅょ',
+    'ら': 'らりるれろ',
+    'わ': 'わをんー、。',
+    'カナ': 'アイウエオカキクケコサシスセソタチツテトナニヌネノ'
+           'ハヒフヘホマミムメモヤユヨラリルレロワヲンー'
+}
+
+class TrieNode:
+    __slots__ = ('child', 'count', 'end')
+
+    def __init__(self):
+        self.child = {}
+        self.count = 0	# words through this node
+        self.end   = 0	# words that end here
+
+class CharTrie:
+    '''
+    dictionary of words with frequencies
+
+    add(word, n=1)
+    next_chars(prefix): next characters, most likely first.
+                        the words that start with prefix, and then
+                        (back-off) the characters that follow the
+                        last character of prefix in any word
+    complete(prefix, k): up to k most frequent words that start with
+                         prefix (longer than prefix)
+    '''
+    def __init__(self, words=(), debug=False):
+        self.logger = init_logger(__class__.__name__, debug)
+
+        self.root   = TrieNode()
+        self.follow = {}	# ch -> {next ch: count} ('': word start)
+        self.cache  = {}
+        for w in words:
+            self.add(w)
+        self.logger.debug('words:%d', self.root.count)
+
+    def add(self, word, n=1):
+        node = self.root
+        node.count += n
+        for ch in word:
+            node = node.child.setdefault(ch, TrieNode())
+            node.count += n
+        node.end += n
+
+        prev = ''
+        for ch in word:
+            f = self.follow.setdefault(prev, {})
+            f[ch] = f.get(ch, 0) + n
+            prev = ch
+        self.cache = {}
+
+    def find(self, prefix):
+        node = self.root
+        for ch in prefix:
+            node = node.child.get(ch)
+            if node is None:
+                return None
+        return node
+
+    def next_chars(self, prefix):
+        key = (prefix, None)
+        if key in self.cache:
+            return self.cache[key]
+
+        chars = []
+        node = self.find(prefix)
+        if node is not None:
+            chars = sorted(node.child, key=lambda ch: -node.child[ch].count)
+
+        f = self.follow.get(prefix[-1:], {})
+        chars += [ch for ch in sorted(f, key=lambda ch: -f[ch])
+                  if ch not in chars]
+        self.cache[key] = chars
+        return chars
+
+    def complete(self, prefix, k=3):
+        key = (prefix, k)
+        if key in self.cache:
+            return self.cache[key]
+
+        node = self.find(prefix)
+        words = []
+        if node is not None:
+            stack = [(prefix, node)]
+            while len(stack) > 0:
+                w, nd = stack.pop()
+                if nd.end > 0 and len(w) > len(prefix):
+                    words.append((-nd.end, w))
+                for ch, c in nd.child.items():
+                    stack.append((w + ch, c))
+        words = [w for n, w in sorted(words)[:k]]
+        self.cache[key] = words
+        return words
+
+class KeyRing:
+    '''
+    pages     : {name: characters} (in order), or a string (one page)
+    trie      : CharTrie or None
+    n_complete: number of completions in the ring
+    sep       : a word ends with these characters (for the trie)
+
+    ring()        : entries [(kind, value), ..]
+                    kind: 'ch' | 'page' | 'word'
+    label(i=None) : text to show for the entry
+    move(delta)   : rotate the cursor
+    select(i=None): select the entry at the cursor (or i)
+                    return: characters to output ('' for a page)
+    backspace(), enter()
+    text          : characters entered since enter()
+    '''
+    PAGE_FMT = '<%s>'
+    WORD_FMT = '[%s]'
+
+    def __init__(self, pages, trie=None, n_complete=3, sep=' ',
+                 debug=False):
+        self.logger = init_logger(__class__.__name__, debug)
+
+        if isinstance(pages, str):
+            pages = {'': pages}
+        self.pages      = pages
+        self.page_name  = list(pages)
+        self.trie       = trie
+        self.n_complete = n_complete
+        self.sep        = sep
+
+        self.chars = set()
+        for chars in pages.values():
+            self.chars |= set(chars)
+
+        self.page  = self.page_name[0]
+        self.index = 0
+        self.text  = ''
+        self.entry = None	# cache of ring()
+        self.logger.debug('pages:%s', self.page_name)
+
+    def word(self):
+        '''
+        the current (last) word of text
+        '''
+        i = max([self.text.rfind(c) for c in self.sep] + [-1])
+        return self.text[i + 1:]
+
+    def ring(self):
+        if self.entry is not None:
+            return self.entry
+
+        nexts = []
+        words = []
+        if self.trie is not None:
+            w = self.word()
+            nexts = [c for c in self.trie.next_chars(w) if c in self.chars]
+            if len(w) > 0:
+                words = self.trie.complete(w, self.n_complete)
+
+        rest = [c for c in self.pages[self.page] if c not in nexts]
+        pages = [p for p in self.page_name if p != self.page]
+
+        self.entry = ([('ch', c) for c in nexts] +
+                      [('ch', c) for c in rest] +
+                      [('page', p) for p in pages] +
+                      [('word', w) for w in reversed(words)])
+        return self.entry
+
+    def label(self, i=None):
+        if i is None:
+            i = self.index
+        kind, val = self.ring()[i % len(self.ring())]
+        if kind == 'page':
+            return self.PAGE_FMT % val
+        if kind == 'word':
+            return self.WORD_FMT % val
+        return val
+
+    def move(self, delta):
+        self.index = (self.index + delta) % len(self.ring())
+        return self.label()
+
+    def select(self, i=None):
+        if i is None:
+            i = self.index
+        kind, val = self.ring()[i % len(self.ring())]
+
+        out = val
+        if kind == 'page':
+            self.page = val
+            out = ''
+        elif kind == 'word':
+            out = val[len(self.word()):]
+        self.logger.debug('%s:%s -> out=%a', kind, val, out)
+
+        self.text += out
+        self.update()
+        return out
+
+    def backspace(self):
+        self.text = self.text[:-1]
+        self.update()
+
+    def enter(self):
+        self.text = ''
+        self.update()
+
+    def update(self):
+        '''
+        rebuild the ring. With a trie, the ring is reordered, so the
+        cursor goes back to the most likely entry.
+        '''
+        self.entry = None
+        if self.trie is not None:
+            self.index = 0
+        else:
+            self.index %= len(self.ring())
+
+def ring_dist(i, j, n):
+    '''
+    detents from i to j on a ring of n entries
+    '''
+    d = (j - i) % n
+    return min(d, n - d)
+
+def load_words(path):
+    '''
+    one word per line: "word" or "word<TAB>count" ('#': comment)
+    '''
+    words = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if line == '' or line.startswith('#'):
+                continue
+            w, _, n = line.partition('\t')
+            words += [w] * (int(n) if n else 1)
+    return words
+
+#####
+CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
+@click.command(context_settings=CONTEXT_SETTINGS)
+@click.argument('prefix', type=str, default='')
+@click.option('--words', '-w', 'words', type=click.Path(exists=True),
+              default=None, help='word list')
+@click.option('--debug', '-d', 'debug', is_flag=True, default=False,
+              help='debug flag')
+def main(prefix, words, debug):
+    logger.setLevel(INFO)
+    if debug:
+        logger.setLevel(DEBUG)
+
+    trie = None
+    if words is not None:
+        trie = CharTrie(load_words(words), debug=debug)
+
+    ring = KeyRing(PAGES_ASCII, trie, debug=debug)
+    ring.text = prefix
+    ring.update()
+    n = len(ring.ring())
+    print(' '.join([ring.label(i) for i in range(-4, n - 4)]))
+
+if __name__ == '__main__':
+    main()
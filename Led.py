@@ -2,8 +2,11 @@
 #
 # (C) 2019 Yoichi Tanibayashi
 #
-import RPi.GPIO as GPIO
+from GpioBackend import get_backend
 import threading
+import heapq
+import bisect
+import math
 import time
 
 import click
@@ -19,6 +22,118 @@ handler.setFormatter(handler_fmt)
 logger.addHandler(handler)
 logger.propagate = False
 
+LEVEL_MAX = 255
+
+# brightness level (perceptual, 0 .. LEVEL_MAX) -> duty (0.0 .. 1.0)
+GAMMA       = 2.2
+GAMMA_TABLE = [(i / LEVEL_MAX) ** GAMMA for i in range(LEVEL_MAX + 1)]
+
+# one breath: level ratio (0 .. LEVEL_MAX) for BREATH_STEPS phases
+BREATH_STEPS = 256
+BREATH_TABLE = [round(LEVEL_MAX * (1 - math.cos(2 * math.pi * i /
+                                                BREATH_STEPS)) / 2)
+                for i in range(BREATH_STEPS)]
+
+class LedPattern:
+    '''
+    LED pattern compiled into a timing table
+
+    steps: [(level, sec), ..]  level: 0 .. LEVEL_MAX
+    (adjacent steps of the same level are merged, 0 sec steps are
+    dropped)
+
+    level[i] : level of step i
+    end[i]   : end of step i (ns from the start of the pattern)
+    total    : length of the pattern (ns)
+    pwm      : True if the pattern has levels other than 0 and LEVEL_MAX
+
+    LedPattern.morse(text, unit=0.1)
+    LedPattern.heartbeat(bpm=60)
+    LedPattern.blink(on_sec, off_sec)
+    '''
+    MORSE = {
+        'A': '.-',    'B': '-...',  'C': '-.-.',  'D': '-..',   'E': '.',
+        'F': '..-.',  'G': '--.',   'H': '....',  'I': '..',    'J': '.---',
+        'K': '-.-',   'L': '.-..',  'M': '--',    'N': '-.',    'O': '---',
+        'P': '.--.',  'Q': '--.-',  'R': '.-.',   'S': '...',   'T': '-',
+        'U': '..-',   'V': '...-',  'W': '.--',   'X': '-..-',  'Y': '-.--',
+        'Z': '--..',
+        '0': '-----', '1': '.----', '2': '..---', '3': '...--', '4': '....-',
+        '5': '.....', '6': '-....', '7': '--...', '8': '---..', '9': '----.',
+        '.': '.-.-.-', ',': '--..--', '?': '..--..', '/': '-..-.',
+        '-': '-....-', '=': '-...-',  '@': '.--.-.'
+    }
+
+    def __init__(self, steps):
+        self.level = []
+        self.end   = []
+        t = 0
+        for level, sec in steps:
+            level = min(max(int(level), 0), LEVEL_MAX)
+            ns = int(sec * 1000000000)
+            if ns <= 0:
+                continue
+            t += ns
+            if len(self.level) > 0 and self.level[-1] == level:
+                self.end[-1] = t
+                continue
+            self.level.append(level)
+            self.end.append(t)
+
+        if t == 0:
+            raise ValueError('empty pattern: %s' % (steps,))
+        self.total = t
+        self.pwm   = len([l for l in self.level
+                          if l not in (0, LEVEL_MAX)]) > 0
+
+    def __len__(self):
+        return len(self.level)
+
+    def __repr__(self):
+        return '<%s %d steps, %.3f sec>' % (__class__.__name__,
+                                            len(self), self.total / 1e9)
+
+    def step(self, t):
+        '''
+        t: ns from the start of the pattern (0 .. total - 1)
+
+        return: index of the step
+        '''
+        return bisect.bisect_right(self.end, t)
+
+    @classmethod
+    def blink(cls, on_sec=0.5, off_sec=0.5):
+        return cls([(LEVEL_MAX, on_sec), (0, off_sec)])
+
+    @classmethod
+    def morse(cls, text, unit=0.1):
+        '''
+        dot: 1 unit, dash: 3 units, between the marks: 1 unit,
+        between the letters: 3 units, between the words: 7 units
+        (the pattern ends with a 7 units gap, so it can be repeated)
+        '''
+        steps = []
+        for word in text.upper().split():
+            for ch in word:
+                code = cls.MORSE.get(ch)
+                if code is None:
+                    raise ValueError('%a: not in MORSE' % ch)
+                for mark in code:
+                    steps.append((LEVEL_MAX, unit * (1 if mark == '.' else 3)))
+                    steps.append((0, unit))
+                steps.append((0, unit * 2))
+            steps.append((0, unit * 4))
+        return cls(steps)
+
+    @classmethod
+    def heartbeat(cls, bpm=60, level=LEVEL_MAX):
+        '''
+        two beats (lub-dub) per period
+        '''
+        period = 60 / bpm
+        return cls([(level, 0.1), (0, 0.1), (level * 2 // 3, 0.1),
+                    (0, period - 0.3)])
+
 class SimpleLed:
     '''Primitive LED class
     '''
@@ -26,8 +141,9 @@ class SimpleLed:
         self.logger = logger.getChild(__class__.__name__)
         self.logger.debug('pin = %d', pin)
 
-        self.pin = pin
-        GPIO.setup(self.pin, GPIO.OUT)
+        self.gpio = get_backend()
+        self.pin  = pin
+        self.gpio.setup(self.pin, self.gpio.OUT)
 
         self.off()
 
@@ -48,69 +164,627 @@ class SimpleLed:
             
     def on(self):
         self.logger.debug('')
-        GPIO.output(self.pin, GPIO.HIGH)
+        self.gpio.output(self.pin, self.gpio.HIGH)
 
     def off(self):
         self.logger.debug('')
-        GPIO.output(self.pin, GPIO.LOW)
+        self.gpio.output(self.pin, self.gpio.LOW)
 
 class Led(SimpleLed):
     '''LED class
 
-    support blink
+    support blink, brightness, fade and breathe
+
+    The effects of all the Led objects are driven by one shared
+    thread (LedScheduler). The blink on/off times are on an absolute
+    grid (period = on_sec + off_sec, from the scheduler's epoch), so
+    they don't drift, and LEDs that share a period are phase-locked
+    (so are the breaths).
+
+    brightness(level)   : 0 .. LEVEL_MAX (perceptual, gamma corrected
+                          with GAMMA_TABLE)
+    fade_to(level, ms)  : fade from the current level
+    breathe(period_sec) : fade up and down (BREATH_TABLE)
+    play(pattern, repeat=1, cb=None)
+                        : play a LedPattern repeat times (None: forever)
+                          and call cb(led) when it's finished.
+                          The times of the steps are from the start
+                          of play() (absolute), so they don't drift.
+                          cb is called by the scheduler thread
+                          (don't block in cb).
+
+    The duty is output with the backend PWM (pwm()), or with the
+    shared software PWM (SoftPwm) if the backend has none.
+    The PWM is opened by the first brightness(), fade_to() or
+    breathe().
+
+    on(), off() and brightness() stop the running effect.
 
     IMPORTANT:
-    don't forget to off() after blink()
+    don't forget to off() after blink(), fade_to() and breathe()
 
     '''
-    def __init__(self, pin):
+    FRAME_SEC = 0.02	# fade and breathe
+
+    def __init__(self, pin, pwm_freq=200):
         self.logger = logger.getChild(__class__.__name__)
         self.logger.debug('pin = %d', pin)
 
-        self.on_sec  = None
-        self.off_sec = None
-        self.tmr     = None
+        self.on_sec   = None
+        self.off_sec  = None
+        self.on_ns    = 0
+        self.period   = 0
+        self.mode     = None	# 'blink' | 'fade' | 'breathe' | 'pattern'
+        self.level    = 0
+        self.pwm      = None
+        self.pwm_freq = pwm_freq
+        self.frame_ns = int(self.FRAME_SEC * 1000000000)
+        self.gen      = 0	# incremented on every effect and off()
+        self.sched    = LedScheduler.get()
         super().__init__(pin)
 
     def __exit__(self, ex_type, ex_value, trace):
         self.logger.debug('%s, %s, %s', ex_type, ex_value, trace)
         self.off()
+        if self.pwm is not None:
+            self.pwm.stop()
+            self.pwm = None
         
     def blink(self, on_sec=0.5, off_sec=0.5):
-        self.logger.debug('on_sec=%d, off_sec=%d', on_sec, off_sec)
+        self.logger.debug('on_sec=%s, off_sec=%s', on_sec, off_sec)
         
-        self.on_sec  = on_sec
-        self.off_sec = off_sec
+        with self.sched.cond:	# tick() reads them in the scheduler
+            self.on_sec  = on_sec
+            self.off_sec = off_sec
+            self.on_ns   = int(on_sec * 1000000000)
+            self.period  = self.on_ns + int(off_sec * 1000000000)
+
+            if self.on_ns <= 0:
+                self.off()
+                return
+            if self.on_ns >= self.period:
+                self.off()
+                self.on()
+                return
+
+            self.mode = 'blink'
+            self.sched.add(self)
 
-        self.off()
+    def on(self):
+        self.logger.debug('')
 
-        self._blink_on()
+        with self.sched.cond:	# stop blink(), fade_to(), play() ..
+            self.sched.remove(self)
+            self.mode = None
+        self.output(LEVEL_MAX)
 
     def off(self):
         self.logger.debug('')
 
-        if self.tmr:
-            try:
-                self.tmr.cancel()
-                self.tmr.join()
-            except Exception as e:
-                self.logger.warning('%s:%s', type(e), e)
-                
-        super().off()
+        with self.sched.cond:
+            self.sched.remove(self)
+            self.mode = None
+        self.output(0)
+
+    def brightness(self, level=None):
+        '''
+        level: 0 .. LEVEL_MAX, None: get the current level
+        '''
+        if level is None:
+            return self.level
+
+        self.logger.debug('level=%d', level)
+        with self.sched.cond:
+            self.sched.remove(self)
+            self.mode = None
+        self.open_pwm()
+        self.output(level)
+        return self.level
+
+    def fade_to(self, level, ms):
+        self.logger.debug('level=%d, ms=%d', level, ms)
+
+        self.open_pwm()
+        with self.sched.cond:
+            self.fade_from = self.level
+            self.fade_to_  = min(max(int(level), 0), LEVEL_MAX)
+            self.fade_t0   = self.gpio.monotonic_ns()
+            self.fade_ns   = int(ms * 1000000)
+            if self.fade_ns <= 0:
+                self.brightness(self.fade_to_)
+                return
+
+            self.mode = 'fade'
+            self.sched.add(self)
+
+    def breathe(self, period_sec=2.0, low=0, high=LEVEL_MAX):
+        self.logger.debug('period_sec=%s, low=%d, high=%d',
+                          period_sec, low, high)
+
+        self.open_pwm()
+        with self.sched.cond:
+            self.period = int(period_sec * 1000000000)
+            self.low    = low
+            self.high   = high
+            self.mode   = 'breathe'
+            self.sched.add(self)
+
+    def play(self, pattern, repeat=1, cb=None):
+        '''
+        pattern: LedPattern, or [(level, sec), ..]
+        repeat : None: forever
+        '''
+        if not isinstance(pattern, LedPattern):
+            pattern = LedPattern(pattern)
+        self.logger.debug('pattern=%s, repeat=%s', pattern, repeat)
+
+        if pattern.pwm:
+            self.open_pwm()
+        with self.sched.cond:
+            self.pattern   = pattern
+            self.repeat    = repeat
+            self.pat_cb    = cb
+            self.pat_t0    = self.gpio.monotonic_ns()
+            self.mode      = 'pattern'
+            self.sched.add(self)
+
+    def open_pwm(self):
+        if self.pwm is not None:
+            return
+
+        self.pwm = self.gpio.pwm(self.pin, self.pwm_freq)
+        if self.pwm is None:
+            self.pwm = SoftPwm.get().channel(self.pin)
+        self.logger.debug('pwm:%s', type(self.pwm).__name__)
+
+    def output(self, level):
+        self.level = min(max(int(level), 0), LEVEL_MAX)
+        if self.pwm is not None:
+            self.pwm.duty(GAMMA_TABLE[self.level])
+            return
+
+        if self.level > 0:
+            super().on()
+        else:
+            super().off()
+
+    def tick(self, now):
+        '''
+        called by LedScheduler: set the output for now
+
+        return: time(ns) to be called next, or None (finished)
+        '''
+        if self.mode == 'fade':
+            return self.tick_fade(now)
+        if self.mode == 'breathe':
+            return self.tick_breathe(now)
+        if self.mode == 'pattern':
+            return self.tick_pattern(now)
+
+        k, phase = divmod(now - self.sched.epoch, self.period)
+        t0 = self.sched.epoch + k * self.period
+        if phase < self.on_ns:
+            self.output(LEVEL_MAX)
+            return t0 + self.on_ns
+
+        self.output(0)
+        return t0 + self.period
+
+    def tick_fade(self, now):
+        t = now - self.fade_t0
+        if t >= self.fade_ns:
+            self.output(self.fade_to_)
+            self.mode = None
+            return None
+
+        self.output(self.fade_from +
+                    (self.fade_to_ - self.fade_from) * t // self.fade_ns)
+        return now + self.frame_ns
+
+    def tick_pattern(self, now):
+        pat = self.pattern
+        k, t = divmod(now - self.pat_t0, pat.total)
+        if self.repeat is not None and k >= self.repeat:
+            self.output(0)
+            self.mode = None
+            if self.pat_cb is not None:
+                self.pat_cb(self)
+            return None
+
+        i = pat.step(t)
+        self.output(pat.level[i])
+        return self.pat_t0 + k * pat.total + pat.end[i]
+
+    def tick_breathe(self, now):
+        phase = (now - self.sched.epoch) % self.period
+        r = BREATH_TABLE[phase * BREATH_STEPS // self.period]
+        self.output(self.low + (self.high - self.low) * r // LEVEL_MAX)
+
+        # 次のフレーム (絶対時刻のグリッド上)
+        return now - (now - self.sched.epoch) % self.frame_ns + self.frame_ns
+
+class LedScheduler(threading.Thread):
+    '''
+    one thread for the blinks of all the Led objects
+
+    deadline queue: (time(ns), seq, gen, led). add() and remove() are
+    O(log n) and O(1) (stale entries are removed when they come up),
+    and no thread is created per blink.
 
-    def _blink_on(self):
+    epoch: time(ns) origin of the blink phases
+    '''
+    _instance = None
+    _lock     = threading.Lock()
+
+    @classmethod
+    def get(cls):
+        with cls._lock:
+            if cls._instance is None or \
+               cls._instance.gpio is not get_backend():
+                cls._instance = cls()
+            return cls._instance
+
+    def __init__(self):
+        self.logger = logger.getChild(__class__.__name__)
         self.logger.debug('')
 
-        self.tmr = threading.Timer(self.on_sec,  self._blink_off)
-        self.tmr.start()
-        super().on()
+        self.gpio  = get_backend()
+        self.cond  = threading.Condition()
+        self.heap  = []
+        self.seq   = 0
+        self.epoch = self.gpio.monotonic_ns()
+
+        super().__init__(daemon=True)
+        self.gpio.spawn(self)
+
+    def add(self, led):
+        with self.cond:
+            led.gen += 1
+            t = led.tick(self.gpio.monotonic_ns())
+            if t is not None:
+                self.push(led, t)
+                self.cond.notify()
+        self.gpio.wake(self)
+
+    def remove(self, led):
+        with self.cond:
+            led.gen += 1
+
+    def push(self, led, t):
+        '''
+        t: time(ns) to call led.tick()
+        '''
+        self.seq += 1
+        heapq.heappush(self.heap, (t, self.seq, led.gen, led))
+
+    def run(self):
+        self.logger.debug('start')
+
+        with self.cond:
+            while True:
+                t_wake = self.step(self.gpio.monotonic_ns())
+                if t_wake is None:
+                    self.cond.wait()
+                    continue
+
+                t_wait = t_wake - self.gpio.monotonic_ns()
+                if t_wait > 0:
+                    self.cond.wait(t_wait / 1000000000)
+
+    def step(self, now):
+        '''
+        switch the LEDs that are due
+        (called with self.cond held, or by the backend simulator)
+
+        return: time(ns) of the next on/off, or None
+        '''
+        while len(self.heap) > 0 and self.heap[0][0] <= now:
+            t, seq, gen, led = heapq.heappop(self.heap)
+            if gen != led.gen:
+                continue	# stopped or restarted
+
+            # 遅れても次の時刻は絶対時刻から計算 (ドリフトしない)
+            t = led.tick(max(t, now))
+            if t is not None:
+                self.push(led, t)
+
+        while len(self.heap) > 0 and self.heap[0][2] != self.heap[0][3].gen:
+            heapq.heappop(self.heap)	# stale
+        if len(self.heap) == 0:
+            return None
+        return self.heap[0][0]
+
+class SoftPwmChannel:
+    '''
+    a pin of SoftPwm (same interface as the backend PWM)
+    '''
+    def __init__(self, spwm, pin):
+        self.spwm = spwm
+        self.pin  = pin
 
-    def _blink_off(self):
-        self.logger.debug('')
+    def duty(self, d):
+        self.spwm.set_duty(self.pin, d)
+
+    def stop(self):
+        self.spwm.set_duty(self.pin, None)
+
+class SoftPwm(threading.Thread):
+    '''
+    shared software PWM: one thread for all the channels
 
-        self.tmr = threading.Timer(self.off_sec, self._blink_on)
-        self.tmr.start()
-        super().off()
+    Every cycle (on an absolute grid, freq Hz) the channels are
+    turned on together, and turned off in the order of their duty
+    (the order is sorted only when a duty changes).
+    Channels at 0.0 or 1.0 are not switched.
+
+    channel(pin): SoftPwmChannel
+    '''
+    _instance = None
+    _lock     = threading.Lock()
+
+    @classmethod
+    def get(cls, freq=100):
+        with cls._lock:
+            if cls._instance is None or \
+               cls._instance.gpio is not get_backend():
+                cls._instance = cls(freq)
+            return cls._instance
+
+    def __init__(self, freq=100):
+        self.logger = logger.getChild(__class__.__name__)
+        self.logger.debug('freq=%d', freq)
+
+        self.gpio      = get_backend()
+        self.cond      = threading.Condition()
+        self.period    = int(1000000000 / freq)
+        self.epoch     = self.gpio.monotonic_ns()
+        self.duty      = {}	# pin -> duty
+        self.state     = {}	# pin -> output level
+        self.order     = []	# [(off time in the cycle(ns), pin), ..]
+        self.dirty     = False
+        self.t_cycle   = None	# start of the current cycle
+        self.i         = 0	# next of self.order
+
+        super().__init__(daemon=True)
+        self.gpio.spawn(self)
+
+    def channel(self, pin):
+        with self.cond:
+            self.duty[pin]  = 0.0
+            self.state[pin] = None
+            self.dirty = True
+        return SoftPwmChannel(self, pin)
+
+    def set_duty(self, pin, d):
+        '''
+        d: 0.0 .. 1.0, None: remove the channel (the pin is set low)
+        '''
+        with self.cond:
+            if d is None:
+                self.duty.pop(pin, None)
+                self.state.pop(pin, None)
+                self.gpio.output(pin, 0)	# step() won't touch it again
+            else:
+                self.duty[pin] = min(max(d, 0.0), 1.0)
+            self.dirty = True
+            self.cond.notify()
+        self.gpio.wake(self)
+
+    def set(self, pin, level):
+        if self.state.get(pin) != level:
+            self.state[pin] = level
+            self.gpio.output(pin, level)
+
+    def run(self):
+        self.logger.debug('start')
+
+        with self.cond:
+            while True:
+                t_wake = self.step(self.gpio.monotonic_ns())
+                if t_wake is None:
+                    self.cond.wait()
+                    continue
+
+                t_wait = t_wake - self.gpio.monotonic_ns()
+                if t_wait > 0:
+                    self.cond.wait(t_wait / 1000000000)
+
+    def step(self, now):
+        '''
+        return: time(ns) of the next on/off, or None (no channels)
+        '''
+        if len(self.duty) == 0:
+            self.t_cycle = None
+            return None
+
+        if self.t_cycle is None or now >= self.t_cycle + self.period:
+            # 新しいサイクル
+            self.t_cycle = now - (now - self.epoch) % self.period
+            if self.dirty:
+                self.order = sorted([(int(d * self.period), p)
+                                     for p, d in self.duty.items()])
+                self.dirty = False
+            for t_off, p in self.order:
+                self.set(p, 1 if t_off > 0 else 0)
+            self.i = 0
+
+        while self.i < len(self.order):
+            t_off, p = self.order[self.i]
+            if t_off >= self.period:
+                self.i = len(self.order)	# 1.0: on のまま
+                break
+            if self.t_cycle + t_off > now:
+                return self.t_cycle + t_off
+            self.set(p, 0)
+            self.i += 1
+
+        return self.t_cycle + self.period
+
+class BankLed:
+    '''
+    a pin of LedBank (same on()/off()/switch() as SimpleLed)
+    '''
+    def __init__(self, bank, pin):
+        self.bank = bank
+        self.pin  = pin
+
+    def switch(self, sw_on):
+        self.bank.set(self.pin, sw_on)
+
+    def on(self):
+        self.bank.set(self.pin, 1)
+
+    def off(self):
+        self.bank.set(self.pin, 0)
+
+class LedBank(threading.Thread):
+    '''
+    on/off LEDs with a shadow register and batched output
+
+    set(), on(), off() and set_bits() only change the shadow state
+    (bit n = pin n). The pins that differ from the output state are
+    written with one gpio.output_bits() per frame: the first change
+    is written immediately, and the changes during the next frame_sec
+    are coalesced (a pin that goes on and off again within a frame
+    is not written at all).
+    frame_sec=0: write on every change (still only the changed pins)
+
+    bank[pin]: BankLed
+    flush()  : write now
+    stats()  : {'changes', 'flushes', 'writes'}
+
+    stop(): Don't forget to call stop() when finished
+    (the LEDs are turned off)
+    '''
+    def __init__(self, pins, frame_sec=0.01, debug=False):
+        self.logger = logger.getChild(__class__.__name__)
+        if debug:
+            self.logger.setLevel(DEBUG)
+        self.logger.debug('pins=%s, frame_sec=%s', pins, frame_sec)
+
+        self.gpio     = get_backend()
+        self.pins     = list(pins)
+        self.mask     = 0
+        for p in self.pins:
+            self.gpio.setup(p, self.gpio.OUT)
+            self.mask |= 1 << p
+        self.frame_ns = int(frame_sec * 1000000000)
+        self.cond     = threading.Condition()
+        self.want     = 0	# shadow
+        self.state    = None	# output (None: not written yet)
+        self.t_next   = None	# next flush is allowed at
+        self.n_change = 0
+        self.n_flush  = 0
+        self.n_write  = 0
+        self.loop_flag = True
+
+        super().__init__(daemon=True)
+        self.gpio.spawn(self)
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, ex_type, ex_value, trace):
+        self.stop()
+
+    def __getitem__(self, pin):
+        return BankLed(self, pin)
+
+    def get(self, pin):
+        return (self.want >> pin) & 1
+
+    def set(self, pin, val):
+        b = 1 << pin
+        if b & self.mask == 0:
+            raise ValueError('pin %d: not in the bank' % pin)
+        self.set_bits(b if val else 0, b)
+
+    def on(self, pin):
+        self.set(pin, 1)
+
+    def off(self, pin):
+        self.set(pin, 0)
+
+    def set_bits(self, bits, mask=None):
+        '''
+        bits: new levels of the pins in mask (bit n = pin n)
+        mask: None: all the pins
+        '''
+        if mask is None:
+            mask = self.mask
+        mask &= self.mask
+        with self.cond:
+            want = (self.want & ~mask) | (bits & mask)
+            if want == self.want:
+                return
+            self.want = want
+            self.n_change += 1
+            if self.frame_ns <= 0:
+                self.write()
+                return
+            self.cond.notify()
+        self.gpio.wake(self)
+
+    def flush(self):
+        with self.cond:
+            self.write()
+
+    def write(self):
+        '''
+        write the changed pins (called with self.cond held)
+        '''
+        if self.state is None:
+            changed = self.mask
+        else:
+            changed = self.want ^ self.state
+        if changed:
+            self.gpio.output_bits(self.want & changed, ~self.want & changed)
+            self.n_write += bin(changed).count('1')
+        self.n_flush += 1
+        self.state  = self.want
+        self.t_next = self.gpio.monotonic_ns() + self.frame_ns
+
+    def run(self):
+        self.logger.debug('start')
+
+        with self.cond:
+            while self.loop_flag:
+                t_wake = self.step(self.gpio.monotonic_ns())
+                if t_wake is None:
+                    self.cond.wait()
+                    continue
+
+                t_wait = t_wake - self.gpio.monotonic_ns()
+                if t_wait > 0:
+                    self.cond.wait(t_wait / 1000000000)
+
+        self.logger.debug('end')
+
+    def step(self, now):
+        '''
+        return: time(ns) of the next flush, or None (nothing to write)
+        '''
+        if self.state == self.want:
+            return None
+        if self.t_next is not None and now < self.t_next:
+            return self.t_next
+        self.write()
+        return None
+
+    def stats(self):
+        with self.cond:
+            return {'changes': self.n_change, 'flushes': self.n_flush,
+                    'writes': self.n_write}
+
+    def stop(self):
+        self.logger.debug('')
+        with self.cond:
+            self.want = 0
+            self.write()
+            self.loop_flag = False
+            self.cond.notify()
+        self.gpio.join(self)
 
 def app(pin, debug):
     logger.debug('pin=%d', pin)
@@ -139,6 +813,16 @@ def app(pin, debug):
             time.sleep(3)
     # In this case, off() is not necessary (off() is called auotmatically)
 
+    with Led(pin) as led:
+        done = threading.Event()
+        print('SOS')
+        led.play(LedPattern.morse('SOS'), repeat=2, cb=lambda l: done.set())
+        done.wait()
+
+        print('heartbeat')
+        led.play(LedPattern.heartbeat(72), repeat=None)
+        time.sleep(5)
+
 #####
 CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
 @click.command(context_settings=CONTEXT_SETTINGS)
@@ -166,13 +850,12 @@ Arguments:
 def setup_GPIO():
     logger.debug('')
 
-    GPIO.setwarnings(False)
-    GPIO.setmode(GPIO.BCM)
+    get_backend().init()
 
 def cleanup_GPIO():
     logger.debug('')
 
-    GPIO.cleanup()
+    get_backend().cleanup()
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+#
+# (C) 2019 Yoichi Tanibayashi
+#
+'''
+LED chains driven over SPI, with a framebuffer
+
+  ShiftRegisterChain: 74HC595 (or compatible) chain
+                      (SPI MOSI -> SER, SCLK -> SRCLK, CE -> RCLK)
+  WS2812Strip       : WS2812 (NeoPixel) strip (SPI MOSI -> DIN)
+
+The application writes into fb (bytearray) directly, and show()
+sends the whole frame in one SPI transfer (gpio.spi(), the simulator
+captures the bytes). The frame must fit in the spidev bufsiz (see
+GpioBackend.SpidevSpi). The WS2812 bitstream is encoded with precomputed
+tables (bytes.translate() into slices of a preallocated buffer), so
+no Python code runs per pixel.
+
+    strip = WS2812Strip(60)
+    strip.fb[0:3] = bytes((0, 255, 0))     # pixel 0: (G, R, B)
+    strip.fill(0, 0, 32)
+    strip.show()
+'''
+from GpioBackend import get_backend
+import time
+
+import click
+
+from logging import getLogger, StreamHandler, Formatter, DEBUG, INFO, WARN
+logger = getLogger(__name__)
+logger.setLevel(INFO)
+handler = StreamHandler()
+handler.setLevel(DEBUG)
+handler_fmt = Formatter(
+    '%(asctime)s %(levelname)s %(name)s.%(funcName)s> %(message)s',
+    datefmt='%H:%M:%S')
+handler.setFormatter(handler_fmt)
+logger.addHandler(handler)
+logger.propagate = False
+def init_logger(name, debug):
+    l = logger.getChild(name)
+    if debug:
+        l.setLevel(DEBUG)
+    else:
+        l.setLevel(INFO)
+    return l
+
+class ShiftRegisterChain:
+    '''
+    n_chips 74HC595s in a chain
+
+    The SPI CE line latches the outputs (RCLK) at the end of the
+    transfer. The first byte sent is shifted to the last chip, so fb
+    is in the order of the transfer:
+
+      fb[0]: the last chip (farthest from the Pi) .. fb[-1]: chip 0
+      bit q of a byte: output Qq
+
+    set(i, val), get(i): output i (chip i // 8, Qi % 8)
+    show()             : send fb
+    '''
+    def __init__(self, n_chips, bus=0, dev=0, speed_hz=1000000,
+                 debug=False):
+        self.logger = init_logger(__class__.__name__, debug)
+        self.logger.debug('n_chips=%d, bus=%d, dev=%d, speed_hz=%d',
+                          n_chips, bus, dev, speed_hz)
+
+        self.gpio    = get_backend()
+        self.n_chips = n_chips
+        self.fb      = bytearray(n_chips)
+        self.spi     = self.gpio.spi(bus, dev, speed_hz)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, ex_type, ex_value, trace):
+        self.close()
+
+    def __len__(self):
+        return self.n_chips * 8
+
+    def index(self, i):
+        c, q = divmod(i, 8)
+        if c >= self.n_chips:
+            raise IndexError('output %d: out of the chain' % i)
+        return self.n_chips - 1 - c, 1 << q
+
+    def get(self, i):
+        k, b = self.index(i)
+        return 1 if self.fb[k] & b else 0
+
+    def set(self, i, val):
+        k, b = self.index(i)
+        if val:
+            self.fb[k] |= b
+        else:
+            self.fb[k] &= ~b & 0xff
+
+    def set_bits(self, bits):
+        '''
+        bits: bit i = output i
+        '''
+        self.fb[:] = bits.to_bytes(self.n_chips, 'big')
+
+    def show(self):
+        self.spi.write(self.fb)
+
+    def close(self):
+        self.fb[:] = bytes(self.n_chips)
+        self.show()
+        self.spi.close()
+
+class WS2812Strip:
+    '''
+    n WS2812 LEDs
+
+    fb: n * 3 bytes in the order of the wire (order='GRB': fb[3i] is
+        G of pixel i). The application writes into it directly.
+
+    Every data bit is 3 SPI bits at 2.4 MHz (0: 100, 1: 110), so a
+    byte is 3 SPI bytes. ENC[k][v] is the SPI byte k of the value v
+    (brightness and gamma are folded into the tables), and show()
+    encodes with one translate() per k into out[k::3].
+    out ends with RESET_US of low (latch). The frame is n * 9 + 91
+    bytes: up to 445 LEDs with the default spidev bufsiz (4096).
+
+    brightness : 0 .. 255 (scale of all the pixels)
+    gamma      : None or e.g. 2.2
+    '''
+    SPEED_HZ = 2400000
+    RESET_US = 300	# >50us (WS2812), >280us (WS2812B V5)
+
+    def __init__(self, n, bus=0, dev=0, order='GRB', brightness=255,
+                 gamma=None, debug=False):
+        self.logger = init_logger(__class__.__name__, debug)
+        self.logger.debug('n=%d, bus=%d, dev=%d, order=%s', n, bus, dev,
+                          order)
+
+        self.gpio  = get_backend()
+        self.n     = n
+        self.order = order
+        self.fb    = bytearray(n * 3)
+
+        n_reset    = self.RESET_US * self.SPEED_HZ // 8 // 1000000 + 1
+        self.out   = bytearray(n * 9 + n_reset)	# 0: reset
+        self.data  = memoryview(self.out)[:n * 9]
+        self.spi   = self.gpio.spi(bus, dev, self.SPEED_HZ)
+
+        self.set_brightness(brightness, gamma)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, ex_type, ex_value, trace):
+        self.close()
+
+    def __len__(self):
+        return self.n
+
+    def set_brightness(self, brightness=255, gamma=None):
+        '''
+        rebuild ENC
+        '''
+        self.brightness = brightness
+        self.gamma      = gamma
+
+        enc = [bytearray(256), bytearray(256), bytearray(256)]
+        for v in range(256):
+            x = v / 255
+            if gamma is not None:
+                x = x ** gamma
+            v2 = round(x * brightness)
+
+            bits = 0
+            for i in range(7, -1, -1):
+                bits = (bits << 3) | (0b110 if v2 >> i & 1 else 0b100)
+            for k in range(3):
+                enc[k][v] = bits >> (16 - k * 8) & 0xff
+        self.ENC = [bytes(e) for e in enc]
+
+    def set_pixel(self, i, r, g, b):
+        c = {'R': r, 'G': g, 'B': b}
+        self.fb[i * 3:i * 3 + 3] = bytes([c[ch] for ch in self.order])
+
+    def fill(self, r, g, b):
+        c = {'R': r, 'G': g, 'B': b}
+        self.fb[:] = bytes([c[ch] for ch in self.order]) * self.n
+
+    def encode(self):
+        '''
+        fb -> out (the bitstream)
+        '''
+        for k in range(3):
+            self.data[k::3] = self.fb.translate(self.ENC[k])
+        return self.out
+
+    def show(self):
+        self.spi.write(self.encode())
+
+    def close(self):
+        self.fill(0, 0, 0)
+        self.show()
+        self.spi.close()
+
+def decode_ws2812(buf):
+    '''
+    SPI bytes -> data bytes, until the reset (for tests with the
+    simulator)
+    '''
+    out = bytearray()
+    for i in range(0, len(buf) - 2, 3):
+        bits = int.from_bytes(buf[i:i + 3], 'big')
+        if bits == 0:
+            break	# reset
+        v = 0
+        for j in range(21, -1, -3):
+            v = (v << 1) | (bits >> j & 0b111 == 0b110)
+        out.append(v)
+    return bytes(out)
+
+#####
+def app(n, sec, debug):
+    logger.debug('n=%d', n)
+
+    with WS2812Strip(n, gamma=2.2, debug=debug) as strip:
+        t_end = time.monotonic() + sec
+        i = 0
+        while time.monotonic() < t_end:
+            # 流れる光
+            strip.fb[:] = bytes(n * 3)
+            for j in range(5):
+                p = (i - j) % n
+                strip.set_pixel(p, 255 >> j, 0, 128 >> j)
+            strip.show()
+            i += 1
+            time.sleep(0.02)
+
+CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
+@click.command(context_settings=CONTEXT_SETTINGS)
+@click.argument('n', metavar='<n>', type=int, nargs=1)
+@click.option('--sec', '-s', 'sec', type=float, default=10,
+              help='seconds')
+@click.option('--debug', '-d', 'debug', is_flag=True, default=False,
+              help='debug flag')
+def main(n, sec, debug):
+    '''WS2812Strip sample program (SPI0 MOSI: GPIO 10)
+
+Arguments:
+
+    <n>
+    number of LEDs
+    '''
+    logger.setLevel(INFO)
+    if debug:
+        logger.setLevel(DEBUG)
+
+    setup_GPIO()
+    try:
+        app(n, sec, debug)
+    finally:
+        cleanup_GPIO()
+
+def setup_GPIO():
+    logger.debug('')
+
+    get_backend().init()
+
+def cleanup_GPIO():
+    logger.debug('')
+
+    get_backend().cleanup()
+
+if __name__ == '__main__':
+    main()
@@ -2,9 +2,13 @@
 #
 # (C) 2018 Yoichi Tanibayashi
 #
-from Switch import SwitchListener, Switch
+from Switch import SwitchListener, Switch, get_batch
+from Switch import SwitchHub, SwitchHubEntry, WatcherStats, AdaptiveInterval
+from GpioLevel import get_reader
+from GpioEdge import get_edge_source
+from GpioBackend import get_backend
+from KeyRing import KeyRing, CharTrie, PAGES_ASCII, load_words
 
-import RPi.GPIO as GPIO
 import threading
 import queue
 import time
@@ -35,13 +39,36 @@ class RotaryKey:
     stop(): Don't forget to call stop() when finished.
 
     callback function: cb_func(out_ch, cur_ch)
+        out_ch: characters entered ('' while rotating or when a page
+                is selected), CH_BS or CH_ENT
+        cur_ch: label of the entry at the cursor (see KeyRing.label())
+
+    chl  : characters (one page)
+    pages: {name: characters} instead of chl (see KeyRing.PAGES_ASCII,
+           PAGES_KANA). The other pages are selected from the markers
+           at the end of the ring.
+    trie : KeyRing.CharTrie: the likely next characters come first,
+           and the completions are one step CCW from the cursor
+
+    The cursor moves one entry per step.
+    resolution: steps per detent (see QuadratureDecoder). 2: at the
+           states 00 and 11 (default); 1: one entry per detent
+
+    accel: True: fast spins jump through the page (max 1/8 of the
+           largest page per step, see RotaryAccel), RotaryAccel, or
+           False: 1 per step
+    max_rate: cb_func calls/sec while rotating. The steps are
+           coalesced, so the display does not lag behind the knob
+           (see RotaryEncoderListener)
     '''
     
     CH_LIST = ' _-0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
     CH_BS   = '<BS>'
     CH_ENT  = '<ENT>'
 
-    def __init__(self, pin_re, pin_sw, cb_func, chl=CH_LIST, debug=False):
+    def __init__(self, pin_re, pin_sw, cb_func, chl=CH_LIST, hub=False,
+                 accel=True, max_rate=30, pages=None, trie=None,
+                 resolution=2, debug=False):
         self.logger = init_logger(__class__.__name__, debug)
         self.logger.debug('pin_re:%s', pin_re)
         self.logger.debug('pin_sw:%d', pin_sw)
@@ -51,15 +78,26 @@ class RotaryKey:
         self.pin_sw  = pin_sw
         self.cb_func = cb_func
         self.chl     = chl
-        
-        self.chl_len = len(self.chl)
-        self.chl_i   = 0
-        self.cur_ch  = self.CH_LIST[self.chl_i]
-        self.out_ch  = ''
 
-        self.rl = RotaryEncoderListener(self.pin_re, self.cb_re, debug=debug)
+        if pages is None:
+            pages = chl
+        self.ring    = KeyRing(pages, trie, debug=debug)
+        self.cur_ch  = self.ring.label()
+        self.sel_i   = None	# cursor when pressed
+
+        if accel is True:
+            page_len = max([len(p) for p in self.ring.pages.values()])
+            accel = RotaryAccel(max_delta=max(page_len // 8, 1))
+        if accel is False:
+            accel = None
+
+        self.rl = RotaryEncoderListener(self.pin_re, self.cb_re, hub=hub,
+                                        resolution=resolution,
+                                        accel=accel,
+                                        coalesce=True, max_rate=max_rate,
+                                        debug=debug)
         self.sw = Switch(self.pin_sw, debug=debug)
-        self.sl = SwitchListener([self.sw], self.cb_sw, debug=debug)
+        self.sl = SwitchListener([self.sw], self.cb_sw, debug=debug, hub=hub)
 
     def stop(self):
         self.logger.debug('')
@@ -67,11 +105,10 @@ class RotaryKey:
         self.rl.stop()
 
     def cb_re(self, val):
-        self.logger.debug('val=%d:%s', val, RotaryEncoder.val2str(val))
-        self.chl_i += val
-        self.chl_i %= self.chl_len
-        self.cur_ch = self.chl[self.chl_i]
-        self.logger.debug('chl_i:%d, cur_ch:%s', self.chl_i, self.cur_ch)
+        self.logger.debug('val=%d, velocity=%.1f',
+                          val, self.rl.velocity())
+        self.cur_ch = self.ring.move(val)
+        self.logger.debug('index:%d, cur_ch:%s', self.ring.index, self.cur_ch)
 
         self.cb_func('', self.cur_ch)
 
@@ -82,7 +119,7 @@ class RotaryKey:
             return
         
         if event.name == 'pressed':
-            self.out_ch = self.cur_ch
+            self.sel_i = self.ring.index
             return
 
         # 'timer' event
@@ -92,55 +129,124 @@ class RotaryKey:
         self.logger.debug('cc=%d', cc)
 
         if ll > 0: # long pressed
+            self.ring.enter()
+            self.cur_ch = self.ring.label()
             self.cb_func(self.CH_ENT, self.cur_ch)
-            self.out_ch = ''
+            self.sel_i = None
             return
 
         if cc > 1: # multi click
+            self.ring.backspace()
+            self.cur_ch = self.ring.label()
             self.cb_func(self.CH_BS, self.cur_ch)
-            self.out_ch = ''
+            self.sel_i = None
             return
 
-        if cc == 1: # single click
-            self.cb_func(self.out_ch, self.cur_ch)
-            self.out_ch = ''
+        if cc == 1 and self.sel_i is not None: # single click
+            out_ch = self.ring.select(self.sel_i)
+            self.cur_ch = self.ring.label()
+            self.cb_func(out_ch, self.cur_ch)
+            self.sel_i = None
 
 class RotaryEncoderListener(threading.Thread):
     '''
     stop(): Don't forget to call stop() when finished.
 
     callback function: cb_func(val) ... val: RotaryEncoder.CW|CCW
+
+    batch callback   : cb_batch(vals) ... list of RotaryEncoder.CW|CCW
+        If cb_batch is given, it is called instead of cb_func with
+        the queued values (in order), up to batch_size values or
+        batch_sec seconds.
+
+    hub=True: sampled by the shared SwitchHub thread
+    reader  : read both pins at once (see GpioLevel.get_reader())
+    edge    : True|'RPi.GPIO'|'chardev' edge mode (see SwitchWatcher)
+    idle_interval: sample every idle_interval while the knob is idle,
+              and every sw_loop_interval from the first change until
+              idle_sec without steps (see SwitchWatcher).
+              Keep it shorter than a quarter of the fastest detent
+              period that has to be decoded from idle.
+    resolution: steps per detent: 1, 2 or 4 (see QuadratureDecoder)
+    accel   : True or RotaryAccel: val is a signed delta that grows
+              with the rotation speed (see RotaryAccel)
+    coalesce: True: cb_func(delta) with the net delta of all the
+              pending steps (cb_batch is not used). Steps that cancel
+              out are not called back, but the total is kept.
+    max_rate: coalesce only. at most max_rate callbacks/sec: the steps
+              are accumulated until the next frame
+
+    velocity(): rotation speed (steps/sec, CW > 0). It can be called
+              from the callbacks.
+    stats() : loop health, steps and missed transitions
     '''
     
-    def __init__(self, pin, cb_func, sw_loop_interval=0.002, debug=False):
+    def __init__(self, pin, cb_func, sw_loop_interval=0.002, hub=False,
+                 cb_batch=None, batch_size=64, batch_sec=0, reader=None,
+                 edge=False, idle_interval=None, idle_sec=1.0,
+                 resolution=2, accel=None, coalesce=False, max_rate=None,
+                 debug=False):
         self.logger = init_logger(__class__.__name__, debug)
         self.logger.debug('pin:%s', pin)
         self.logger.debug('sw_loop_interval:%.4f', sw_loop_interval)
+        self.logger.debug('coalesce:%s, max_rate:%s', coalesce, max_rate)
+        self.logger.debug('batch_size:%d, batch_sec:%.4f',
+                          batch_size, batch_sec)
 
         if len(pin) != 2:
             return None
 
+        self.gpio             = get_backend()
         self.pin              = pin
         self.cb_func          = cb_func
+        self.cb_batch         = cb_batch
+        self.batch_size       = batch_size
+        self.batch_sec        = batch_sec
         self.sw_loop_interval = sw_loop_interval
+        self.coalesce         = coalesce
+
+        self.frame_ns = 0
+        if max_rate is not None:
+            self.frame_ns = int(1000000000 / max_rate)
+        self.t_frame  = 0	# time(ns) of the next callback (coalesce)
+        self.pending  = 0	# net delta not called back yet (coalesce)
 
         self.q                = queue.Queue()
 
+        if accel is True:
+            accel = RotaryAccel()
+        self.accel            = accel
+
         self.rotenc           = RotaryEncoder(self.pin, self.q,
                                               self.sw_loop_interval,
-                                              debug)
+                                              debug, hub=hub,
+                                              reader=reader, edge=edge,
+                                              idle_interval=idle_interval,
+                                              idle_sec=idle_sec,
+                                              resolution=resolution,
+                                              accel=self.accel)
 
         super().__init__(daemon=True)
 
-        time.sleep(0.1)
+        self.gpio.sleep(0.1)
         while not self.q.empty():
             self.logger.debug('ignore initail input: %s',
                               RotaryEncoder.val2str(self.q.get()))
 
-        self.start()
+        self.gpio.spawn(self)
 
     def run(self):
         self.logger.debug('start')
+        if self.coalesce:
+            self.run_coalesce()
+            self.logger.debug('end')
+            return
+
+        if self.cb_batch is not None:
+            self.run_batch()
+            self.logger.debug('end')
+            return
+
         while True:
             v = self.q.get()
             if v == RotaryEncoder.NULL:
@@ -148,10 +254,103 @@ class RotaryEncoderListener(threading.Thread):
             self.cb_func(v)
         self.logger.debug('end')
 
+    def run_coalesce(self):
+        end = False
+        while not end:
+            v = self.q.get()
+            while True:
+                if v == RotaryEncoder.NULL:
+                    end = True
+                    break
+                self.pending += v
+
+                # 次のフレームまで溜める
+                t_wait = self.t_frame - self.gpio.monotonic_ns()
+                try:
+                    if t_wait > 0:
+                        v = self.q.get(timeout=t_wait / 1000000000)
+                    else:
+                        v = self.q.get_nowait()
+                except queue.Empty:
+                    break
+
+            self.dispatch_delta(self.gpio.monotonic_ns())
+
+    def dispatch_delta(self, now):
+        '''
+        call back with the pending net delta
+        '''
+        delta = self.pending
+        self.pending = 0
+        if delta == 0:
+            return
+
+        self.t_frame = now + self.frame_ns
+        self.logger.debug('delta=%d', delta)
+        self.cb_func(delta)
+
+    def run_batch(self):
+        while True:
+            vals = get_batch(self.q, RotaryEncoder.NULL,
+                             self.batch_size, self.batch_sec)
+            end = (vals[-1] == RotaryEncoder.NULL)
+            if end:
+                vals.pop()
+
+            if len(vals) > 0:
+                self.cb_batch(vals)
+
+            if end:
+                break
+
+    def step(self, now=None):
+        '''
+        call back with the queued values (without waiting)
+
+        return: None (nothing to do until the next value), or
+                time(ns) of the next frame (coalesce)
+        '''
+        if now is None:
+            now = self.gpio.monotonic_ns()
+
+        vals = []
+        while not self.q.empty():
+            v = self.q.get()
+            if v == RotaryEncoder.NULL:
+                break
+            vals.append(v)
+
+        if self.coalesce:
+            self.pending += sum(vals)
+            if self.pending == 0:
+                return None
+            if now < self.t_frame:
+                return self.t_frame
+            self.dispatch_delta(now)
+            return None
+
+        if self.cb_batch is None:
+            for v in vals:
+                self.cb_func(v)
+            return None
+
+        for i in range(0, len(vals), self.batch_size):
+            self.cb_batch(vals[i:i + self.batch_size])
+        return None
+
+    def velocity(self):
+        if self.accel is None:
+            return 0.0
+        return self.accel.velocity()
+
+    def stats(self, reset=False):
+        return self.rotenc.stats(reset)
+
     def stop(self):
         self.logger.debug('')
+        self.rotenc.stop()
         self.q.put(RotaryEncoder.NULL)
-        self.join()
+        self.gpio.join(self)
         self.logger.debug('join()')
 
 class RotaryEncoder:
@@ -167,16 +366,27 @@ class RotaryEncoder:
             return 'CCW'
         return ''
 
-    def __init__(self, pin, valq, loop_interval, debug=False):
+    def __init__(self, pin, valq, loop_interval, debug=False, hub=False,
+                 reader=None, edge=False, idle_interval=None, idle_sec=1.0,
+                 resolution=2, accel=None):
         '''
         @param pin			[pin1, pin2]
         @param valq			value queue
         @param loop_interval	sec
         @param debug		debug flag
+        @param hub			use shared SwitchHub
+        @param reader		see GpioLevel.get_reader()
+        @param edge			see SwitchWatcher
+        @param idle_interval	see SwitchWatcher
+        @param idle_sec		see SwitchWatcher
+        @param resolution	steps per detent: 1, 2 or 4
+        				(see QuadratureDecoder)
+        @param accel		RotaryAccel or None
         '''
     
         self.logger = init_logger(__class__.__name__, debug)
         self.logger.debug('pin:%s', pin)
+        self.logger.debug('resolution:%d', resolution)
 
         if len(pin) != 2:
             return None
@@ -185,45 +395,411 @@ class RotaryEncoder:
         self.valq          = valq
         self.loop_interval = loop_interval
 
-        self.switch = []
-        for p in self.pin:
-            sw = Switch(p, timeout_sec=[], debug=debug)
-            self.switch.append(sw)
-        
-        self.stat = [-1, -1]
-        self.sl   = SwitchListener(self.switch, self.cb, self.loop_interval,
-                                   debug=debug)
+        self.accel   = accel
+        self.decoder = QuadratureDecoder(valq, resolution, accel=accel,
+                                         debug=debug)
+        if hub:
+            self.watcher = SwitchHub.get().add_entry(
+                QuadratureHubEntry(SwitchHub.get(), self.pin, self.decoder,
+                                   loop_interval, reader,
+                                   idle_interval, idle_sec))
+        else:
+            self.watcher = QuadratureWatcher(self.pin, self.decoder,
+                                             loop_interval, reader=reader,
+                                             edge=edge,
+                                             idle_interval=idle_interval,
+                                             idle_sec=idle_sec, debug=debug)
 
-    def cb(self, event):
-        self.logger.debug('event.name:%s', event.name)
-        
-        if event.name == 'timer':
+    def stop(self):
+        self.logger.debug('')
+        self.watcher.stop()
+
+    def stats(self, reset=False):
+        '''
+        loop health (see SwitchWatcher.stats()), steps and missed
+        (see QuadratureDecoder)
+        '''
+        return self.watcher.stats(reset)
+
+class QuadratureDecoder:
+    '''
+    Gray-code state transition table decoder
+
+    state: (A << 1) | B of the raw levels (no filter)
+           CW: 11 -> 01 -> 00 -> 10 -> 11
+
+    resolution: steps per detent
+        4: every valid transition
+        2: at the states 00 and 11
+        1: at the detent state (default: 11, the rest state with
+           pull-ups)
+
+    A bounce on one channel is a +1/-1 pair and cancels out.
+    Both channels changed at once (00 <-> 11, 01 <-> 10) is an invalid
+    transition: `missed` is incremented and, if the previous transition
+    was valid, it is counted as two transitions in that direction.
+    Consecutive invalid transitions (sampled slower than a quarter
+    period) are not counted.
+
+    accel: RotaryAccel or None. If given, each step is put to valq
+           as a signed delta (see RotaryAccel) instead of CW|CCW.
+
+    update(state, now=None): put RotaryEncoder.CW|CCW to valq for each
+                   step (now: time(ns) of the sample, for accel)
+                   return: number of steps
+    resync(state): set the state without counting (missed += 1 if it
+                   was different)
+    '''
+    INVALID = 2
+
+    # TABLE[prev << 2 | cur]
+    TABLE = ( 0, -1,  1,  2,
+              1,  0,  2, -1,
+             -1,  2,  0,  1,
+              2,  1, -1,  0)
+
+    def __init__(self, valq, resolution=2, detent=3, accel=None,
+                 debug=False):
+        self.logger = init_logger(__class__.__name__, debug)
+        self.logger.debug('resolution:%d, detent:%d', resolution, detent)
+
+        if resolution not in (1, 2, 4):
+            raise ValueError('resolution: %s' % resolution)
+
+        self.valq       = valq
+        self.resolution = resolution
+        self.detent     = detent
+        self.div        = 4 // resolution
+        self.accel      = accel
+
+        self.state    = None
+        self.acc      = 0	# transitions since the last step
+        self.last_dir = 0	# direction of the last valid transition
+        self.changes  = 0	# transitions (valid or not)
+        self.steps    = 0
+        self.missed   = 0
+
+    def update(self, state, now=None):
+        if self.state is None:
+            self.state = state
+            return 0
+        if state == self.state:
+            return 0
+
+        self.changes += 1
+        d = self.TABLE[(self.state << 2) | state]
+        self.state = state
+        if d == self.INVALID:
+            self.missed += 1
+            self.logger.debug('invalid transition: missed=%d', self.missed)
+            d = self.last_dir * 2
+            self.last_dir = 0
+            if d == 0:
+                return 0
+        else:
+            self.last_dir = d
+        self.acc += d
+
+        if self.resolution == 1 and state != self.detent:
+            return 0
+        if self.resolution == 2 and state not in (0, 3):
+            return 0
+
+        n = int(self.acc / self.div)
+        self.acc = 0
+        if n == 0:
+            return 0
+
+        v = RotaryEncoder.CW if n > 0 else RotaryEncoder.CCW
+        for i in range(abs(n)):
+            if self.accel is None:
+                self.valq.put(v)
+            else:
+                self.valq.put(self.accel.step(v, now))
+        self.steps += abs(n)
+        return abs(n)
+
+    def resync(self, state):
+        if self.state is None or state == self.state:
+            self.state = state
             return
 
-        if event.pin == self.pin[0]:
-            pin_i = 0
+        self.missed += 1
+        self.logger.debug('resync: missed=%d', self.missed)
+        self.state    = state
+        self.acc      = 0
+        self.last_dir = 0
+
+class RotaryAccel:
+    '''
+    rotation speed and acceleration curve
+
+    velocity: steps/sec from the step timestamps (EMA with `smooth`),
+              signed (CW > 0). It restarts on a change of direction
+              or after reset_sec without steps.
+
+    step(v, now): v: CW|CCW, now: time(ns) of the step
+                  return: signed delta for the step
+                          1 up to v_min, max_delta at v_max and above
+                          (power `curve` in between)
+    velocity(now=None): current velocity (0 after reset_sec)
+    '''
+    def __init__(self, v_min=10, v_max=60, max_delta=8, curve=2,
+                 smooth=0.3, reset_sec=0.3):
+        self.gpio      = get_backend()
+        self.v_min     = v_min
+        self.v_max     = v_max
+        self.max_delta = max_delta
+        self.curve     = curve
+        self.smooth    = smooth
+        self.reset_ns  = int(reset_sec * 1000000000)
+
+        self.vel    = 0.0
+        self.t_prev = None
+        self.v_prev = 0
+
+    def step(self, v, now=None):
+        if now is None:
+            now = self.gpio.monotonic_ns()
+
+        if self.t_prev is None or v != self.v_prev or \
+           now - self.t_prev > self.reset_ns:
+            self.vel = 0.0
         else:
-            pin_i = 1
-            
-        self.stat[pin_i] = event.value
+            inst = 1000000000 / max(now - self.t_prev, 1)
+            if self.vel == 0.0:
+                self.vel = inst
+            else:
+                self.vel += (inst - self.vel) * self.smooth
+        self.t_prev = now
+        self.v_prev = v
+
+        return v * self.delta(self.vel)
+
+    def delta(self, vel):
+        if vel <= self.v_min:
+            return 1
+        r = min((vel - self.v_min) / (self.v_max - self.v_min), 1.0)
+        return 1 + int((r ** self.curve) * (self.max_delta - 1) + 0.5)
+
+    def velocity(self, now=None):
+        if self.t_prev is None:
+            return 0.0
+        if now is None:
+            now = self.gpio.monotonic_ns()
+        if now - self.t_prev > self.reset_ns:
+            return 0.0
+        return self.vel * self.v_prev
+
+def read_state(gpio, pin, reader=None):
+    '''
+    (A << 1) | B of pin = [A, B]
+    '''
+    if reader is None:
+        return (gpio.input(pin[0]) << 1) | gpio.input(pin[1])
+    bits = reader.read()
+    return (((bits >> pin[0]) & 1) << 1) | ((bits >> pin[1]) & 1)
 
-        if self.stat[0] != self.stat[1]:
+class QuadratureWatcher(threading.Thread):
+    '''
+    sample the 2 pins of a rotary encoder and decode them
+    (QuadratureDecoder)
+
+    edge=False: read both pins every loop_interval
+                (idle_interval: see SwitchWatcher)
+    edge=True : True|'RPi.GPIO'|'chardev'. every edge toggles the
+                level of its pin, and the levels are checked
+                loop_interval after the last edge (resync)
+
+    step(now) : one iteration of the loop (backend simulator)
+    stats()   : see SwitchWatcher.stats(), and steps and missed
+    stop()    : Don't forget to call stop() when finished
+    '''
+    def __init__(self, pin, decoder, loop_interval=0.002, reader=None,
+                 edge=False, idle_interval=None, idle_sec=1.0, debug=False):
+        self.logger = init_logger(__class__.__name__, debug)
+        self.logger.debug('pin:%s', pin)
+        self.logger.debug('loop_interval:%.4f', loop_interval)
+        self.logger.debug('edge:%s', edge)
+
+        self.gpio        = get_backend()
+        self.pin         = pin
+        self.decoder     = decoder
+        self.interval_ns = int(loop_interval * 1000000000)
+        self.edge        = edge
+        self.reader      = get_reader(reader, pin, debug=debug)
+
+        for p in self.pin:
+            self.gpio.setup(p, self.gpio.IN, pull_up_down=self.gpio.PUD_UP)
+        self.decoder.update(self.read())
+
+        self.health  = WatcherStats()
+        self.next_ns = self.gpio.monotonic_ns()
+        self.t_wake  = None
+
+        self.adapt = None
+        if idle_interval is not None and not edge:
+            self.adapt = AdaptiveInterval(loop_interval, idle_interval,
+                                          idle_sec, health=self.health)
+
+        self.edge_src = None
+        self.check_ns = None	# time(ns) to check the levels (edge mode)
+        if self.edge:
+            self.edge_src = get_edge_source(self.edge, pin, debug=debug)
+
+        self.loop_flag = True
+        super().__init__(daemon=True)
+        self.gpio.spawn(self)
+
+    def read(self):
+        return read_state(self.gpio, self.pin, self.reader)
+
+    def run(self):
+        self.logger.debug('start')
+
+        if self.edge:
+            self.run_edge()
+            self.logger.debug('end')
             return
 
-        if pin_i != 0:
-            v = self.CW
-        else:
-            v = self.CCW
+        while self.loop_flag:
+            t_wake = self.step(self.gpio.monotonic_ns())
+            t_sleep = t_wake - self.gpio.monotonic_ns()
+            if t_sleep > 0:
+                self.gpio.sleep(t_sleep / 1000000000)
+
+        self.logger.debug('end')
+
+    def step(self, now):
+        '''
+        return: time(ns) to call step() again
+                (edge mode: None if waiting for an edge)
+        '''
+        if self.edge:
+            return self.step_edge(self.edge_src.wait(0), now)
+
+        if now < self.next_ns:
+            return self.next_ns
 
-        self.logger.debug('stat=%s, v=%d:%s', self.stat, v, self.val2str(v))
+        changes = self.decoder.changes
+        n = self.decoder.update(self.read(), now)
 
-        self.valq.put(v)
+        interval_ns = self.interval_ns
+        if self.adapt is not None:
+            active = n + (self.decoder.changes - changes)
+            interval_ns = self.adapt.next_ns((), active, now)
+        self.next_ns = now + interval_ns
+
+        self.health.loop(now, self.gpio.monotonic_ns(), n, self.decoder.valq,
+                         interval_ns, self.t_wake)
+        self.t_wake = self.next_ns
+        return self.next_ns
+
+    def run_edge(self):
+        t_wake = None
+        while self.loop_flag:
+            timeout = None
+            if t_wake is not None:
+                timeout = max(t_wake - self.gpio.monotonic_ns(), 0)
+                timeout /= 1000000000
+
+            edges = self.edge_src.wait(timeout)
+            t_wake = self.step_edge(edges, self.gpio.monotonic_ns())
+
+    def step_edge(self, edges, now):
+        '''
+        edges: [(pin, ts), ..] from the edge source
+
+        return: time(ns) to check the levels, or None
+        '''
+        n = 0
+        for pin, ts in edges:
+            if pin == self.pin[0]:
+                n += self.decoder.update(self.decoder.state ^ 2, ts)
+            elif pin == self.pin[1]:
+                n += self.decoder.update(self.decoder.state ^ 1, ts)
+
+        if len(edges) > 0:
+            self.check_ns = now + self.interval_ns
+        elif self.check_ns is not None and now >= self.check_ns:
+            # quiet: a lost edge leaves the state different
+            self.decoder.resync(self.read())
+            self.check_ns = None
+
+        self.health.loop(now, self.gpio.monotonic_ns(), n, self.decoder.valq)
+        return self.check_ns
+
+    def stats(self, reset=False):
+        snap = self.health.snapshot()
+        snap['steps']  = self.decoder.steps
+        snap['missed'] = self.decoder.missed
+        if reset:
+            self.health.reset()
+            self.decoder.steps  = 0
+            self.decoder.missed = 0
+        return snap
+
+    def stop(self):
+        self.logger.debug('')
+        self.loop_flag = False
+        if self.edge_src is not None:
+            self.edge_src.wake()
+        self.gpio.join(self)
+        if self.edge_src is not None:
+            self.edge_src.close()
+        self.logger.debug('join()')
+
+class QuadratureHubEntry(SwitchHubEntry):
+    '''
+    rotary encoder sampled by SwitchHub (see QuadratureWatcher)
+    '''
+    def __init__(self, hub, pin, decoder, interval, reader=None,
+                 idle_interval=None, idle_sec=1.0):
+        super().__init__(hub, 0, [], decoder.valq, interval, None,
+                         idle_interval, idle_sec)
+        self.gpio    = get_backend()
+        self.pin     = pin
+        self.decoder = decoder
+        self.reader  = get_reader(reader, pin)
+        self.active  = 0
+
+        for p in self.pin:
+            self.gpio.setup(p, self.gpio.IN, pull_up_down=self.gpio.PUD_UP)
+        self.decoder.update(read_state(self.gpio, self.pin, self.reader))
+
+    def sample(self, timers=None, now=None):
+        changes = self.decoder.changes
+        n = self.decoder.update(read_state(self.gpio, self.pin, self.reader),
+                                now)
+        self.active = n + (self.decoder.changes - changes)
+        return n
+
+    def next_interval_ns(self, n_events, now):
+        if self.adapt is None:
+            return self.interval_ns
+        return self.adapt.next_ns((), self.active, now)
+
+    def stats(self, reset=False):
+        snap = super().stats(reset)
+        snap['steps']  = self.decoder.steps
+        snap['missed'] = self.decoder.missed
+        if reset:
+            self.decoder.steps  = 0
+            self.decoder.missed = 0
+        return snap
 
 #####
 class sample:
-    def __init__(self, pin, debug):
+    def __init__(self, pin, debug, words=None):
         self.logger = init_logger(__class__.__name__, debug)
         self.logger.debug('pin=%s', pin)
+        self.logger.debug('words=%s', words)
+
+        self.pages = None
+        self.trie  = None
+        if words is not None:
+            self.pages = PAGES_ASCII
+            self.trie  = CharTrie(load_words(words), debug=debug)
 
         self.pin_re    = pin[0:2]
         self.pin_sw    = pin[2]
@@ -236,7 +812,7 @@ class sample:
         self.rel = RotaryEncoderListener(self.pin_re, self.cb_re, debug=debug)
         self.sw  = Switch(self.pin_sw, debug=debug)
         self.sl  = SwitchListener([self.sw], self.cb_sw, debug=debug)
-        self.start_sec = time.time()
+        self.start_ns = time.monotonic_ns()
 
         self.loop_flag = True
         while self.loop_flag:
@@ -247,7 +823,8 @@ class sample:
 
         print('')
         print('### RotaryKey demo')
-        self.rek = RotaryKey(self.pin_re, self.pin_sw, self.cb_rk, debug=debug)
+        self.rek = RotaryKey(self.pin_re, self.pin_sw, self.cb_rk,
+                             pages=self.pages, trie=self.trie, debug=debug)
 
         self.loop_flag = True
         while self.loop_flag:
@@ -259,11 +836,13 @@ class sample:
         print('### Finished')
 
     def cb_re(self, v):
-        print('%.3f, ' % (time.time() - self.start_sec), end='')
+        print('%.3f, ' % ((time.monotonic_ns() - self.start_ns) / 1000000000),
+              end='')
         print('%s' % RotaryEncoder.val2str(v))
 
     def cb_sw(self, event):
-        print('%.3f, ' % (time.time() - self.start_sec), end='')
+        print('%.3f, ' % ((time.monotonic_ns() - self.start_ns) / 1000000000),
+              end='')
         event.print()
         if event.name == 'timer' and event.timeout_idx == 1:
             print('long pressed: %d' % event.pin)
@@ -290,29 +869,30 @@ class sample:
 CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
 @click.command(context_settings=CONTEXT_SETTINGS)
 @click.argument('pin', metavar='pin1 pin2 pin_sw', type=int, nargs=3)
+@click.option('--words', '-w', 'words', type=click.Path(exists=True),
+              default=None, help='word list for RotaryKey (ASCII pages)')
 @click.option('--debug', '-d', 'debug', is_flag=True, default=False,
               help='debug flag')
-def main(pin, debug):
+def main(pin, words, debug):
     logger.setLevel(INFO)
     if debug:
         logger.setLevel(DEBUG)
 
     setup_GPIO()
     try:
-        sample(pin, debug).main(debug)
+        sample(pin, debug, words).main(debug)
     finally:
         cleanup_GPIO()
 
 def setup_GPIO():
     logger.debug('')
 
-    GPIO.setwarnings(False)
-    GPIO.setmode(GPIO.BCM)
+    get_backend().init()
 
 def cleanup_GPIO():
     logger.debug('')
 
-    GPIO.cleanup()
+    get_backend().cleanup()
 
 if __name__ == '__main__':
     main()
@@ -2,9 +2,13 @@
 #
 # (C) 2018 Yoichi Tanibayashi
 #
-import RPi.GPIO as GPIO
+from GpioLevel import get_reader
+from GpioEdge import get_edge_source
+from GpioBackend import get_backend
 import threading
 import queue
+import heapq
+import collections
 import time
 
 import click
@@ -28,105 +32,351 @@ def init_logger(name, debug):
         l.setLevel(INFO)
     return l
 
+def get_batch(q, null, size, batch_sec=0):
+    '''
+    get items from q: wait for the first item, and then get the queued
+    items up to `size` items or `batch_sec` seconds.
+    The list ends with `null` if it was got.
+    '''
+    items = [q.get()]
+    t_end = time.monotonic_ns() + int(batch_sec * 1000000000)
+    while len(items) < size and items[-1] != null:
+        try:
+            t_wait = t_end - time.monotonic_ns()
+            if t_wait > 0:
+                items.append(q.get(timeout=t_wait / 1000000000))
+            else:
+                items.append(q.get_nowait())
+        except queue.Empty:
+            break
+    return items
+
 class SwitchListener(threading.Thread):
     '''
     stop(): Dont't forget to call stop() when finished
 
     callback function: cb_func(event) ... event: SwitchEvent class
+    event.latency_ns(): sample-to-callback latency
+
+    batch callback   : cb_batch(events) ... list of SwitchEvent
+        If cb_batch is given, it is called instead of cb_func with
+        the queued events (in order), up to batch_size events or
+        batch_sec seconds.
+
+    edge     : True|'RPi.GPIO'|'chardev'
+               use edge detection instead of polling (see SwitchWatcher)
+    hub=True : sampled by the shared SwitchHub thread (edge is ignored)
+    pool=True: recycle SwitchEvent objects (see SwitchEventPool)
+               Don't keep the event after cb_func returns.
+    reader   : read all the pins at once (see GpioLevel.get_reader())
+               e.g. 'gpiomem'. None: GPIO.input() for each switch
+    idle_interval: sample every idle_interval while idle
+               (see SwitchWatcher)
+
+    The thread is started by the backend (see GpioBackend): with the
+    simulator, step() is called in virtual time instead.
+
+    stats(): callback run time, eventq depth at dispatch and the
+             watcher's loop health (see SwitchWatcher.stats())
     '''
 
     def __init__(self, switch, cb_func, sw_loop_interval=0.02,
-                 debug=False):
+                 debug=False, edge=False, hub=False, pool=False,
+                 cb_batch=None, batch_size=64, batch_sec=0, reader=None,
+                 idle_interval=None, idle_sec=1.0):
         self.logger = init_logger(__class__.__name__, debug)
         self.logger.debug('sw_loop_interval:%.4f', sw_loop_interval)
+        self.logger.debug('idle_interval:%s, idle_sec:%.2f',
+                          idle_interval, idle_sec)
+        self.logger.debug('edge:%s', edge)
+        self.logger.debug('hub :%s', hub)
+        self.logger.debug('batch_size:%d, batch_sec:%.4f',
+                          batch_size, batch_sec)
             
-        self.switch  = switch
-        self.cb_func = cb_func
+        self.gpio       = get_backend()
+        self.switch     = switch
+        self.cb_func    = cb_func
+        self.cb_batch   = cb_batch
+        self.batch_size = batch_size
+        self.batch_sec  = batch_sec
 
         self.eventq  = queue.Queue()
 
-        self.sw = SwitchWatcher(self.switch, self.eventq, sw_loop_interval,
-                                debug)
+        self.cb_ns       = Histogram(1000000)
+        self.queue_depth = Histogram()
+
+        self.pool = None
+        if pool:
+            self.pool = SwitchEventPool()
+            for sw in self.switch:
+                sw.pool = self.pool
+
+        if hub:
+            self.sw = SwitchHub.get().add(self.switch, self.eventq,
+                                          sw_loop_interval, reader=reader,
+                                          idle_interval=idle_interval,
+                                          idle_sec=idle_sec)
+        else:
+            self.sw = SwitchWatcher(self.switch, self.eventq,
+                                    sw_loop_interval, debug, edge=edge,
+                                    reader=reader,
+                                    idle_interval=idle_interval,
+                                    idle_sec=idle_sec)
 
         super().__init__(daemon=True)
-        self.start()
+        self.gpio.spawn(self)
 
     def run(self):
         self.logger.debug('start')
+        if self.cb_batch is not None:
+            self.run_batch()
+            self.logger.debug('end')
+            return
+
         while True:
             event = self.eventq.get()
             if event == SwitchEvent.NULL:
                 break
-            self.cb_func(event)
+            self.dispatch(event)
         self.logger.debug('end')
 
+    def run_batch(self):
+        while True:
+            events = get_batch(self.eventq, SwitchEvent.NULL,
+                               self.batch_size, self.batch_sec)
+            end = (events[-1] == SwitchEvent.NULL)
+            if end:
+                events.pop()
+
+            self.dispatch_batch(events)
+
+            if end:
+                break
+
+    def step(self, now=None):
+        '''
+        dispatch the queued events (without waiting)
+
+        return: None (nothing to do until the next event)
+        '''
+        events = []
+        while not self.eventq.empty():
+            event = self.eventq.get()
+            if event == SwitchEvent.NULL:
+                break
+            events.append(event)
+
+        if self.cb_batch is None:
+            for event in events:
+                self.dispatch(event)
+            return None
+
+        for i in range(0, len(events), self.batch_size):
+            self.dispatch_batch(events[i:i + self.batch_size])
+        return None
+
+    def dispatch(self, event):
+        event.ts_dispatch = self.gpio.monotonic_ns()
+        self.logger.debug('pin=%d, name=%s, latency=%.3f ms',
+                          event.pin, event.name,
+                          event.latency_ns() / 1000000)
+        self.queue_depth.add(self.eventq.qsize())
+        self.cb_func(event)
+        self.cb_ns.add(self.gpio.monotonic_ns() - event.ts_dispatch)
+        if self.pool is not None:
+            self.pool.put(event)
+
+    def dispatch_batch(self, events):
+        if len(events) == 0:
+            return
+
+        now = self.gpio.monotonic_ns()
+        for event in events:
+            event.ts_dispatch = now
+        self.logger.debug('%d events', len(events))
+        self.queue_depth.add(self.eventq.qsize())
+        self.cb_batch(events)
+        self.cb_ns.add(self.gpio.monotonic_ns() - now)
+        if self.pool is not None:
+            for event in events:
+                self.pool.put(event)
+
+    def stats(self, reset=False):
+        '''
+        callback_ms: cb_func (or cb_batch) run time
+        queue_depth: eventq.qsize() when dispatched
+        watcher    : SwitchWatcher.stats() (or SwitchHubEntry.stats())
+        '''
+        snap = {
+            'callback_ms': self.cb_ns.snapshot(),
+            'queue_depth': self.queue_depth.snapshot(),
+            'watcher':     self.sw.stats(reset)
+        }
+        if reset:
+            self.cb_ns.reset()
+            self.queue_depth.reset()
+        return snap
+
     def stop(self):
         self.logger.debug('')
         self.sw.stop()
         self.eventq.put(SwitchEvent.NULL)
-        self.join()
+        self.gpio.join(self)
         self.logger.debug('join()')
 
 class SwitchTimer:
+    '''
+    time(ns) based timer (clock: GpioBackend)
+
+    expire : time(ns) of the next timeout (calculated on start and
+             next_timeout)
+    gen    : incremented on every start, stop and next_timeout
+             (to detect stale entries in SwitchTimerHeap)
+    '''
     def __init__(self, timeout_sec=[0.7, 1, 3, 5, 7], debug=False):
         self.logger = init_logger(__class__.__name__, debug)
         self.logger.debug('timeout_sec:%s', timeout_sec)
 
+        self.gpio        = get_backend()
         self.timeout_sec = timeout_sec
+        self.timeout_ns  = [int(t * 1000000000) for t in timeout_sec]
+        self.gen         = 0
 
         self.stop()
         self.logger.debug('timeout_idx:%d', self.timeout_idx)
-        self.logger.debug('start_sec  :%f', self.start_sec)
+        self.logger.debug('start_ns   :%d', self.start_ns)
             
-    def start(self):
+    def start(self, now=None):
+        '''
+        now: start time(ns). default: now
+        '''
         self.logger.debug('')
 
-        if len(self.timeout_sec) == 0:
+        if len(self.timeout_ns) == 0:
             self.logger.debug('ignored')
             self.stop()
             return
-        
-        self.start_sec   = time.time()
+
+        if now is None:
+            now = self.gpio.monotonic_ns()
+        self.start_ns    = now
         self.timeout_idx = 0
+        self.expire      = self.start_ns + self.timeout_ns[0]
+        self.gen        += 1
 
     def stop(self):
         self.logger.debug('')
-        self.start_sec   = -1
+        self.start_ns    = -1
         self.timeout_idx = -1
+        self.expire      = None
+        self.gen        += 1
 
     def is_alive(self):
-        return (self.start_sec > 0)
+        return (self.expire is not None)
 
-    def is_expired(self):
-        if not self.is_alive():
+    def is_expired(self, now=None):
+        if self.expire is None:
             return False
-        
-        timer_sec = time.time() - self.start_sec
-        tout_sec  = self.timeout_sec[self.timeout_idx]
-        return (timer_sec >= tout_sec)
+
+        if now is None:
+            now = self.gpio.monotonic_ns()
+        return (now >= self.expire)
+
+    def expire_ns(self):
+        '''
+        time(ns) of the next timeout, or None
+        '''
+        return self.expire
 
     def next_timeout(self):
         self.timeout_idx += 1
-        if self.timeout_idx >= len(self.timeout_sec):
+        if self.timeout_idx >= len(self.timeout_ns):
             self.stop()
+            return
+
+        self.expire = self.start_ns + self.timeout_ns[self.timeout_idx]
+        self.gen   += 1
+
+class SwitchTimerHeap:
+    '''
+    min-heap of the SwitchTimer timeouts shared by switches
+
+    push(sw, eventq): schedule the next timeout of sw.timer
+    next_ns()       : time(ns) of the nearest timeout, or None
+    expire(now)     : put timer events of the expired switches to
+                      their eventq (now: time(ns)).
+                      return: number of the events
+    '''
+    def __init__(self):
+        self.heap = []	# (expire, seq, gen, sw, eventq)
+        self.seq  = 0
+
+    def push(self, sw, eventq):
+        t = sw.timer.expire_ns()
+        if t is None:
+            return
+
+        self.seq += 1
+        heapq.heappush(self.heap, (t, self.seq, sw.timer.gen, sw, eventq))
+
+    def next_ns(self):
+        while len(self.heap) > 0:
+            t, seq, gen, sw, eventq = self.heap[0]
+            if gen == sw.timer.gen:
+                return t
+            heapq.heappop(self.heap)	# stale
+        return None
+
+    def expire(self, now):
+        n = 0
+        while len(self.heap) > 0 and self.heap[0][0] <= now:
+            t, seq, gen, sw, eventq = heapq.heappop(self.heap)
+            if gen != sw.timer.gen:
+                continue
+
+            n += sw.update(sw.prev_onoff, eventq, now=now)
+            if sw.prev_onoff == Switch.OFF:
+                sw.reset_off()	# 次のサンプルを待たない (edge mode)
+            self.push(sw, eventq)
+        return n
 
 class SwitchEvent:
-    NULL = 0
+    '''
+    read-only record (don't change the attributes)
 
-    def __init__(self, pin, name, timeout_idx, value, push_count, debug=False):
-        self.logger = init_logger(__class__.__name__, debug)
+    ts_detect  : time(ns) when the change was detected
+                 (edge or sample time, or the timeout for 'timer')
+    ts_enqueue : time(ns) when the event was put to eventq
+    ts_dispatch: time(ns) when the event was passed to the callback
+                 (set by SwitchListener)
 
-        self.logger.debug('pin=%d, name=%s', pin, name)
+    all times are monotonic_ns() of the backend, 0 if unknown
+    '''
+    __slots__ = ('pin', 'name', 'timeout_idx', 'value', 'push_count',
+                 'ts_detect', 'ts_enqueue', 'ts_dispatch')
 
+    NULL = 0
+
+    def __init__(self, pin, name, timeout_idx, value, push_count,
+                 ts_detect=0, ts_enqueue=0):
         self.pin         = pin
         self.name        = name
         self.timeout_idx = timeout_idx
         self.value       = value
         self.push_count  = push_count
+        self.ts_detect   = ts_detect
+        self.ts_enqueue  = ts_enqueue
+        self.ts_dispatch = 0
+
+    def latency_ns(self):
+        '''
+        ts_detect -> ts_dispatch(ns)
+        '''
+        if self.ts_detect == 0 or self.ts_dispatch == 0:
+            return 0
+        return self.ts_dispatch - self.ts_detect
 
     def click_count(self):
-        self.logger.debug('')
-        
         if self.name != 'timer':
             return 0
 
@@ -139,8 +389,6 @@ class SwitchEvent:
         return self.push_count
     
     def longpress_level(self):
-        self.logger.debug('')
-        
         if self.name != 'timer':
             return 0
         if self.value == Switch.OFF:
@@ -154,6 +402,221 @@ class SwitchEvent:
         print('  timeout_idx: %d' % self.timeout_idx)
         print('  value      : %s' % Switch.val2str(self.value))
         print('  push_count : %d' % self.push_count)
+        print('  latency    : %.3f ms' % (self.latency_ns() / 1000000))
+
+class SwitchEventPool:
+    '''
+    recycled SwitchEvent objects
+
+    get(): same arguments as SwitchEvent()
+    put(): give back the event (SwitchListener does it after cb_func)
+
+    IMPORTANT:
+    don't keep the event after the callback returns
+    '''
+    def __init__(self, size=256):
+        self.free = collections.deque(maxlen=size)
+
+    def get(self, pin, name, timeout_idx, value, push_count,
+            ts_detect=0, ts_enqueue=0):
+        try:
+            e = self.free.pop()
+        except IndexError:
+            return SwitchEvent(pin, name, timeout_idx, value, push_count,
+                               ts_detect, ts_enqueue)
+
+        e.pin         = pin
+        e.name        = name
+        e.timeout_idx = timeout_idx
+        e.value       = value
+        e.push_count  = push_count
+        e.ts_detect   = ts_detect
+        e.ts_enqueue  = ts_enqueue
+        e.ts_dispatch = 0
+        return e
+
+    def put(self, e):
+        self.free.append(e)
+
+class Histogram:
+    '''
+    log2-bucket histogram of non-negative integers (cheap enough to
+    leave on: one bit_length() and a few additions per add())
+
+    scale: snapshot() values are divided by scale (e.g. ns -> ms)
+    '''
+    def __init__(self, scale=1):
+        self.scale = scale
+        self.reset()
+
+    def reset(self):
+        self.bucket = [0] * 65	# bucket[i]: 2**(i-1) <= v < 2**i
+        self.count  = 0
+        self.total  = 0
+        self.max    = 0
+
+    def add(self, v):
+        if v < 0:
+            v = 0
+        self.bucket[v.bit_length()] += 1
+        self.count += 1
+        self.total += v
+        if v > self.max:
+            self.max = v
+
+    def percentile(self, p):
+        '''
+        upper bound of the bucket (not larger than max), or None
+        '''
+        if self.count == 0:
+            return None
+        n = self.count * p / 100
+        acc = 0
+        for i, c in enumerate(self.bucket):
+            acc += c
+            if acc >= n and c > 0:
+                return min((1 << i) - 1, self.max)
+        return self.max
+
+    def snapshot(self):
+        '''
+        count, mean, p50, p90, p99, max and the buckets
+        {upper bound: count} (non-empty buckets only)
+        '''
+        def sc(v):
+            if v is None or self.scale == 1:
+                return v
+            return v / self.scale
+
+        mean = None
+        if self.count > 0:
+            mean = self.total / self.count
+        return {
+            'count':  self.count,
+            'mean':   sc(mean),
+            'p50':    sc(self.percentile(50)),
+            'p90':    sc(self.percentile(90)),
+            'p99':    sc(self.percentile(99)),
+            'max':    sc(self.max) if self.count > 0 else None,
+            'bucket': {sc((1 << i) - 1): c
+                       for i, c in enumerate(self.bucket) if c > 0}
+        }
+
+class WatcherStats:
+    '''
+    health of a sampling loop (SwitchWatcher, SwitchHubEntry)
+
+    loop_ms        : time to sample the switches and expire the timers
+    overshoot_ms   : wake-up time - scheduled time
+    overrun        : number of loops that took loop_interval or longer
+    events_per_loop: events put to eventq per loop
+    queue_depth    : eventq.qsize() after the loop
+                     (if eventq has qsize())
+    '''
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.loops           = 0
+        self.overrun         = 0
+        self.loop_ns         = Histogram(1000000)
+        self.overshoot_ns    = Histogram(1000000)
+        self.events_per_loop = Histogram()
+        self.queue_depth     = Histogram()
+
+    def loop(self, t_start, t_end, n_events, eventq, interval_ns=0,
+             t_sched=None):
+        '''
+        record one loop
+
+        return: True if it was an overrun
+        '''
+        self.loops += 1
+        self.loop_ns.add(t_end - t_start)
+        if t_sched is not None:
+            self.overshoot_ns.add(t_start - t_sched)
+        self.events_per_loop.add(n_events)
+
+        qsize = getattr(eventq, 'qsize', None)
+        if qsize is not None:
+            self.queue_depth.add(qsize())
+
+        if interval_ns > 0 and t_end - t_start >= interval_ns:
+            self.overrun += 1
+            return True
+        return False
+
+    def snapshot(self):
+        return {
+            'loops':           self.loops,
+            'overrun':         self.overrun,
+            'loop_ms':         self.loop_ns.snapshot(),
+            'overshoot_ms':    self.overshoot_ns.snapshot(),
+            'events_per_loop': self.events_per_loop.snapshot(),
+            'queue_depth':     self.queue_depth.snapshot()
+        }
+
+class AdaptiveInterval:
+    '''
+    sampling interval of a polling loop
+
+    fast (interval) while any input is active, slow (idle_interval)
+    after idle_sec without activity. The first detected change jumps
+    back to the fast interval.
+
+    active: events in the loop, a switch is ON or its filter has seen
+            a change (val), or its timer is pending
+
+    The fast interval is calibrated with the loop times (WatcherStats):
+    it is kept at least `margin` times the p99 loop time, so the pin
+    count can be sampled without overruns.
+    '''
+    CALIBRATE_LOOPS = 100
+
+    def __init__(self, interval, idle_interval, idle_sec=1.0, margin=2,
+                 health=None):
+        self.interval_ns = int(interval * 1000000000)
+        self.idle_ns     = int(idle_interval * 1000000000)
+        self.quiet_ns    = int(idle_sec * 1000000000)
+        self.margin      = margin
+        self.health      = health
+
+        self.fast_ns     = self.interval_ns
+        self.cur_ns      = self.interval_ns
+        self.active_ns   = None	# time(ns) of the last activity
+        self.n_loop      = 0
+
+    @staticmethod
+    def is_active(switch):
+        for sw in switch:
+            if (sw.prev_onoff == Switch.ON or sw.val < 0.99 or
+                    sw.timer.is_alive()):
+                return True
+        return False
+
+    def next_ns(self, switch, n_events, now):
+        '''
+        return: interval(ns) until the next sample
+        '''
+        self.n_loop += 1
+        if self.health is not None and self.n_loop >= self.CALIBRATE_LOOPS:
+            self.n_loop = 0
+            self.calibrate()
+
+        if n_events > 0 or self.is_active(switch):
+            self.active_ns = now
+        if self.active_ns is not None and \
+           now - self.active_ns < self.quiet_ns:
+            self.cur_ns = self.fast_ns
+        else:
+            self.cur_ns = max(self.idle_ns, self.fast_ns)
+        return self.cur_ns
+
+    def calibrate(self):
+        p99 = self.health.loop_ns.percentile(99)
+        if p99 is None:
+            return
+        self.fast_ns = max(self.interval_ns, int(p99 * self.margin))
 
 class Switch:
     '''
@@ -177,18 +640,25 @@ class Switch:
         self.logger.debug('pin         : %d', pin)
         self.logger.debug('timeout_sec : %s', timeout_sec)
 
+        self.gpio        = get_backend()
         self.pin         = pin
         self.timeout_sec = timeout_sec
 
-        GPIO.setup(self.pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+        self.gpio.setup(self.pin, self.gpio.IN,
+                        pull_up_down=self.gpio.PUD_UP)
         
         self.timer      = SwitchTimer(self.timeout_sec, debug=debug)
         self.val        = 1.0
         self.prev_onoff = self.OFF
         self.push_count = 0
+        self.pool       = None	# SwitchEventPool (set by SwitchListener)
 
-    def get_onoff(self):
-        new_val = GPIO.input(self.pin)
+    def get_onoff(self, new_val=None):
+        '''
+        new_val: input level (already read), or None: GPIO.input()
+        '''
+        if new_val is None:
+            new_val = self.gpio.input(self.pin)
 
         # ここまでやる？
         self.val = new_val * 0.6 + self.val * 0.4
@@ -201,80 +671,487 @@ class Switch:
 
         return onoff
 
+    def update(self, onoff, eventq, timers=None, now=None):
+        '''
+        check onoff and timer, and put SwitchEvent(s) to eventq
+
+        timers: SwitchTimerHeap
+                If given, the timer is not checked here, but it is
+                pushed to timers when (re)started.
+        now   : time(ns) when onoff was detected. default: now
+
+        return: number of the events
+        '''
+        if now is None:
+            now = self.gpio.monotonic_ns()
+        gen = self.timer.gen
+        n   = 0
+
+        if onoff == self.OFF:
+            self.reset_off()
+
+        if onoff != self.prev_onoff:
+            self.logger.debug('onoff=%d:%s', onoff, self.val2str(onoff))
+            self.prev_onoff = onoff
+
+            if onoff == self.ON: # pressed
+                self.push_count += 1
+                if self.push_count == 1:
+                    self.timer.start(now)
+
+                eventq.put(self.new_event('pressed', onoff, now))
+            else: # released
+                eventq.put(self.new_event('released', onoff, now))
+            n += 1
+
+        if timers is not None:
+            if self.timer.gen != gen:
+                timers.push(self, eventq)
+            return n
+
+        while self.timer.is_expired(now):
+            eventq.put(self.new_event('timer', onoff, self.timer.expire))
+            self.timer.next_timeout()
+            n += 1
+        return n
+
+    def reset_off(self):
+        '''
+        while OFF: clear push_count after the multi-click timeout, and
+        stop the long-press timeouts
+        '''
+        idx = self.timer.timeout_idx
+        if idx != 0:
+            self.push_count = 0 # push_countクリア
+        if idx >= 1:
+            self.timer.stop() # タイマーストップ
+
+    def new_event(self, name, onoff, ts_detect):
+        if self.pool is None:
+            return SwitchEvent(self.pin, name, self.timer.timeout_idx,
+                               onoff, self.push_count, ts_detect,
+                               self.gpio.monotonic_ns())
+
+        return self.pool.get(self.pin, name, self.timer.timeout_idx,
+                             onoff, self.push_count, ts_detect,
+                             self.gpio.monotonic_ns())
+
+def sample(switch, eventq, reader=None, timers=None, now=None):
+    '''
+    sample the switches once
+
+    reader: GpioLevelReader (read all the pins at once) or None
+
+    return: number of the events
+    '''
+    n = 0
+    if reader is None:
+        for sw in switch:
+            n += sw.update(sw.get_onoff(), eventq, timers, now)
+        return n
+
+    bits = reader.read()
+    for sw in switch:
+        n += sw.update(sw.get_onoff((bits >> sw.pin) & 1), eventq,
+                       timers, now)
+    return n
+
 class SwitchWatcher(threading.Thread):
     '''
     stop(): Don't forget to call stop() when finished
+
+    edge=False: poll all switches every loop_interval
+    edge=True : wake up only on edges or SwitchTimer timeouts.
+                loop_interval is used as debounce time.
+                True|'RPi.GPIO': GPIO.add_event_detect()
+                'chardev'      : GPIO character device
+                                 (kernel timestamps)
+                see GpioEdge.py
+
+    reader    : polling mode only. read all the pins at once
+                (see GpioLevel.get_reader())
+
+    idle_interval: polling mode only. sample every idle_interval
+                while all the inputs are idle and no timers are
+                pending, and every loop_interval (calibrated, see
+                AdaptiveInterval) from the first change until
+                idle_sec without activity. None: always loop_interval
+                Note: a change shorter than idle_interval can be
+                missed while idle (use edge mode for fast encoders).
+
+    step(now) : one iteration of the loop (called by the backend
+                simulator instead of the thread)
+
+    stats()   : loop health snapshot (see WatcherStats)
+                stats(reset=True) clears the counters
     '''
 
-    def __init__(self, switch, eventq, loop_interval=0.02, debug=False):
+    def __init__(self, switch, eventq, loop_interval=0.02, debug=False,
+                 edge=False, reader=None, idle_interval=None, idle_sec=1.0):
         self.logger = init_logger(__class__.__name__, debug)
         self.logger.debug('loop_interval:%.4f', loop_interval)
+        self.logger.debug('edge:%s', edge)
+        self.logger.debug('idle_interval:%s, idle_sec:%.2f',
+                          idle_interval, idle_sec)
 
+        self.gpio          = get_backend()
         self.switch        = switch
         self.eventq        = eventq
         self.loop_interval = loop_interval
+        self.interval_ns   = int(loop_interval * 1000000000)
+        self.edge          = edge
+        self.reader        = get_reader(reader, [sw.pin for sw in switch],
+                                        debug=debug)
+
+        self.timers  = SwitchTimerHeap()
+        self.next_ns = self.gpio.monotonic_ns()
+        self.t_wake  = None	# scheduled time of the next step()
+        self.health  = WatcherStats()
+
+        self.adapt = None
+        if idle_interval is not None and not edge:
+            self.adapt = AdaptiveInterval(loop_interval, idle_interval,
+                                          idle_sec, health=self.health)
+
+        self.edge_src = None
+        if self.edge:
+            self.edge_src = get_edge_source(self.edge,
+                                            [sw.pin for sw in switch],
+                                            debug=debug)
+            self.sw_pin = {}
+            self.settle = {}	# pin -> [time(ns) to read, first edge(ns)]
+            for sw in self.switch:
+                self.sw_pin[sw.pin] = sw
+                self.settle[sw.pin] = [self.next_ns, self.next_ns] # 初期状態
 
         self.loop_flag     = True
         super().__init__(daemon=True)
-        self.start()
+        self.gpio.spawn(self)
 
     def run(self):
         self.logger.debug('start')
 
+        if self.edge:
+            self.run_edge()
+            self.logger.debug('end')
+            return
+
         while self.loop_flag:
-            t1 = time.time()			# ロスタイム計算用
-            for sw in self.switch:
-                onoff = sw.get_onoff()
-
-                if onoff == sw.OFF:
-                    idx = sw.timer.timeout_idx
-                    if idx != 0:
-                        sw.push_count = 0 # push_countクリア
-                    if idx >= 1:
-                        sw.timer.stop() # タイマーストップ
-
-                if onoff != sw.prev_onoff:
-                    self.logger.debug('onoff=%d:%s', onoff, sw.val2str(onoff))
-                    sw.prev_onoff = onoff
-
-                    if onoff == sw.ON: # pressed
-                        sw.push_count += 1
-                        if sw.push_count == 1:
-                            sw.timer.start()
-
-                        e = SwitchEvent(sw.pin, 'pressed',
-                                        sw.timer.timeout_idx, onoff,
-                                        sw.push_count)
-                    else: # released
-                        e = SwitchEvent(sw.pin, 'released',
-                                        sw.timer.timeout_idx, onoff,
-                                        sw.push_count)
-                    self.eventq.put(e)
-
-                while sw.timer.is_expired():
-                    e = SwitchEvent(sw.pin, 'timer', sw.timer.timeout_idx,
-                                    onoff, sw.push_count)
-                    self.eventq.put(e)
-                    sw.timer.next_timeout()
-            
-            t_loss = time.time() - t1	# ロスタイム計算
-            t_sleep = self.loop_interval - t_loss
+            # 次のサンプリングか、タイムアウトまで寝る
+            t_wake = self.step(self.gpio.monotonic_ns())
+            t_sleep = t_wake - self.gpio.monotonic_ns()
             if t_sleep > 0:
-                time.sleep(self.loop_interval - t_loss)
-            else:
-                self.logger.warning('t_loss=%f', t_loss)
+                self.gpio.sleep(t_sleep / 1000000000)
 
         self.logger.debug('end')
 
+    def step(self, now):
+        '''
+        sample the switches if it is time, and expire the timers
+
+        return: time(ns) to call step() again
+                (edge mode: None if waiting for an edge)
+        '''
+        if self.edge:
+            return self.step_edge(self.edge_src.wait(0), now)
+
+        n = 0
+        interval_ns = 0
+        if now >= self.next_ns:
+            n += sample(self.switch, self.eventq, self.reader, self.timers,
+                        now)
+            interval_ns = self.interval_ns
+            if self.adapt is not None:
+                interval_ns = self.adapt.next_ns(self.switch, n, now)
+            self.next_ns = now + interval_ns
+
+        t_end = self.gpio.monotonic_ns()
+        n += self.timers.expire(t_end)
+
+        if self.health.loop(now, t_end, n, self.eventq, interval_ns,
+                            self.t_wake):
+            self.logger.debug('overrun: %f', (t_end - now) / 1000000000)
+
+        t_wake = self.next_ns
+        t_timer = self.timers.next_ns()
+        if t_timer is not None and t_timer < t_wake:
+            t_wake = t_timer
+        self.t_wake = t_wake
+        return t_wake
+
+    def run_edge(self):
+        '''
+        edge mode
+
+        Sleep until an edge or the nearest SwitchTimer timeout.
+        An input is read after it has been stable for loop_interval
+        (debounce), so the events are the same as the polling mode.
+        The time of the first edge is used as SwitchEvent.ts_detect.
+        '''
+        t_wake = self.gpio.monotonic_ns()
+        while self.loop_flag:
+            timeout = None
+            if t_wake is not None:
+                timeout = max(t_wake - self.gpio.monotonic_ns(), 0)
+                timeout /= 1000000000
+
+            edges = self.edge_src.wait(timeout)
+            t_wake = self.step_edge(edges, self.gpio.monotonic_ns())
+
+    def step_edge(self, edges, now):
+        '''
+        edges: [(pin, ts), ..] from the edge source
+
+        return: time(ns) of the next settle or timeout, or None
+        '''
+        for pin, ts in edges:
+            if pin in self.settle:
+                self.settle[pin][0] = ts + self.interval_ns
+            else:
+                self.settle[pin] = [ts + self.interval_ns, ts]
+
+        n = 0
+        for pin in [p for p in self.settle if self.settle[p][0] <= now]:
+            ts = self.settle.pop(pin)[1]
+            n += self.sw_pin[pin].update(self.edge_src.level(pin),
+                                         self.eventq, self.timers, ts)
+
+        n += self.timers.expire(now)
+
+        # edges wake up the loop early: overshoot only for timeouts
+        t_sched = self.t_wake
+        if len(edges) > 0:
+            t_sched = None
+        self.health.loop(now, self.gpio.monotonic_ns(), n, self.eventq,
+                         0, t_sched)
+
+        t_wake = [t[0] for t in self.settle.values()]
+        t_timer = self.timers.next_ns()
+        if t_timer is not None:
+            t_wake.append(t_timer)
+        self.t_wake = min(t_wake, default=None)
+        return self.t_wake
+
+    def stats(self, reset=False):
+        '''
+        loop health snapshot (see WatcherStats)
+        '''
+        snap = self.health.snapshot()
+        snap['switches']    = len(self.switch)
+        snap['interval_ms'] = self.interval_ns / 1000000
+        if self.adapt is not None:
+            snap['interval_ms'] = self.adapt.cur_ns / 1000000
+            snap['fast_interval_ms'] = self.adapt.fast_ns / 1000000
+        if reset:
+            self.health.reset()
+        return snap
+
     def stop(self):
         self.logger.debug('')
         self.loop_flag = False
-        self.join()
+        if self.edge_src is not None:
+            self.edge_src.wake()
+        self.gpio.join(self)
+        if self.edge_src is not None:
+            self.edge_src.close()
         self.logger.debug('join()')
                 
+class SwitchHub(threading.Thread):
+    '''
+    Process-wide sampling hub
+
+    One thread samples all the registered switches.
+    Each group of switches is sampled on its own interval, and the
+    SwitchEvents are put to the group's eventq.
+
+    get()  : the shared instance
+    add()  : register switches -> SwitchHubEntry (call stop() to remove)
+    stats(): thread count and wakeups/sec
+    '''
+    _instance = None
+    _lock     = threading.Lock()
+
+    @classmethod
+    def get(cls, debug=False):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = cls(debug=debug)
+            return cls._instance
+
+    def __init__(self, debug=False):
+        self.logger = init_logger(__class__.__name__, debug)
+        self.logger.debug('')
+
+        self.gpio   = get_backend()
+        self.cond   = threading.Condition()
+        self.heap   = []	# [next_ns, entry_id, entry]
+        self.entry  = {}
+        self.timers = SwitchTimerHeap()
+
+        self.entry_id     = 0
+        self.wakeup_count = 0
+        self.stats_count  = 0
+        self.stats_ns     = self.gpio.monotonic_ns()
+
+        super().__init__(daemon=True)
+        self.gpio.spawn(self)
+
+    def add(self, switch, eventq, interval, reader=None,
+            idle_interval=None, idle_sec=1.0):
+        '''
+        idle_interval: see SwitchWatcher
+        '''
+        self.logger.debug('interval:%.4f', interval)
+
+        reader = get_reader(reader, [sw.pin for sw in switch])
+        return self.add_entry(SwitchHubEntry(self, 0, switch, eventq,
+                                             interval, reader,
+                                             idle_interval, idle_sec))
+
+    def add_entry(self, ent):
+        '''
+        register an entry (SwitchHubEntry or a subclass that overrides
+        sample()). ent.entry_id is set here.
+        '''
+        with self.cond:
+            self.entry_id += 1
+            ent.entry_id = self.entry_id
+            self.entry[ent.entry_id] = ent
+            heapq.heappush(self.heap,
+                           [self.gpio.monotonic_ns(), ent.entry_id, ent])
+            self.cond.notify()
+        return ent
+
+    def remove(self, ent):
+        self.logger.debug('entry_id:%d', ent.entry_id)
+
+        with self.cond:
+            # heap からは次回の取り出し時に除く
+            self.entry.pop(ent.entry_id, None)
+
+    def stats(self):
+        '''
+        threads        : number of threads in this process
+        entries        : number of registered entries
+        switches       : number of registered switches
+        wakeups_per_sec: since the previous stats() call
+        '''
+        with self.cond:
+            now = self.gpio.monotonic_ns()
+            wakeups = self.wakeup_count - self.stats_count
+            sec     = (now - self.stats_ns) / 1000000000
+            self.stats_count = self.wakeup_count
+            self.stats_ns    = now
+
+            return {
+                'threads':         threading.active_count(),
+                'entries':         len(self.entry),
+                'switches':        sum([len(e.switch)
+                                        for e in self.entry.values()]),
+                'wakeups_per_sec': wakeups / sec if sec > 0 else 0.0
+            }
+
+    def run(self):
+        self.logger.debug('start')
+
+        with self.cond:
+            while True:
+                t_wake = self.step(self.gpio.monotonic_ns())
+                if t_wake is None:
+                    self.cond.wait()
+                    self.wakeup_count += 1
+                    continue
+
+                t_wait = t_wake - self.gpio.monotonic_ns()
+                if t_wait > 0:
+                    self.cond.wait(t_wait / 1000000000)
+                    self.wakeup_count += 1
+
+    def step(self, now):
+        '''
+        sample the entries that are due, and expire the timers
+        (called with self.cond held, or by the backend simulator)
+
+        return: time(ns) to call step() again, or None
+        '''
+        while len(self.heap) > 0 and self.heap[0][0] <= now:
+            next_ns, entry_id, ent = heapq.heappop(self.heap)
+            if entry_id not in self.entry:
+                continue
+
+            n = ent.sample(self.timers, now)
+            interval_ns = ent.next_interval_ns(n, now)
+            ent.health.loop(now, self.gpio.monotonic_ns(), n, ent.eventq,
+                            interval_ns, next_ns)
+
+            next_ns += interval_ns
+            if next_ns <= now:
+                self.logger.debug('entry_id=%d: t_loss=%f',
+                                  entry_id, (now - next_ns) / 1000000000)
+                next_ns = now + interval_ns
+            heapq.heappush(self.heap, [next_ns, entry_id, ent])
+
+        self.timers.expire(now)
+
+        t_wake = []
+        if len(self.heap) > 0:
+            t_wake.append(self.heap[0][0])
+        t_timer = self.timers.next_ns()
+        if t_timer is not None:
+            t_wake.append(t_timer)
+        return min(t_wake, default=None)
+
+class SwitchHubEntry:
+    '''
+    switches registered to SwitchHub
+
+    stop() : remove from SwitchHub (same as SwitchWatcher.stop())
+    stats(): loop health snapshot (same as SwitchWatcher.stats()).
+             The timer events are shared by the hub, and are not
+             counted in events_per_loop.
+    '''
+    def __init__(self, hub, entry_id, switch, eventq, interval,
+                 reader=None, idle_interval=None, idle_sec=1.0):
+        self.hub         = hub
+        self.entry_id    = entry_id
+        self.switch      = switch
+        self.eventq      = eventq
+        self.interval    = interval
+        self.interval_ns = int(interval * 1000000000)
+        self.reader      = reader
+        self.health      = WatcherStats()
+
+        self.adapt = None
+        if idle_interval is not None:
+            self.adapt = AdaptiveInterval(interval, idle_interval,
+                                          idle_sec, health=self.health)
+
+    def sample(self, timers=None, now=None):
+        return sample(self.switch, self.eventq, self.reader, timers, now)
+
+    def next_interval_ns(self, n_events, now):
+        if self.adapt is None:
+            return self.interval_ns
+        return self.adapt.next_ns(self.switch, n_events, now)
+
+    def stats(self, reset=False):
+        snap = self.health.snapshot()
+        snap['switches']    = len(self.switch)
+        snap['interval_ms'] = self.interval_ns / 1000000
+        if self.adapt is not None:
+            snap['interval_ms'] = self.adapt.cur_ns / 1000000
+            snap['fast_interval_ms'] = self.adapt.fast_ns / 1000000
+        if reset:
+            self.health.reset()
+        return snap
+
+    def stop(self):
+        self.hub.remove(self)
+
 #####
 class app:
-    def __init__(self, pin, debug=False):
+    def __init__(self, pin, edge=False, hub=False, idle_interval=None,
+                 debug=False):
         logger.setLevel(INFO)
         if debug:
             logger.setLevel(DEBUG)
@@ -287,7 +1164,8 @@ class app:
         for p in pin:
             sw.append(Switch(p, debug=debug))
 
-        sl = SwitchListener(sw, self.cb, debug=debug)
+        sl = SwitchListener(sw, self.cb, debug=debug, edge=edge, hub=hub,
+                            idle_interval=idle_interval)
 
     def main(self):
         if len(self.pin) < 1:
@@ -305,29 +1183,36 @@ class app:
 CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
 @click.command(context_settings=CONTEXT_SETTINGS)
 @click.argument('pin', metavar='<pin>', type=int, nargs=-1)
+@click.option('--edge', '-e', 'edge',
+              type=click.Choice(['RPi.GPIO', 'chardev']), default=None,
+              help='edge detection mode')
+@click.option('--hub', 'hub', is_flag=True, default=False,
+              help='use shared SwitchHub')
+@click.option('--idle', '-i', 'idle_interval', type=float, default=None,
+              help='sampling interval(sec) while idle')
 @click.option('--debug', '-d', 'debug', is_flag=True, default=False,
               help='debug flag')
-def main(pin, debug):
+def main(pin, edge, hub, idle_interval, debug):
     logger.setLevel(INFO)
     if debug:
         logger.setLevel(DEBUG)
 
     setup_GPIO()
     try:
-        app(pin, debug=debug).main()
+        app(pin, edge=edge, hub=hub, idle_interval=idle_interval,
+            debug=debug).main()
     finally:
         cleanup_GPIO()
 
 def setup_GPIO():
     logger.debug('')
 
-    GPIO.setwarnings(False)
-    GPIO.setmode(GPIO.BCM)
+    get_backend().init()
 
 def cleanup_GPIO():
     logger.debug('')
 
-    GPIO.cleanup()
+    get_backend().cleanup()
 
 if __name__ == '__main__':
     main()
@@ -2,6 +2,7 @@
 #
 # (C) Yoichi Tanibayashi
 #
+from GpioEdge import GpioChipEdgeSource
 import RPi.GPIO as GPIO
 import time
 import threading
@@ -31,6 +32,13 @@ def get_logger(name, debug=False):
 
 #####
 class Switch1(threading.Thread):
+    '''
+    event: {'ts': time(ns), 'tm_on': on time(ns), 'val': STAT_*}
+    time is time.monotonic_ns()
+
+    edge: 'RPi.GPIO' ... GPIO.add_event_detect(bouncetime)
+          'chardev'  ... GPIO character device (kernel timestamps)
+    '''
     BOUNCE_TIME = 20 # msec
     EVENT_TOUT  = 0.5 # sec
 
@@ -44,26 +52,38 @@ class Switch1(threading.Thread):
     STAT_OFF    = 1
     STAT_HOLD   = 2
     
-    def __init__(self, pin, bouncetime=BOUNCE_TIME, debug=False):
+    def __init__(self, pin, bouncetime=BOUNCE_TIME, edge='RPi.GPIO',
+                 debug=False):
         self.debug = debug
         self.logger = get_logger(__class__.__name__, debug)
         self.logger.debug('pin : %d', pin)
+        self.logger.debug('edge: %s', edge)
 
         self.pin = pin
 
         GPIO.setup(self.pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-        GPIO.add_event_detect(self.pin, GPIO.BOTH, callback=self.handle,
-                              bouncetime=self.BOUNCE_TIME)
 
         self.q      = queue.Queue()
         self.eventq = queue.Queue()
 
         self.stat     = self.STAT_OFF
 
-        self.t_on_start = 0
+        self.on_start = 0
 
         super().__init__(daemon=True)
 
+        # the edges are put to self.q: start them last
+        self.edge_src = None
+        if edge == GpioChipEdgeSource.NAME:
+            self.edge_src = GpioChipEdgeSource([self.pin], debug=debug)
+            self.edge_th  = threading.Thread(target=self.run_edge,
+                                             args=(self.edge_src,),
+                                             daemon=True)
+            self.edge_th.start()
+        else:
+            GPIO.add_event_detect(self.pin, GPIO.BOTH, callback=self.handle,
+                                  bouncetime=self.BOUNCE_TIME)
+
     def get_value(self):
         self.logger.debug('')
         val = GPIO.input(self.pin)
@@ -74,18 +94,40 @@ class Switch1(threading.Thread):
         return self.eventq.get()
 
     def handle(self, pin):
-        ts = time.time()
+        ts = time.monotonic_ns()
         v = self.get_value()
-        self.logger.debug('%.3f:%d:%s', ts, pin, self.VAL[v])
+        self.logger.debug('%d:%d:%s', ts, pin, self.VAL[v])
         self.q.put([ts, v])
 
+    def run_edge(self, src):
+        '''
+        chardev: edges with kernel timestamps
+
+        src: the edge source (end() sets self.edge_src to None,
+             and wakes it up)
+
+        edges within BOUNCE_TIME after the last accepted edge are ignored
+        (same as bouncetime of GPIO.add_event_detect())
+        '''
+        bounce_ns = self.BOUNCE_TIME * 1000000
+        ts_last = -bounce_ns
+        while self.edge_src is src:
+            for pin, ts in src.wait():
+                if ts - ts_last < bounce_ns:
+                    continue
+                ts_last = ts
+
+                v = src.level(pin)
+                self.logger.debug('%d:%d:%s', ts, pin, self.VAL[v])
+                self.q.put([ts, v])
+
     def run(self):
         while True:
             try:
                 [ts, v] = self.q.get(timeout=.5)
             except queue.Empty:
                 # timeout
-                ts = time.time()
+                ts = time.monotonic_ns()
                 v  = self.VAL_TIMEOUT
 
             cur_val  = self.get_value()
@@ -116,7 +158,7 @@ class Switch1(threading.Thread):
             elif self.stat == self.STAT_OFF:
                 if v == self.VAL_ON:
                     self.stat = self.STAT_ON
-                    self.on_start = time.time()
+                    self.on_start = ts
                     ev_out = True
                 elif v == self.VAL_OFF:
                     pass
@@ -155,8 +197,9 @@ class Switch1(threading.Thread):
                     self.on_start = ts
                 tm_on = ts - self.on_start
                 event = {'ts': ts, 'tm_on': tm_on, 'val': self.stat}
-                self.logger.debug('%.3f %s %.3f',
-                                  event['ts'], self.STAT[event['val']], event['tm_on'])
+                self.logger.debug('%d %s %.3f',
+                                  event['ts'], self.STAT[event['val']],
+                                  event['tm_on'] / 1000000000)
                 while self.eventq.full():
                     ev = self.get_event()
                     self.logger.warning('get and ignore event: %s', str(ev))
@@ -165,6 +208,14 @@ class Switch1(threading.Thread):
 
     def end(self):
         self.logger.debug('')
+        if self.edge_src is not None:
+            src = self.edge_src
+            self.edge_src = None
+            src.wake()
+            self.edge_th.join()
+            src.close()
+            return
+
         GPIO.remove_event_detect(self.pin)
 
     @classmethod
@@ -174,7 +225,7 @@ class Switch1(threading.Thread):
 
 #####
 class sample:
-    def __init__(self, pins, debug=False):
+    def __init__(self, pins, edge='RPi.GPIO', debug=False):
         self.debug = debug
         self.logger = get_logger(__class__.__name__, self.debug)
         self.logger.debug('pins=%s', str(pins))
@@ -186,7 +237,7 @@ class sample:
 
         self.sw = []
         for p in self.pins:
-            self.sw.append(Switch1(p, debug=self.debug))
+            self.sw.append(Switch1(p, edge=edge, debug=self.debug))
 
 
     def main(self):
@@ -196,7 +247,9 @@ class sample:
 
         while True:
             ev = self.sw[0].get_event()
-            print('%.3f %s %.3f' % (ev['ts'], Switch1.STAT[ev['val']], ev['tm_on']))
+            print('%.3f %s %.3f' % (ev['ts'] / 1000000000,
+                                    Switch1.STAT[ev['val']],
+                                    ev['tm_on'] / 1000000000))
 
 
     def end(self):
@@ -210,9 +263,12 @@ class sample:
 CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
 @click.command(context_settings=CONTEXT_SETTINGS)
 @click.argument('pins', type=int, nargs=-1)
+@click.option('--edge', '-e', 'edge',
+              type=click.Choice(['RPi.GPIO', 'chardev']), default='RPi.GPIO',
+              help='edge source')
 @click.option('--debug', '-d', 'debug', is_flag=True, default=False,
               help='debug flag')
-def main(pins, debug):
+def main(pins, edge, debug):
     logger.setLevel(INFO)
     if debug:
         logger.setLevel(DEBUG)
@@ -220,7 +276,7 @@ def main(pins, debug):
     logger.debug('pins=%s', str(pins))
 
     try:
-        app = sample(pins, debug=debug)
+        app = sample(pins, edge=edge, debug=debug)
         app.main()
     finally:
         app.end()
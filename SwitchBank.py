@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+#
+# (C) 2019 Yoichi Tanibayashi
+#
+'''
+Bank of switches with NumPy arrays
+
+The same filter and events as Switch/SwitchWatcher, but the EMA values,
+on/off states, push counts and timer deadlines of all the channels are
+kept in arrays and updated in one vectorized step per sample.
+SwitchEvents are created only for the channels that changed.
+
+    bank = SwitchBank(pins, eventq)
+    bank.update(levels)        # levels: array of 0|1 (Switch.OFF == 1)
+    bank.update_bits(bits)     # bits  : bitmask (bit n = pin n)
+'''
+from Switch import Switch, SwitchEvent, WatcherStats
+from Switch import setup_GPIO, cleanup_GPIO
+from GpioBackend import get_backend
+
+import numpy as np
+import threading
+import queue
+
+import click
+
+from logging import getLogger, StreamHandler, Formatter, DEBUG, INFO, WARN
+logger = getLogger(__name__)
+logger.setLevel(INFO)
+handler = StreamHandler()
+handler.setLevel(DEBUG)
+handler_fmt = Formatter(
+    '%(asctime)s %(levelname)s %(name)s.%(funcName)s> %(message)s',
+    datefmt='%H:%M:%S')
+handler.setFormatter(handler_fmt)
+logger.addHandler(handler)
+logger.propagate = False
+def init_logger(name, debug):
+    l = logger.getChild(name)
+    if debug:
+        l.setLevel(DEBUG)
+    else:
+        l.setLevel(INFO)
+    return l
+
+class SwitchBank:
+    '''
+    pins       : channel numbers (pin of SwitchEvent)
+    eventq     : SwitchEvents are put to it
+    timeout_sec: same as Switch (shared by all channels)
+    '''
+    TIMER_OFF = np.iinfo(np.int64).max
+
+    def __init__(self, pins, eventq, timeout_sec=[0.7, 1, 3, 5, 7],
+                 debug=False):
+        self.logger = init_logger(__class__.__name__, debug)
+        self.logger.debug('pins       : %s', pins)
+        self.logger.debug('timeout_sec: %s', timeout_sec)
+
+        self.gpio        = get_backend()
+        self.pins        = np.array(pins, dtype=np.int64)
+        self.eventq      = eventq
+        self.timeout_sec = timeout_sec
+        self.timeout_ns  = np.array([int(t * 1000000000)
+                                     for t in timeout_sec], dtype=np.int64)
+
+        n = len(self.pins)
+        self.val         = np.ones(n, dtype=np.float32)
+        self.onoff       = np.full(n, Switch.OFF, dtype=np.int8)
+        self.push_count  = np.zeros(n, dtype=np.int32)
+        self.timeout_idx = np.full(n, -1, dtype=np.int32)
+        self.start_ns    = np.zeros(n, dtype=np.int64)
+        self.expire      = np.full(n, self.TIMER_OFF, dtype=np.int64)
+
+        self.pin_list = [int(p) for p in self.pins]	# for SwitchEvent
+        self.nbytes   = max(self.pin_list, default=-1) // 8 + 1	# update_bits()
+
+    def update_bits(self, bits, now=None):
+        '''
+        bits: bitmask of the input levels (bit n = pin n, any width)
+        '''
+        bits = int(bits) & ((1 << (self.nbytes * 8)) - 1)
+        levels = np.unpackbits(np.frombuffer(bits.to_bytes(self.nbytes,
+                                                           'little'),
+                                             np.uint8),
+                               bitorder='little')[self.pins]
+        return self.update(levels, now)
+
+    def update(self, levels, now=None):
+        '''
+        levels: input levels of all the channels (0|1)
+        now   : time(ns) of the sample (clock: GpioBackend)
+
+        return: number of events
+        '''
+        if now is None:
+            now = self.gpio.monotonic_ns()
+
+        # Switch.get_onoff()
+        self.val *= 0.4
+        self.val += np.asarray(levels, dtype=np.float32) * 0.6
+        onoff = self.onoff.copy()
+        onoff[self.val > 0.7] = Switch.OFF
+        onoff[self.val < 0.3] = Switch.ON
+
+        # Switch.update(): push_countクリア, タイマーストップ
+        off = (onoff == Switch.OFF)
+        self.push_count[off & (self.timeout_idx != 0)] = 0
+        stop = off & (self.timeout_idx >= 1)
+        self.timeout_idx[stop] = -1
+        self.expire[stop]      = self.TIMER_OFF
+
+        n_event = 0
+        for i in np.flatnonzero(onoff != self.onoff):
+            if onoff[i] == Switch.ON: # pressed
+                self.push_count[i] += 1
+                if self.push_count[i] == 1:
+                    self.timer_start(i, now)
+                self.put_event(i, 'pressed', onoff[i], now)
+            else: # released
+                self.put_event(i, 'released', onoff[i], now)
+            n_event += 1
+        self.onoff = onoff
+
+        return n_event + self.update_timer(now)
+
+    def update_timer(self, now=None):
+        '''
+        put 'timer' events of the expired channels
+
+        return: number of events
+        '''
+        if now is None:
+            now = self.gpio.monotonic_ns()
+
+        n_event = 0
+        for i in np.flatnonzero(self.expire <= now):
+            while self.expire[i] <= now:
+                self.put_event(i, 'timer', self.onoff[i],
+                               int(self.expire[i]))
+                self.timer_next(i)
+                n_event += 1
+        return n_event
+
+    def next_ns(self):
+        '''
+        time(ns) of the nearest timeout, or None
+        '''
+        if len(self.expire) == 0:
+            return None
+
+        t = int(self.expire.min())
+        if t == self.TIMER_OFF:
+            return None
+        return t
+
+    def timer_start(self, i, now):
+        if len(self.timeout_ns) == 0:
+            return
+        self.timeout_idx[i] = 0
+        self.start_ns[i]    = now
+        self.expire[i]      = now + self.timeout_ns[0]
+
+    def timer_next(self, i):
+        idx = self.timeout_idx[i] + 1
+        if idx >= len(self.timeout_ns):
+            self.timeout_idx[i] = -1
+            self.expire[i]      = self.TIMER_OFF
+            return
+        self.timeout_idx[i] = idx
+        self.expire[i]      = self.start_ns[i] + self.timeout_ns[idx]
+
+    def put_event(self, i, name, onoff, ts_detect):
+        self.eventq.put(SwitchEvent(self.pin_list[i], name,
+                                    int(self.timeout_idx[i]), int(onoff),
+                                    int(self.push_count[i]), ts_detect,
+                                    self.gpio.monotonic_ns()))
+
+class SwitchBankWatcher(threading.Thread):
+    '''
+    sample a SwitchBank every loop_interval
+
+    read_func(): levels (array) or bitmask (int) of all the channels
+
+    The thread is started by the backend (see GpioBackend): with the
+    simulator, step() is called in virtual time instead.
+
+    stop() : Don't forget to call stop() when finished
+    stats(): loop health snapshot (see Switch.WatcherStats)
+    '''
+    def __init__(self, bank, read_func, loop_interval=0.02, debug=False):
+        self.logger = init_logger(__class__.__name__, debug)
+        self.logger.debug('loop_interval:%.4f', loop_interval)
+
+        self.gpio        = get_backend()
+        self.bank        = bank
+        self.read_func   = read_func
+        self.interval_ns = int(loop_interval * 1000000000)
+        self.health      = WatcherStats()
+        self.next_ns     = self.gpio.monotonic_ns()
+        self.t_wake      = None	# scheduled time of the next step()
+
+        self.loop_flag = True
+        super().__init__(daemon=True)
+        self.gpio.spawn(self)
+
+    def run(self):
+        self.logger.debug('start')
+
+        while self.loop_flag:
+            t_wake = self.step(self.gpio.monotonic_ns())
+            t_sleep = t_wake - self.gpio.monotonic_ns()
+            if t_sleep > 0:
+                self.gpio.sleep(t_sleep / 1000000000)
+
+        self.logger.debug('end')
+
+    def step(self, now):
+        '''
+        sample the bank if it is time, and expire the timers
+
+        return: time(ns) to call step() again
+        '''
+        interval_ns = 0
+        if now >= self.next_ns:
+            levels = self.read_func()
+            if isinstance(levels, int):
+                n = self.bank.update_bits(levels, now)
+            else:
+                n = self.bank.update(levels, now)
+            interval_ns = self.interval_ns
+            self.next_ns = now + self.interval_ns
+        else:
+            n = self.bank.update_timer(now)
+
+        t_end = self.gpio.monotonic_ns()
+        if self.health.loop(now, t_end, n, self.bank.eventq, interval_ns,
+                            self.t_wake):
+            self.logger.debug('overrun: %f', (t_end - now) / 1000000000)
+
+        t_wake = self.next_ns
+        t_timer = self.bank.next_ns()
+        if t_timer is not None and t_timer < t_wake:
+            t_wake = t_timer
+        self.t_wake = t_wake
+        return t_wake
+
+    def stats(self, reset=False):
+        snap = self.health.snapshot()
+        snap['switches'] = len(self.bank.pins)
+        if reset:
+            self.health.reset()
+        return snap
+
+    def stop(self):
+        self.logger.debug('')
+        self.loop_flag = False
+        self.gpio.join(self)
+        self.logger.debug('join()')
+
+#####
+class app:
+    def __init__(self, pin, debug=False):
+        self.debug = debug
+        self.logger = init_logger(__class__.__name__, debug)
+        self.logger.debug('pin=%s', pin)
+
+        self.pin = pin
+
+    def main(self):
+        gpio = get_backend()
+        for p in self.pin:
+            gpio.setup(p, gpio.IN, pull_up_down=gpio.PUD_UP)
+
+        def read_func():
+            return [gpio.input(p) for p in self.pin]
+
+        eventq = queue.Queue()
+        bank = SwitchBank(self.pin, eventq, debug=self.debug)
+        watcher = SwitchBankWatcher(bank, read_func, debug=self.debug)
+
+        print('Ready: pin=%s' % str(self.pin))
+        try:
+            while True:
+                eventq.get().print()
+        finally:
+            watcher.stop()
+
+#####
+CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
+@click.command(context_settings=CONTEXT_SETTINGS)
+@click.argument('pin', metavar='<pin>', type=int, nargs=-1)
+@click.option('--debug', '-d', 'debug', is_flag=True, default=False,
+              help='debug flag')
+def main(pin, debug):
+    logger.setLevel(INFO)
+    if debug:
+        logger.setLevel(DEBUG)
+
+    setup_GPIO()
+    try:
+        app(pin, debug=debug).main()
+    finally:
+        cleanup_GPIO()
+
+if __name__ == '__main__':
+    main()
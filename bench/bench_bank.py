@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+#
+# (C) 2019 Yoichi Tanibayashi
+#
+'''
+SwitchBank benchmark
+
+per-sample cost (usec) against channel count
+  python: EMA filter of Switch.get_onoff() in a Python loop
+  bank  : SwitchBank.update() (NumPy)
+'''
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..'))
+
+import GpioBackend
+from SwitchBank import SwitchBank
+from Switch import Switch
+import numpy as np
+import queue
+import time
+
+import click
+
+
+def bench_python(n_ch, levels, n):
+    val   = [1.0] * n_ch
+    onoff = [Switch.OFF] * n_ch
+    t1 = time.perf_counter()
+    for k in range(n):
+        lv = levels[k % len(levels)]
+        for i in range(n_ch):
+            val[i] = lv[i] * 0.6 + val[i] * 0.4
+            if val[i] > 0.7:
+                onoff[i] = Switch.OFF
+            if val[i] < 0.3:
+                onoff[i] = Switch.ON
+    return (time.perf_counter() - t1) / n
+
+def bench_bank(n_ch, levels, n):
+    eventq = queue.Queue()
+    bank = SwitchBank(list(range(n_ch)), eventq)
+    t1 = time.perf_counter()
+    for k in range(n):
+        bank.update(levels[k % len(levels)], k * 1000000)
+    return (time.perf_counter() - t1) / n
+
+#####
+CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
+@click.command(context_settings=CONTEXT_SETTINGS)
+@click.option('--count', '-n', 'n', type=int, default=2000,
+              help='number of samples')
+@click.option('--change', '-c', 'change', type=float, default=0.01,
+              help='ratio of the channels that change per sample')
+def main(n, change):
+    GpioBackend.set_backend('sim')	# clock of SwitchEvent
+    rng = np.random.default_rng(0)
+    print('%8s %12s %12s' % ('channels', 'python[us]', 'bank[us]'))
+    for n_ch in [1, 8, 32, 64, 128, 256, 512, 1024]:
+        # levels: mostly idle (OFF), some channels toggle
+        levels = np.ones((64, n_ch), dtype=np.int8)
+        levels[rng.random((64, n_ch)) < change] = 0
+        levels_list = levels.tolist()
+
+        t_py   = bench_python(n_ch, levels_list, n)
+        t_bank = bench_bank(n_ch, levels, n)
+        print('%8d %12.1f %12.1f' % (n_ch, t_py * 1e6, t_bank * 1e6))
+
+if __name__ == '__main__':
+    main()
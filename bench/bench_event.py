@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+#
+# (C) 2019 Yoichi Tanibayashi
+#
+'''
+SwitchEvent microbenchmark
+
+events/sec of "create -> click_count() -> longpress_level()"
+  old : SwitchEvent before __slots__ (logger setup on every event)
+  new : SwitchEvent (__slots__, no logger)
+  pool: SwitchEventPool (recycled)
+'''
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..'))
+
+from Switch import Switch, SwitchEvent, SwitchEventPool, init_logger
+import time
+
+import click
+
+
+class OldSwitchEvent:
+    '''SwitchEvent before __slots__ (for comparison)'''
+    def __init__(self, pin, name, timeout_idx, value, push_count, debug=False):
+        self.logger = init_logger(__class__.__name__, debug)
+
+        self.logger.debug('pin=%d, name=%s', pin, name)
+
+        self.pin         = pin
+        self.name        = name
+        self.timeout_idx = timeout_idx
+        self.value       = value
+        self.push_count  = push_count
+
+    def click_count(self):
+        self.logger.debug('')
+
+        if self.name != 'timer':
+            return 0
+        if self.timeout_idx != 0:
+            return 0
+        if self.value == Switch.ON:
+            return 0
+        return self.push_count
+
+    def longpress_level(self):
+        self.logger.debug('')
+
+        if self.name != 'timer':
+            return 0
+        if self.value == Switch.OFF:
+            return 0
+        return self.timeout_idx
+
+
+def bench_old(n):
+    for i in range(n):
+        e = OldSwitchEvent(5, 'timer', 0, Switch.OFF, 1)
+        e.click_count()
+        e.longpress_level()
+
+def bench_new(n):
+    for i in range(n):
+        e = SwitchEvent(5, 'timer', 0, Switch.OFF, 1, i, i)
+        e.click_count()
+        e.longpress_level()
+
+def bench_pool(n):
+    pool = SwitchEventPool()
+    for i in range(n):
+        e = pool.get(5, 'timer', 0, Switch.OFF, 1, i, i)
+        e.click_count()
+        e.longpress_level()
+        pool.put(e)
+
+def run(func, n):
+    t1 = time.perf_counter()
+    func(n)
+    return n / (time.perf_counter() - t1)
+
+#####
+CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
+@click.command(context_settings=CONTEXT_SETTINGS)
+@click.option('--count', '-n', 'n', type=int, default=200000,
+              help='number of events')
+def main(n):
+    base = run(bench_old, n)
+    print('%-5s %12.0f events/sec' % ('old', base))
+    for name, func in [('new', bench_new), ('pool', bench_pool)]:
+        eps = run(func, n)
+        print('%-5s %12.0f events/sec (x%.1f)' % (name, eps, eps / base))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+#
+# (C) 2019 Yoichi Tanibayashi
+#
+'''
+Led fade benchmark
+
+CPU cost of N breathing LEDs (software PWM, no backend PWM)
+
+  led  : Led.breathe() (LedScheduler + SoftPwm)
+  naive: one thread per LED, PWM and gamma calculated in a Python loop
+
+backends:
+  sim : virtual clock (CPU time per virtual second)
+  fake: real clock, sleep and threads (see bench_watcher.py)
+
+bank: N LEDs follow random inputs changing every 1 msec (sim)
+  led : SimpleLed.switch() for every input
+  bank: LedBank.set() for every input (frame 10 msec)
+  calls/s: backend output calls, outputs/s: pins written
+'''
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..'))
+
+import GpioBackend
+from Led import Led, SimpleLed, LedBank, GAMMA
+from bench_watcher import BenchSimBackend, FakeGpioBackend
+import threading
+import math
+import random
+import time
+
+import click
+
+BACKEND = {
+    BenchSimBackend.NAME: BenchSimBackend,
+    FakeGpioBackend.NAME: FakeGpioBackend
+}
+
+class NaiveBreathe(threading.Thread):
+    '''
+    hand-written PWM loop (for comparison)
+    '''
+    def __init__(self, pin, period_sec=2.0, freq=100):
+        self.gpio   = GpioBackend.get_backend()
+        self.pin    = pin
+        self.period = period_sec
+        self.cycle  = 1 / freq
+        self.gpio.setup(pin, self.gpio.OUT)
+        self.loop_flag = True
+        super().__init__(daemon=True)
+        self.start()
+
+    def run(self):
+        t0 = time.monotonic()
+        while self.loop_flag:
+            t = time.monotonic() - t0
+            r = (1 - math.cos(2 * math.pi * t / self.period)) / 2
+            d = r ** GAMMA
+            if d > 0:
+                self.gpio.output(self.pin, 1)
+                time.sleep(self.cycle * d)
+            self.gpio.output(self.pin, 0)
+            time.sleep(self.cycle * (1 - d))
+
+    def stop(self):
+        self.loop_flag = False
+        self.join()
+
+def bench(backend, mode, n, sec):
+    gpio = GpioBackend.set_backend(BACKEND[backend]())
+    if mode == 'naive':
+        if backend == 'sim':
+            return None, None
+        leds = [NaiveBreathe(p) for p in range(n)]
+    else:
+        leds = [Led(p) for p in range(n)]
+        for l in leds:
+            l.breathe(2.0)
+
+    n_out = len(gpio.history)
+    c1 = time.process_time()
+    w1 = time.perf_counter()
+    if backend == 'sim':
+        gpio.run(sec)
+        elapsed = sec
+    else:
+        time.sleep(sec)
+        elapsed = time.perf_counter() - w1
+    cpu = time.process_time() - c1
+    n_out = len(gpio.history) - n_out
+
+    for l in leds:
+        if mode == 'naive':
+            l.stop()
+        else:
+            l.off()
+    return cpu / elapsed * 100, n_out / elapsed
+
+class CountSimBackend(BenchSimBackend):
+    '''
+    BenchSimBackend that counts the output calls
+    '''
+    def __init__(self, debug=False):
+        super().__init__(debug=debug)
+        self.calls = 0
+
+    def output(self, pin, val):
+        self.calls += 1
+        super().output(pin, val)
+
+    def output_bits(self, set_mask, clear_mask):
+        self.calls += 1
+        self.calls -= bin(set_mask | clear_mask).count('1')	# output()
+        super().output_bits(set_mask, clear_mask)
+
+def bench_bank(mode, n, sec, interval=0.001):
+    gpio = GpioBackend.set_backend(CountSimBackend())
+    pins = list(range(n))
+    if mode == 'bank':
+        bank = LedBank(pins, frame_sec=0.01)
+        switch = bank.set
+    else:
+        leds = [SimpleLed(p) for p in pins]
+        def switch(p, v):
+            leds[p].switch(v)
+
+    rnd = random.Random(1)
+    def change():
+        for p in pins:
+            if rnd.random() < 0.1:
+                switch(p, rnd.random() < 0.5)
+        gpio.call_later(interval, change)
+    gpio.call_later(interval, change)
+
+    n_out = len(gpio.history)
+    gpio.calls = 0
+    c1 = time.process_time()
+    gpio.run(sec)
+    cpu = time.process_time() - c1
+    return (cpu / sec * 100, gpio.calls / sec,
+            (len(gpio.history) - n_out) / sec)
+
+#####
+CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
+@click.command(context_settings=CONTEXT_SETTINGS)
+@click.option('--backend', '-b', 'backend', type=click.Choice(BACKEND),
+              multiple=True, help='backend (default: all)')
+@click.option('--sec', '-s', 'sec', type=float, default=2,
+              help='seconds per measurement')
+def main(backend, sec):
+    backend = backend or list(BACKEND)
+    print('%-5s %-6s %5s %8s %10s' % ('', 'mode', 'leds', 'cpu%',
+                                       'outputs/s'))
+    for b in backend:
+        for mode in ['led', 'naive']:
+            for n in [1, 4, 16, 64]:
+                cpu, out = bench(b, mode, n, sec)
+                if cpu is None:
+                    continue
+                print('%-5s %-6s %5d %8.2f %10.1f' % (b, mode, n, cpu, out))
+
+    print()
+    print('%-5s %-6s %5s %8s %10s %10s' % ('', 'mode', 'leds', 'cpu%',
+                                            'calls/s', 'outputs/s'))
+    for mode in ['led', 'bank']:
+        for n in [4, 16, 26]:
+            cpu, calls, out = bench_bank(mode, n, sec)
+            print('%-5s %-6s %5d %8.2f %10.1f %10.1f' % ('bank', mode, n, cpu,
+                                                         calls, out))
+
+if __name__ == '__main__':
+    main()
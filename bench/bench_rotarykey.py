@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+#
+# (C) 2019 Yoichi Tanibayashi
+#
+'''
+RotaryKey entry cost benchmark
+
+Every word of the word list is entered with KeyRing (the model of
+RotaryKey). The target entry is chosen with the fewest detents per
+entered character (a completion can enter several characters).
+
+  detents/char: encoder detents per entered character
+  clicks/char : clicks per entered character (page changes included)
+
+rings:
+  flat      : RotaryKey.CH_LIST (lower case), one page
+  flat-ascii: all of PAGES_ASCII in one page
+  paged     : PAGES_ASCII
+  trie      : PAGES_ASCII + CharTrie of all the words
+  trie-held : PAGES_ASCII + CharTrie of the other half of the words
+              (the words are not in the dictionary)
+
+    bench_rotarykey.py -w words.txt
+'''
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..'))
+
+from KeyRing import KeyRing, CharTrie, PAGES_ASCII, load_words, ring_dist
+
+import click
+
+WORDS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'words.txt')
+FLAT  = ' _-0123456789abcdefghijklmnopqrstuvwxyz'
+
+def choose(ring, word):
+    '''
+    return: (index, detents, entered characters) of the best entry
+    '''
+    rest = word[len(ring.text):]
+    n = len(ring.ring())
+
+    best = None
+    for i, (kind, val) in enumerate(ring.ring()):
+        if kind == 'ch' and val == rest[0]:
+            adv = 1
+        elif kind == 'word' and rest.startswith(val[len(ring.word()):]):
+            adv = len(val) - len(ring.word())
+        else:
+            continue
+
+        d = ring_dist(ring.index, i, n)
+        if best is None or (d + 1) / adv < (best[1] + 1) / best[2]:
+            best = (i, d, adv)
+    if best is not None:
+        return best
+
+    # 他のページ
+    for i, (kind, val) in enumerate(ring.ring()):
+        if kind == 'page' and rest[0] in ring.pages[val]:
+            return (i, ring_dist(ring.index, i, n), 0)
+    raise ValueError('%a: not in the ring' % rest[0])
+
+def enter(ring, word):
+    '''
+    return: (detents, clicks)
+    '''
+    ring.enter()
+    detents = clicks = 0
+    while ring.text != word:
+        i, d, adv = choose(ring, word)
+        detents += d
+        clicks  += 1
+        ring.index = i
+        ring.select()
+    return detents, clicks
+
+def bench(ring, words):
+    detents = clicks = chars = 0
+    for w in words:
+        d, c = enter(ring, w)
+        detents += d
+        clicks  += c
+        chars   += len(w)
+    return detents / chars, clicks / chars
+
+#####
+CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
+@click.command(context_settings=CONTEXT_SETTINGS)
+@click.option('--words', '-w', 'path', type=click.Path(exists=True),
+              default=WORDS, help='word list')
+def main(path):
+    words  = load_words(path)
+    unique = sorted(set(words))
+    train  = [w for w in words if unique.index(w) % 2 == 0]
+    test   = unique[1::2]
+
+    flat_ascii = ''.join(PAGES_ASCII.values())
+    rings = [
+        ('flat',       KeyRing(FLAT),                        unique),
+        ('flat-ascii', KeyRing(flat_ascii),                  unique),
+        ('paged',      KeyRing(PAGES_ASCII),                 unique),
+        ('trie',       KeyRing(PAGES_ASCII, CharTrie(words)), unique),
+        ('trie-held',  KeyRing(PAGES_ASCII, CharTrie(train)), test)
+    ]
+
+    print('%d words (%d unique)' % (len(words), len(unique)))
+    print('%-10s %6s %12s %11s' % ('ring', 'words', 'detents/char',
+                                   'clicks/char'))
+    for name, ring, w in rings:
+        d, c = bench(ring, w)
+        print('%-10s %6d %12.2f %11.2f' % (name, len(w), d, c))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+#
+# (C) 2019 Yoichi Tanibayashi
+#
+'''
+WS2812Strip encode benchmark (sim backend, SPI bytes captured)
+
+  table: WS2812Strip.show() (translate() tables into out[k::3])
+  naive: per-pixel loop, 3 SPI bytes per byte from a lookup table
+
+  usec/frame: encode and write time per frame
+  max fps   : 1 / (encode + SPI transfer at 2.4 MHz)
+'''
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..'))
+
+import GpioBackend
+from LedStrip import WS2812Strip
+import random
+import time
+
+import click
+
+def naive_show(strip):
+    out = bytearray()
+    for v in strip.fb:
+        for k in range(3):
+            out.append(strip.ENC[k][v])
+    strip.spi.write(out + bytes(len(strip.out) - len(out)))
+
+def bench(mode, n, frames):
+    GpioBackend.set_backend('sim')
+    strip = WS2812Strip(n)
+    rnd = random.Random(1)
+    fb = [bytes(rnd.randrange(256) for i in range(n * 3)) for j in range(8)]
+
+    show = strip.show if mode == 'table' else lambda: naive_show(strip)
+    t1 = time.perf_counter()
+    for i in range(frames):
+        strip.fb[:] = fb[i % len(fb)]
+        show()
+    t = (time.perf_counter() - t1) / frames
+
+    t_spi = len(strip.out) * 8 / strip.SPEED_HZ
+    return t * 1000000, 1 / (t + t_spi)
+
+#####
+CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
+@click.command(context_settings=CONTEXT_SETTINGS)
+@click.option('--frames', '-f', 'frames', type=int, default=200,
+              help='frames per measurement')
+def main(frames):
+    print('%-6s %6s %11s %8s' % ('mode', 'leds', 'usec/frame', 'max fps'))
+    for mode in ['table', 'naive']:
+        for n in [60, 300, 1000]:
+            us, fps = bench(mode, n, frames)
+            print('%-6s %6d %11.1f %8.1f' % (mode, n, us, fps))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+#
+# (C) 2019 Yoichi Tanibayashi
+#
+'''
+SwitchWatcher / RotaryEncoderListener benchmark
+
+for each backend, mode and pin count:
+  lat_*_ms       : edge -> callback latency percentiles ('pressed')
+  late_*_ms      : timer event lateness (callback - timeout)
+  cpu_pct        : CPU time / elapsed time
+                   (sim: CPU time per virtual second)
+  wakeups_per_sec: loop wakeups (hub: SwitchHub.wakeup_count on fake)
+  max_edge_rate  : max presses/sec/pin without lost events
+                   (encoder: detents/sec)
+
+backends (no Raspberry Pi needed):
+  sim : GpioBackend.SimGpioBackend (virtual clock)
+  fake: simulated pins with the real clock, sleep and threads
+
+    bench_watcher.py -b sim -o result.json
+    bench_watcher.py -b sim --baseline result.json   # check regressions
+
+The results are compared with baseline_sim.json (sim backend, 2 sec)
+by default. Update it with -b sim -o baseline_sim.json after an
+intended change. --baseline '': no comparison
+'''
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..'))
+
+import GpioBackend
+from GpioBackend import SimGpioBackend, quadrature_wave
+from Switch import Switch, SwitchListener, SwitchHub
+from RotaryEncoder import RotaryEncoderListener
+import platform
+import json
+import time
+
+import click
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'baseline_sim.json')
+
+MODE     = ['poll', 'edge', 'hub', 'encoder']
+PINS     = [1, 2, 4, 8, 16, 32, 64]
+RATE     = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000]
+BOUNCE   = 3
+BOUNCE_S = 0.0005
+
+# metric -> (True if higher is better, difference ignored as noise)
+METRIC = {
+    'lat_p50_ms':      (False, 0.5),
+    'lat_p90_ms':      (False, 0.5),
+    'lat_p99_ms':      (False, 1.0),
+    'lat_max_ms':      (False, 2.0),
+    'late_p50_ms':     (False, 0.5),
+    'late_p99_ms':     (False, 1.0),
+    'cpu_pct':         (False, 0.5),
+    'wakeups_per_sec': (False, 1.0),
+    'max_edge_rate':   (True,  0)
+}
+
+class BenchSimBackend(SimGpioBackend):
+    '''
+    SimGpioBackend that counts the loop wakeups
+    '''
+    NAME = 'sim'
+
+    def __init__(self, debug=False):
+        super().__init__(debug=debug)
+        self.wakeups = 0
+
+    def run_tasks(self):
+        self.wakeups += 1
+        super().run_tasks()
+
+    def play(self, trans, sec):
+        '''
+        trans: [(t_ns from now, pin, level), ..]
+
+        return: [(t_ns, pin, level), ..] actual times
+        '''
+        t0 = self.now
+        for t, pin, level in trans:
+            self.call_at(t0 + t, lambda p=pin, l=level: self.set_input(p, l))
+        self.run(sec)
+        return [(t0 + t, pin, level) for t, pin, level in trans]
+
+class FakeGpioBackend(SimGpioBackend):
+    '''
+    simulated pins in real time (real clock, sleep and threads)
+    '''
+    NAME = 'fake'
+
+    def __init__(self, debug=False):
+        super().__init__(debug=debug)
+        self.wakeups = 0
+
+    def monotonic_ns(self):
+        return time.monotonic_ns()
+
+    def sleep(self, sec):
+        self.wakeups += 1
+        time.sleep(sec)
+
+    def spawn(self, obj):
+        obj.start()
+
+    def join(self, obj):
+        obj.join()
+
+    def set_input(self, pin, level):
+        if self.level.get(pin) == level:
+            return
+        self.level[pin] = level
+        cb = self.edge_cb.get(pin)
+        if cb is not None:
+            self.wakeups += 1
+            cb(pin)
+
+    def play(self, trans, sec):
+        t0 = time.monotonic_ns()
+        actual = []
+        for t, pin, level in trans:
+            t_sleep = t0 + t - time.monotonic_ns()
+            if t_sleep > 0:
+                time.sleep(t_sleep / 1000000000)
+            actual.append((time.monotonic_ns(), pin, level))
+            self.set_input(pin, level)
+
+        t_sleep = t0 + int(sec * 1000000000) - time.monotonic_ns()
+        if t_sleep > 0:
+            time.sleep(t_sleep / 1000000000)
+        return actual
+
+BACKEND = {
+    BenchSimBackend.NAME: BenchSimBackend,
+    FakeGpioBackend.NAME: FakeGpioBackend
+}
+
+def presses(pins, rate, sec, bounce=BOUNCE):
+    '''
+    transitions of the switches: rate presses/sec/pin (hold 50%),
+    staggered over the pins
+
+    return: [(t_ns, pin, level), ..] sorted by time
+    '''
+    period = int(1000000000 / rate)
+    b_ns   = int(BOUNCE_S * 1000000000)
+    if period < b_ns * bounce * 8:
+        bounce = 0
+
+    trans = []
+    for i, pin in enumerate(pins):
+        t = period * i // len(pins)
+        while t + period <= sec * 1000000000:
+            for k in range(bounce):
+                trans += [(t + b_ns * 2 * k, pin, 0),
+                          (t + b_ns * (2 * k + 1), pin, 1)]
+            trans.append((t + b_ns * 2 * bounce, pin, 0))
+            t_off = t + period // 2
+            for k in range(bounce):
+                trans += [(t_off + b_ns * 2 * k, pin, 1),
+                          (t_off + b_ns * (2 * k + 1), pin, 0)]
+            trans.append((t_off + b_ns * 2 * bounce, pin, 1))
+            t += period
+    trans.sort()
+    return trans
+
+def percentile(data, p):
+    if len(data) == 0:
+        return None
+    data = sorted(data)
+    return data[min(int(len(data) * p / 100), len(data) - 1)]
+
+def ms(ns):
+    if ns is None:
+        return None
+    return round(ns / 1000000, 4)
+
+def start_switch(gpio, mode, pins, events):
+    SwitchHub._instance = None	# new hub on this backend
+    sw = [Switch(p, timeout_sec=[0.2, 0.3]) for p in pins]
+    edge = (mode == 'edge')
+    hub  = (mode == 'hub')
+    return SwitchListener(sw, events.append, edge=edge, hub=hub)
+
+def run_switch(gpio, mode, pins, rate, sec):
+    '''
+    return: (events, press times {pin: [t_ns, ..]}, cpu_sec, elapsed_sec)
+    '''
+    events = []
+    sl = start_switch(gpio, mode, pins, events)
+    gpio.play([], 0.1)	# 初期状態
+
+    # the hub thread blocks in cond.wait(), not in gpio.sleep()
+    hub = SwitchHub.get() if mode == 'hub' else None
+    count_hub = isinstance(gpio, FakeGpioBackend) and hub is not None
+
+    trans = presses(pins, rate, sec)
+    gpio.wakeups = 0
+    if count_hub:
+        n_hub = hub.wakeup_count
+    c1 = time.process_time()
+    w1 = time.perf_counter()
+    actual = gpio.play(trans, sec + 0.5)
+    cpu = time.process_time() - c1
+    elapsed = time.perf_counter() - w1
+    if count_hub:
+        gpio.wakeups += hub.wakeup_count - n_hub
+    sl.stop()
+
+    if isinstance(gpio, BenchSimBackend):
+        elapsed = sec + 0.5
+
+    t_press = first_edges(actual, pins)
+    return events, t_press, cpu, elapsed
+
+def first_edges(actual, pins):
+    '''
+    time of the first falling edge of each press (bounces ignored)
+    '''
+    t_press = {p: [] for p in pins}
+    t_last  = {p: None for p in pins}
+    gap = int(BOUNCE_S * 1000000000) * 4
+    for t, pin, lv in actual:
+        if lv == 0 and (t_last[pin] is None or t - t_last[pin] > gap):
+            t_press[pin].append(t)
+        t_last[pin] = t
+    return t_press
+
+def bench_switch(gpio_cls, mode, pins, sec):
+    gpio = GpioBackend.set_backend(gpio_cls())
+    events, t_press, cpu, elapsed = run_switch(gpio, mode, pins, 2, sec)
+
+    lat  = []
+    late = []
+    n_pressed = {p: 0 for p in pins}
+    for e in events:
+        if e.name == 'pressed':
+            i = n_pressed[e.pin]
+            n_pressed[e.pin] += 1
+            if i < len(t_press[e.pin]):
+                lat.append(e.ts_dispatch - t_press[e.pin][i])
+        if e.name == 'timer':
+            late.append(e.ts_dispatch - e.ts_detect)
+
+    return {
+        'lat_p50_ms':      ms(percentile(lat, 50)),
+        'lat_p90_ms':      ms(percentile(lat, 90)),
+        'lat_p99_ms':      ms(percentile(lat, 99)),
+        'lat_max_ms':      ms(max(lat, default=None)),
+        'late_p50_ms':     ms(percentile(late, 50)),
+        'late_p99_ms':     ms(percentile(late, 99)),
+        'cpu_pct':         round(cpu / elapsed * 100, 3),
+        'wakeups_per_sec': round(gpio.wakeups / elapsed, 1),
+        'max_edge_rate':   max_switch_rate(gpio_cls, mode, pins)
+    }
+
+def max_switch_rate(gpio_cls, mode, pins, n_press=10):
+    ok = 0
+    for rate in RATE:
+        gpio = GpioBackend.set_backend(gpio_cls())
+        sec = n_press / rate
+        events, t_press, cpu, elapsed = run_switch(gpio, mode, pins, rate,
+                                                   sec)
+        n = sum([len(t) for t in t_press.values()])
+        if len([e for e in events if e.name == 'pressed']) < n:
+            break
+        ok = rate
+    return ok
+
+def run_encoder(gpio_cls, n, rate):
+    '''
+    return: (values, cpu_sec, elapsed_sec, gpio)
+    '''
+    gpio = GpioBackend.set_backend(gpio_cls())
+    vals = []
+    rl = RotaryEncoderListener([5, 6], vals.append)
+
+    steps_a, steps_b = quadrature_wave(n, 1 / rate)
+    trans = []
+    for pin, steps in [(5, steps_a), (6, steps_b)]:
+        t = 0
+        for s, lv in steps:
+            trans.append((t, pin, lv))
+            t += int(s * 1000000000)
+    trans.sort()
+
+    sec = n / rate + 0.5
+    gpio.wakeups = 0
+    c1 = time.process_time()
+    w1 = time.perf_counter()
+    gpio.play(trans, sec)
+    cpu = time.process_time() - c1
+    elapsed = time.perf_counter() - w1
+    rl.stop()
+
+    if isinstance(gpio, BenchSimBackend):
+        elapsed = sec
+    return vals, cpu, elapsed, gpio
+
+def bench_encoder(gpio_cls, sec):
+    n = max(int(sec * 2), 1)
+    vals, cpu, elapsed, gpio = run_encoder(gpio_cls, n, 2)
+    per_detent = len(vals) / n
+
+    ok = 0
+    for rate in RATE:
+        v, c, e, g = run_encoder(gpio_cls, 10, rate)
+        if len(v) < 10 * per_detent:
+            break
+        ok = rate
+
+    return {
+        'lat_p50_ms':      None,
+        'lat_p90_ms':      None,
+        'lat_p99_ms':      None,
+        'lat_max_ms':      None,
+        'late_p50_ms':     None,
+        'late_p99_ms':     None,
+        'cpu_pct':         round(cpu / elapsed * 100, 3),
+        'wakeups_per_sec': round(gpio.wakeups / elapsed, 1),
+        'max_edge_rate':   ok
+    }
+
+def compare(results, baseline, tolerance):
+    '''
+    return: list of regression messages
+    '''
+    base = {(r['backend'], r['mode'], r['pins']): r
+            for r in baseline['results']}
+
+    msg = []
+    for r in results:
+        b = base.get((r['backend'], r['mode'], r['pins']))
+        if b is None:
+            continue
+        for m, (higher, noise) in METRIC.items():
+            v, bv = r.get(m), b.get(m)
+            if v is None or bv is None:
+                continue
+            if higher:
+                worse = v < bv * (1 - tolerance)
+            else:
+                worse = v > bv * (1 + tolerance) and v - bv > noise
+            if worse:
+                msg.append('%s %s pins=%d: %s %s -> %s' %
+                           (r['backend'], r['mode'], r['pins'], m, bv, v))
+    return msg
+
+#####
+CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
+@click.command(context_settings=CONTEXT_SETTINGS)
+@click.option('--backend', '-b', 'backend', type=click.Choice(BACKEND),
+              multiple=True, help='backend (default: all)')
+@click.option('--mode', '-m', 'mode', type=click.Choice(MODE),
+              multiple=True, help='mode (default: all)')
+@click.option('--pins', '-p', 'pins', type=int, multiple=True,
+              help='pin count (default: %s)' % PINS)
+@click.option('--sec', '-s', 'sec', type=float, default=2,
+              help='seconds per measurement')
+@click.option('--output', '-o', 'output', type=click.Path(), default=None,
+              help='JSON output')
+@click.option('--baseline', 'baseline', type=click.Path(),
+              default=BASELINE, show_default=True,
+              help='JSON baseline to compare with (\'\': none)')
+@click.option('--tolerance', '-t', 'tolerance', type=float, default=0.2,
+              help='allowed regression ratio')
+def main(backend, mode, pins, sec, output, baseline, tolerance):
+    backend = backend or list(BACKEND)
+    mode    = mode or MODE
+    pins    = pins or PINS
+
+    results = []
+    print('%-5s %-8s %4s %8s %8s %8s %8s %7s %9s %6s' %
+          ('', 'mode', 'pins', 'lat50ms', 'lat99ms', 'late50ms',
+           'late99ms', 'cpu%', 'wakeup/s', 'rate'))
+    for b in backend:
+        for m in mode:
+            for n in pins:
+                if m == 'encoder':
+                    if n != pins[0]:
+                        continue
+                    r = bench_encoder(BACKEND[b], sec)
+                    n = 2
+                else:
+                    r = bench_switch(BACKEND[b], m, list(range(n)), sec)
+
+                r.update({'backend': b, 'mode': m, 'pins': n})
+                results.append(r)
+                print('%-5s %-8s %4d %8s %8s %8s %8s %7.2f %9.1f %6d' %
+                      (b, m, n, r['lat_p50_ms'], r['lat_p99_ms'],
+                       r['late_p50_ms'], r['late_p99_ms'], r['cpu_pct'],
+                       r['wakeups_per_sec'], r['max_edge_rate']))
+
+    if output is not None:
+        with open(output, 'w') as f:
+            json.dump({'python':   platform.python_version(),
+                       'machine':  platform.machine(),
+                       'sec':      sec,
+                       'results':  results}, f, indent=2)
+
+    if baseline:
+        with open(baseline) as f:
+            msg = compare(results, json.load(f), tolerance)
+        for s in msg:
+            print('REGRESSION: %s' % s)
+        if len(msg) > 0:
+            sys.exit(1)
+        print('no regression')
+
+if __name__ == '__main__':
+    main()
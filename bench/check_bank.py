@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+#
+# (C) 2019 Yoichi Tanibayashi
+#
+'''
+SwitchBank.py check (no GPIO)
+
+The same random presses of N channels (default 256: pins above 63) are
+given to SwitchBank.update_bits() as one bitmask and to
+SwitchBank.update() as an array, and the event streams
+(pin, name, timeout_idx, value, push_count) must be the same.
+
+    check_bank.py [-n 256]        # exit status 1 on failure
+'''
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..'))
+
+import GpioBackend
+from SwitchBank import SwitchBank
+import numpy as np
+import queue
+
+import click
+
+INTERVAL_NS = 20000000	# 20 msec
+
+def samples(pins, n, seed=0):
+    '''
+    return: [levels array, ..] (each channel: random presses)
+    '''
+    rng = np.random.default_rng(seed)
+    levels = np.ones(len(pins), dtype=np.int8)
+    out = []
+    for k in range(n):
+        flip = rng.random(len(pins)) < 0.02
+        levels = levels ^ flip
+        out.append(levels.copy())
+    return out
+
+def to_bits(pins, levels):
+    bits = 0
+    for p, lv in zip(pins, levels):
+        bits |= int(lv) << int(p)
+    return bits
+
+def stream(pins, levels_list, use_bits):
+    GpioBackend.set_backend('sim')
+    q = queue.Queue()
+    bank = SwitchBank(pins, q)
+    now = 1000000000
+    for levels in levels_list:
+        if use_bits:
+            bank.update_bits(to_bits(pins, levels), now)
+        else:
+            bank.update(levels, now)
+        now += INTERVAL_NS
+
+    ev = []
+    while not q.empty():
+        e = q.get()
+        ev.append((e.pin, e.name, e.timeout_idx, e.value, e.push_count))
+    return ev
+
+#####
+CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
+@click.command(context_settings=CONTEXT_SETTINGS)
+@click.option('--channels', '-n', 'n_ch', type=int, default=256,
+              show_default=True, help='number of channels')
+@click.option('--samples', '-s', 'n', type=int, default=2000,
+              show_default=True, help='number of samples')
+def main(n_ch, n):
+    ng = 0
+    for name, pins in [('contiguous', list(range(n_ch))),
+                       ('sparse', list(range(3, n_ch * 3, 3))),
+                       ('unordered', list(range(n_ch))[::-1])]:
+        levels_list = samples(pins, n)
+        ev1 = stream(pins, levels_list, True)
+        ev2 = stream(pins, levels_list, False)
+        ok = ev1 == ev2 and len(ev1) > 0
+        print('%-10s pins:%d..%d events:%d %s' % (name, min(pins), max(pins),
+                                                   len(ev1),
+                                                   'OK' if ok else 'NG'))
+        if not ok:
+            ng += 1
+    sys.exit(1 if ng > 0 else 0)
+
+if __name__ == '__main__':
+    main()
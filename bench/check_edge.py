@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+#
+# (C) 2019 Yoichi Tanibayashi
+#
+'''
+SwitchEvent stream check: polling mode vs edge mode (sim backend)
+
+The same input waveform is fed to a polling SwitchListener, an edge
+mode one, a SwitchHub one and a SwitchBankWatcher, and the event
+streams (name, timeout_idx, value, push_count) must be the same.
+
+    check_edge.py        # exit status 1 on mismatch
+'''
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..'))
+
+import GpioBackend
+from GpioBackend import press_wave
+from Switch import Switch, SwitchListener, SwitchHub
+from SwitchBank import SwitchBank, SwitchBankWatcher
+import queue
+
+import click
+
+PIN = 17
+
+# name -> steps [(sec, level), ..] (pull-up: ON = 0)
+SCENARIO = {
+    'click':        press_wave(0.1),
+    'double-click': press_wave(0.1, release_sec=0.2) + press_wave(0.1),
+    # 2nd click between timeout_sec[0] and timeout_sec[1]
+    'click-0.85':   press_wave(0.1, release_sec=0.75) + press_wave(0.1),
+    'click-long':   press_wave(0.1, release_sec=0.75) + press_wave(3.5),
+    'long-press':   press_wave(5.5),
+    'long-long':    press_wave(8) + press_wave(0.1, release_sec=1),
+    'triple-click': (press_wave(0.05, release_sec=0.1) * 3 +
+                     [(2, 1)] + press_wave(1.2))
+}
+
+def events(mode, steps, sec=15):
+    gpio = GpioBackend.set_backend('sim')
+    SwitchHub._instance = None	# new hub on this backend
+    ev = []
+    if mode == 'bank':
+        q = queue.Queue()
+        gpio.setup(PIN, gpio.IN, pull_up_down=gpio.PUD_UP)
+        watcher = SwitchBankWatcher(SwitchBank([PIN], q),
+                                    lambda: [gpio.input(PIN)])
+        gpio.run(0.1)
+        gpio.waveform(PIN, steps + [(0, 1)])
+        gpio.run(sec)
+        while not q.empty():
+            ev.append(q.get())
+        return [(e.name, e.timeout_idx, e.value, e.push_count) for e in ev]
+
+    sw = Switch(PIN)
+    sl = SwitchListener([sw], ev.append, edge=(mode == 'edge'),
+                        hub=(mode == 'hub'))
+    gpio.run(0.1)
+    gpio.waveform(PIN, steps + [(0, 1)])
+    gpio.run(sec)
+    return [(e.name, e.timeout_idx, e.value, e.push_count) for e in ev]
+
+def fmt(stream):
+    return ' '.join(['%s:%d:%d:%d' % e for e in stream])
+
+#####
+CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
+@click.command(context_settings=CONTEXT_SETTINGS)
+@click.option('--verbose', '-v', 'verbose', is_flag=True, default=False,
+              help='print the streams')
+def main(verbose):
+    ng = 0
+    for name, steps in SCENARIO.items():
+        poll = events('poll', steps)
+        for mode in ['edge', 'hub', 'bank']:
+            ok = (events(mode, steps) == poll)
+            print('%-13s %-4s %s' % (name, mode, 'OK' if ok else 'NG'))
+            if not ok or verbose:
+                print('  poll: %s' % fmt(poll))
+                print('  %-4s: %s' % (mode, fmt(events(mode, steps))))
+            if not ok:
+                ng += 1
+    sys.exit(1 if ng > 0 else 0)
+
+if __name__ == '__main__':
+    main()
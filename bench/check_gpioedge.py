@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+#
+# (C) 2019 Yoichi Tanibayashi
+#
+'''
+GpioEdge.py check (pipes of gpioevent_data records, no GPIO chip)
+
+  read    : GpioLineEvent decodes the records (timestamp, edge)
+  wait    : GpioChipEdgeSource.wait() returns the edges of all the
+            lines, times out, and wake() wakes it up
+  listener: SwitchListener(edge=source) on the fake backend (real
+            clock): events from the records, ts_detect is the
+            timestamp of the first edge (bounces included)
+
+    check_gpioedge.py        # exit status 1 on failure
+'''
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..'))
+
+import GpioBackend
+from GpioEdge import GpioLineEvent, GpioChipEdgeSource
+from Switch import Switch, SwitchListener
+from bench_watcher import FakeGpioBackend
+import threading
+import struct
+import time
+
+import click
+
+RISING  = GpioLineEvent.GPIOEVENT_EVENT_RISING_EDGE
+FALLING = 0x02
+
+def record(ts, level):
+    return struct.pack(GpioLineEvent.EVENT_FMT, ts,
+                       RISING if level else FALLING)
+
+def lines(pins):
+    '''
+    return: [GpioLineEvent, ..], {pin: write fd}
+    '''
+    ls, w = [], {}
+    for p in pins:
+        r, w[p] = os.pipe()
+        ls.append(GpioLineEvent(p, r))
+    return ls, w
+
+def check_read(verbose):
+    ls, w = lines([17])
+    edges = [(1000, 0), (2000, 1), (3000, 0), (2**40, 1)]
+    os.write(w[17], b''.join([record(ts, lv) for ts, lv in edges]))
+    got = ls[0].read()
+    if verbose:
+        print('  %s' % got)
+    ls[0].close()
+    os.close(w[17])
+    return got == edges
+
+def check_wait(verbose):
+    ls, w = lines([17, 27])
+    src = GpioChipEdgeSource([17, 27], lines=ls)
+
+    ok = True
+    os.write(w[17], record(100, 0))
+    os.write(w[27], record(150, 0) + record(160, 1))
+    got = sorted(src.wait(1))
+    ok = ok and got == [(17, 100), (27, 150), (27, 160)]
+    ok = ok and src.level(17) == 0 and src.level(27) == 1
+    if verbose:
+        print('  edges: %s' % got)
+
+    t1 = time.monotonic()
+    ok = ok and src.wait(0.05) == []
+    ok = ok and time.monotonic() - t1 >= 0.04
+
+    threading.Timer(0.05, src.wake).start()
+    t1 = time.monotonic()
+    ok = ok and src.wait(5) == []
+    ok = ok and time.monotonic() - t1 < 1
+    if verbose:
+        print('  timeout, wake: %s' % ok)
+
+    src.close()
+    for fd in w.values():
+        os.close(fd)
+    return ok
+
+def check_listener(verbose):
+    GpioBackend.set_backend(FakeGpioBackend())
+    ls, w = lines([17])
+    src = GpioChipEdgeSource([17], lines=ls)
+    ev = []
+    sl = SwitchListener([Switch(17)], ev.append, edge=src)
+    time.sleep(0.1)
+
+    # click (with bounces) and release
+    t0 = time.monotonic_ns()
+    os.write(w[17], record(t0, 0) + record(t0 + 500000, 1) +
+             record(t0 + 1000000, 0))
+    time.sleep(0.2)
+    t1 = time.monotonic_ns()
+    os.write(w[17], record(t1, 1))
+    time.sleep(1.0)
+    sl.stop()
+    os.close(w[17])
+
+    got = [(e.name, e.timeout_idx, e.value, e.push_count) for e in ev]
+    if verbose:
+        print('  %s' % got)
+    ok = got == [('pressed', 0, Switch.ON, 1), ('released', 0, Switch.OFF, 1),
+                 ('timer', 0, Switch.OFF, 1)]
+    return ok and ev[0].ts_detect == t0 and ev[1].ts_detect == t1
+
+#####
+CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
+@click.command(context_settings=CONTEXT_SETTINGS)
+@click.option('--verbose', '-v', 'verbose', is_flag=True, default=False,
+              help='print the details')
+def main(verbose):
+    ng = 0
+    for name, check in [('read', check_read), ('wait', check_wait),
+                        ('listener', check_listener)]:
+        ok = check(verbose)
+        print('%-9s %s' % (name, 'OK' if ok else 'NG'))
+        if not ok:
+            ng += 1
+    sys.exit(1 if ng > 0 else 0)
+
+if __name__ == '__main__':
+    main()
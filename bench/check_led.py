@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+#
+# (C) 2019 Yoichi Tanibayashi
+#
+'''
+Led.py check (sim backend, software PWM)
+
+The pin must be low after off() and after the context manager exits,
+whatever the LED was doing (brightness, fade, breathe, blink, pattern),
+also when it was the last channel of SoftPwm. The LED is stopped at
+several phases of the PWM cycle.
+
+    check_led.py        # exit status 1 on failure
+'''
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..'))
+
+import GpioBackend
+from Led import Led
+
+import click
+
+PIN   = 18
+PIN2  = 23
+T_STOP = [0.2 + i * 0.0013 for i in range(8)]	# sec
+
+EFFECT = {
+    'brightness': lambda led: led.brightness(128),
+    'fade':       lambda led: led.fade_to(200, 500),
+    'breathe':    lambda led: led.breathe(1.0),
+    'blink':      lambda led: led.blink(0.1, 0.1),
+    'pattern':    lambda led: led.play([(255, 0.1), (64, 0.1)], repeat=None)
+}
+
+def check_off(effect, other, t_stop):
+    '''
+    other : another LED keeps its PWM running
+    t_stop: sec to run the effect
+    '''
+    gpio = GpioBackend.set_backend('sim')
+    led2 = None
+    if other:
+        led2 = Led(PIN2)
+        led2.brightness(100)
+    led = Led(PIN)
+    EFFECT[effect](led)
+    gpio.run(t_stop)
+    led.off()
+    gpio.run(0.1)
+    ok = gpio.input(PIN) == 0
+    if led2 is not None:
+        led2.off()
+    return ok
+
+def check_exit(effect, other, t_stop):
+    gpio = GpioBackend.set_backend('sim')
+    led2 = None
+    if other:
+        led2 = Led(PIN2)
+        led2.brightness(100)
+    with Led(PIN) as led:
+        EFFECT[effect](led)
+        gpio.run(t_stop)
+    ok = gpio.input(PIN) == 0
+    gpio.run(0.1)
+    ok = ok and gpio.input(PIN) == 0
+    if led2 is not None:
+        led2.off()
+    return ok
+
+#####
+CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
+@click.command(context_settings=CONTEXT_SETTINGS)
+def main():
+    ng = 0
+    for effect in EFFECT:
+        for other in [False, True]:
+            for name, check in [('off', check_off), ('exit', check_exit)]:
+                ok = all([check(effect, other, t) for t in T_STOP])
+                print('%-10s %-4s %-7s %s' % (effect, name,
+                                              'shared' if other else 'last',
+                                              'OK' if ok else 'NG'))
+                if not ok:
+                    ng += 1
+    sys.exit(1 if ng > 0 else 0)
+
+if __name__ == '__main__':
+    main()
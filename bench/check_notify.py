@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+#
+# (C) 2019 Yoichi Tanibayashi
+#
+'''
+Notify.Notifier check (pipe of report structs, fake pigpio.pi)
+
+  switch : the same edges and watchdog timeouts are given to a
+           pigpio Switch one by one (cb_func) and through a pipe of
+           reports (cb_batch), and the event streams must be the same
+  decoder: quadrature edges in the pipe -> QuadratureDecoder steps
+  stop   : stop() returns with an external fd (no daemon handle)
+
+    check_notify.py        # exit status 1 on failure
+'''
+import os
+import sys
+TOP    = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+PIGPIO = os.path.join(TOP, 'pigpio')
+sys.path.insert(0, TOP)
+
+import fake_pigpio
+fake_pigpio.install()
+import importlib.util
+import threading
+import struct
+import queue
+import time
+
+import click
+
+def load(name, path):
+    '''
+    load a module of pigpio/ (its names clash with the top directory)
+    '''
+    spec = importlib.util.spec_from_file_location(name, path)
+    mod = importlib.util.module_from_spec(spec)
+    sys.modules[name] = mod
+    spec.loader.exec_module(mod)
+    return mod
+
+pigpio_switch = load('Switch', os.path.join(PIGPIO, 'Switch.py'))
+Notify        = load('Notify', os.path.join(PIGPIO, 'Notify.py'))
+del sys.modules['Switch']	# ../Switch.py for RotaryEncoder
+from RotaryEncoder import RotaryEncoder, QuadratureDecoder
+from GpioBackend import quadrature_wave
+
+PIN   = 17
+PIN_A = 5
+PIN_B = 6
+WDOG  = 50000	# watchdog report interval (usec)
+
+def report(seqno, tick, level, flags=0):
+    return struct.pack(Notify.Notifier.REPORT_FMT, seqno & 0xFFFF, flags,
+                       tick & 0xFFFFFFFF, level)
+
+def press(t, hold_us, release_us):
+    '''
+    return: [(tick, level), ..], end tick
+    '''
+    edges = []
+    edges.append((t, 0))
+    t += hold_us
+    edges.append((t, 1))
+    return edges, t + release_us
+
+def switch_edges():
+    edges = []
+    t = 1000000
+    for hold, release in [(100000, 200000), (100000, 750000),	# clicks
+                          (100000, 1000000), (3500000, 500000),	# long
+                          (8000000, 1000000)]:
+        e, t = press(t, hold, release)
+        edges += e
+    return edges, t
+
+def stream(eventq):
+    ev = []
+    while not eventq.empty():
+        e = eventq.get()
+        ev.append((e.name, e.timeout_idx, e.value, e.push_count, e.tick))
+    return ev
+
+def check_switch(verbose):
+    edges, t_end = switch_edges()
+
+    # one by one: pi.callback()
+    pi = fake_pigpio.FakePi()
+    sw = pigpio_switch.Switch(pi, PIN)
+    q1 = queue.Queue()
+    sw.start(q1)
+    for tick, level in edges:
+        pi.set_level(PIN, level, tick)
+    pi.advance(t_end)
+    calls1 = pi.calls
+
+    # pipe of reports: level changes and periodic watchdog reports
+    reports = []
+    for tick, level in edges:
+        reports.append((tick, level << PIN, 0))
+    for tick in range(edges[0][0] + WDOG, t_end, WDOG):
+        reports.append((tick, 0, Notify.Notifier.NTFY_FLAGS_WDOG | PIN))
+    reports.sort()
+    level = 1 << PIN
+    data = b''
+    for i, (tick, lv, flags) in enumerate(reports):
+        if flags == 0:
+            level = lv
+        data += report(i, tick, level, flags)
+
+    pi = fake_pigpio.FakePi()
+    sw = pigpio_switch.Switch(pi, PIN)
+    r, w = os.pipe()
+    notifier = Notify.Notifier(pi, fd=r)
+    q2 = queue.Queue()
+    sw.start(q2, notifier)
+    notifier.start_notify()
+    os.write(w, report(0, edges[0][0] - 1, 1 << PIN) + data)
+    wait_reports(notifier, len(reports) + 1)
+    notifier.stop()
+    os.close(r)
+    os.close(w)
+    calls2 = pi.calls
+
+    s1 = stream(q1)
+    s2 = stream(q2)
+    if verbose:
+        for e in s1:
+            print('  %s' % (e,))
+        print('  daemon calls: callback %d, notifier %d' % (calls1, calls2))
+    return s1 == s2 and len(s1) > 0
+
+def wait_reports(notifier, n, timeout=5):
+    t_end = time.monotonic() + timeout
+    while notifier.report_count < n and time.monotonic() < t_end:
+        time.sleep(0.01)
+
+def check_decoder(verbose, n=20):
+    pi = fake_pigpio.FakePi()
+    valq = queue.Queue()
+    decoder = QuadratureDecoder(valq)
+    r, w = os.pipe()
+    notifier = Notify.Notifier(pi, fd=r)
+    notifier.add_decoder(PIN_A, PIN_B, decoder)
+    notifier.start_notify()
+
+    steps_a, steps_b = quadrature_wave(n)
+    steps_a2, steps_b2 = quadrature_wave(-n // 2)
+    steps_a += steps_a2
+    steps_b += steps_b2
+    level = (1 << PIN_A) | (1 << PIN_B)
+    data = report(0, 0, level)
+    tick = 0
+    for i, ((dt, a), (dt_, b)) in enumerate(zip(steps_a, steps_b)):
+        tick += int(dt * 1000000)
+        level = (a << PIN_A) | (b << PIN_B)
+        data += report(i + 1, tick, level)
+    os.write(w, data)
+    wait_reports(notifier, len(steps_a) + 1)
+    notifier.stop()
+    os.close(r)
+    os.close(w)
+
+    vals = []
+    while not valq.empty():
+        vals.append(valq.get())
+    cw  = vals.count(RotaryEncoder.CW)
+    ccw = vals.count(RotaryEncoder.CCW)
+    if verbose:
+        print('  cw:%d ccw:%d missed:%d' % (cw, ccw, decoder.missed))
+    return (cw, ccw, decoder.missed) == (n * 2, n // 2 * 2, 0)
+
+def check_stop(verbose):
+    pi = fake_pigpio.FakePi()
+    r, w = os.pipe()
+    notifier = Notify.Notifier(pi, fd=r)
+    notifier.add([PIN], lambda batch: None)
+    notifier.start_notify()
+    time.sleep(0.05)
+    t = threading.Thread(target=notifier.stop, daemon=True)
+    t.start()
+    t.join(2)
+    ok = not t.is_alive()
+    os.close(r)
+    os.close(w)
+    return ok
+
+#####
+CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
+@click.command(context_settings=CONTEXT_SETTINGS)
+@click.option('--verbose', '-v', 'verbose', is_flag=True, default=False,
+              help='print the details')
+def main(verbose):
+    ng = 0
+    for name, check in [('switch', check_switch), ('decoder', check_decoder),
+                        ('stop', check_stop)]:
+        ok = check(verbose)
+        print('%-8s %s' % (name, 'OK' if ok else 'NG'))
+        if not ok:
+            ng += 1
+    sys.exit(1 if ng > 0 else 0)
+
+if __name__ == '__main__':
+    main()
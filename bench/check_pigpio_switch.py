@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+#
+# (C) 2019 Yoichi Tanibayashi
+#
+'''
+pigpio/Switch.py check (fake pigpio.pi, no daemon)
+
+The same presses are given to the pigpio Switch (edges and watchdog
+timeouts of FakePi) and to ../Switch.py (polling, sim backend), and
+the event streams (name, timeout_idx, value, push_count) must be the
+same. The glitch filter and the watchdog (cleared by end()) are also
+checked.
+
+    check_pigpio_switch.py        # exit status 1 on failure
+'''
+import os
+import sys
+TOP = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, TOP)
+
+import fake_pigpio
+fake_pigpio.install()
+import importlib.util
+import queue
+
+import GpioBackend
+from Switch import Switch, SwitchListener
+
+import click
+
+def load(name, path):
+    '''
+    load a module of pigpio/ (its names clash with the top directory)
+    '''
+    spec = importlib.util.spec_from_file_location(name, path)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+PigpioSwitch = load('PigpioSwitch', os.path.join(TOP, 'pigpio', 'Switch.py'))
+
+PIN = 17
+
+# name -> [(hold sec, release sec), ..]
+SCENARIO = {
+    'click':        [(0.1, 1)],
+    'double-click': [(0.1, 0.2), (0.1, 1)],
+    'click-0.85':   [(0.1, 0.75), (0.1, 1)],
+    'long-press':   [(5.5, 1)],
+    'long-long':    [(8, 1), (0.1, 1)],
+    'triple-long':  [(0.05, 0.1), (0.05, 0.1), (0.05, 2), (1.2, 1)]
+}
+
+def by_pigpio(presses):
+    pi = fake_pigpio.FakePi()
+    sw = PigpioSwitch.Switch(pi, PIN, glitch_usec=5000)
+    q = queue.Queue()
+    sw.start(q)
+
+    tick = 1000000
+    for hold, release in presses:
+        pi.set_level(PIN, 0, tick)
+        tick += int(hold * 1000000)
+        pi.set_level(PIN, 1, tick)
+        tick += int(release * 1000000)
+    pi.advance(tick + 10000000)
+    sw.end()
+
+    ev = []
+    while not q.empty():
+        e = q.get()
+        ev.append((e.name, e.timeout_idx, e.value, e.push_count))
+    ok = (pi.glitch.get(PIN) == 5000 and PIN not in pi.watchdog and
+          len(pi.cb[PIN]) == 0)
+    return ev, ok
+
+def by_polling(presses):
+    gpio = GpioBackend.set_backend('sim')
+    ev = []
+    sl = SwitchListener([Switch(PIN)], ev.append)
+    gpio.run(0.1)
+    steps = []
+    for hold, release in presses:
+        steps += [(hold, 0), (release, 1)]
+    gpio.waveform(PIN, steps)
+    gpio.run(sum([h + r for h, r in presses]) + 10)
+    return [(e.name, e.timeout_idx, e.value, e.push_count) for e in ev]
+
+#####
+CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
+@click.command(context_settings=CONTEXT_SETTINGS)
+@click.option('--verbose', '-v', 'verbose', is_flag=True, default=False,
+              help='print the streams')
+def main(verbose):
+    ng = 0
+    for name, presses in SCENARIO.items():
+        ev1, ok = by_pigpio(presses)
+        ev2 = by_polling(presses)
+        ok = ok and ev1 == ev2
+        print('%-13s %s' % (name, 'OK' if ok else 'NG'))
+        if not ok or verbose:
+            print('  pigpio : %s' % ev1)
+            print('  polling: %s' % ev2)
+        if not ok:
+            ng += 1
+    sys.exit(1 if ng > 0 else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+#
+# (C) 2019 Yoichi Tanibayashi
+#
+'''
+LedStrip.py check (sim backend, SPI bytes captured by SimSpi)
+
+  ws2812: the bytes written to SimSpi decode (decode_ws2812()) back
+          to fb for every color order, every SPI bit group is 100 or
+          110, and the frame ends with the reset (low)
+  chain : the bytes written to SimSpi are shifted through a model of
+          a 74HC595 chain (MSB first, SPI mode 0), and output i of the
+          model must be set(i) / bit i of set_bits()
+  bufsiz: SpidevSpi refuses a frame longer than the spidev bufsiz
+
+    check_strip.py        # exit status 1 on failure
+'''
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..'))
+
+import GpioBackend
+from GpioBackend import SpidevSpi
+from LedStrip import WS2812Strip, ShiftRegisterChain, decode_ws2812
+import random
+
+import click
+
+def check_ws2812(verbose, n=60):
+    rnd = random.Random(1)
+    ok = True
+    for order in ['GRB', 'RGB', 'BRG']:
+        GpioBackend.set_backend('sim')
+        strip = WS2812Strip(n, order=order)
+        px = [tuple(rnd.randrange(256) for c in range(3)) for i in range(n)]
+        for i, (r, g, b) in enumerate(px):
+            strip.set_pixel(i, r, g, b)
+        strip.show()
+        buf = strip.spi.frames[-1][1]
+
+        c = [dict(zip('RGB', p)) for p in px]
+        wire = bytes([c[i][ch] for i in range(n) for ch in order])
+        ok1 = decode_ws2812(buf) == wire == bytes(strip.fb)
+
+        bits = int.from_bytes(buf[:n * 9], 'big')
+        ok1 = ok1 and all([bits >> j & 0b101 == 0b100
+                           for j in range(0, n * 72, 3)])
+        n_reset = len(buf) - n * 9
+        ok1 = ok1 and buf[n * 9:] == bytes(n_reset) and \
+            n_reset * 8 / strip.SPEED_HZ * 1000000 >= strip.RESET_US
+
+        strip.close()
+        ok1 = ok1 and decode_ws2812(strip.spi.frames[-1][1]) == bytes(n * 3)
+        if verbose:
+            print('  %s: %d bytes, reset %d bytes: %s' % (order, len(buf),
+                                                         n_reset, ok1))
+        ok = ok and ok1
+    return ok
+
+def shift_595(n_chips, buf):
+    '''
+    74HC595 chain: SER of chip 0 is MOSI, Q7' -> SER of the next chip
+
+    return: [Q0 of chip 0, .., Q7 of chip n_chips - 1] after RCLK
+    '''
+    q = [0] * (n_chips * 8)
+    for v in buf:
+        for j in range(7, -1, -1):	# MSB first
+            q = [v >> j & 1] + q[:-1]
+    return q
+
+def check_chain(verbose, n_chips=4):
+    GpioBackend.set_backend('sim')
+    rnd = random.Random(2)
+    chain = ShiftRegisterChain(n_chips)
+    n = len(chain)
+
+    ok = True
+    want = [0] * n
+    for k in range(50):
+        i = rnd.randrange(n)
+        want[i] = rnd.randrange(2)
+        chain.set(i, want[i])
+        chain.show()
+        got = shift_595(n_chips, chain.spi.frames[-1][1])
+        ok = ok and got == want and \
+            [chain.get(j) for j in range(n)] == want
+
+    bits = rnd.getrandbits(n)
+    chain.set_bits(bits)
+    chain.show()
+    got = shift_595(n_chips, chain.spi.frames[-1][1])
+    ok = ok and got == [bits >> j & 1 for j in range(n)]
+
+    try:
+        chain.set(n, 1)
+        ok = False
+    except IndexError:
+        pass
+
+    chain.close()
+    ok = ok and shift_595(n_chips, chain.spi.frames[-1][1]) == [0] * n
+    if verbose:
+        print('  %d outputs, %d frames: %s' % (n, len(chain.spi.frames), ok))
+    return ok
+
+class CaptureSpi:
+    def __init__(self):
+        self.writes = []
+
+    def writebytes2(self, buf):
+        self.writes.append(len(buf))
+
+def check_bufsiz(verbose):
+    spi = SpidevSpi.__new__(SpidevSpi)	# no /dev/spidev
+    spi.spi    = CaptureSpi()
+    spi.bufsiz = SpidevSpi.BUFSIZ
+
+    GpioBackend.set_backend('sim')
+    ok = True
+    for n, fit in [(445, True), (446, False)]:
+        strip = WS2812Strip(n)
+        try:
+            spi.write(strip.encode())
+            ok = ok and fit
+        except ValueError as e:
+            ok = ok and not fit
+            if verbose:
+                print('  %d LEDs: %s' % (n, e))
+    return ok and spi.spi.writes == [445 * 9 + 91]
+
+#####
+CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
+@click.command(context_settings=CONTEXT_SETTINGS)
+@click.option('--verbose', '-v', 'verbose', is_flag=True, default=False,
+              help='print the details')
+def main(verbose):
+    ng = 0
+    for name, check in [('ws2812', check_ws2812), ('chain', check_chain),
+                        ('bufsiz', check_bufsiz)]:
+        ok = check(verbose)
+        print('%-7s %s' % (name, 'OK' if ok else 'NG'))
+        if not ok:
+            ng += 1
+    sys.exit(1 if ng > 0 else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+#
+# (C) 2019 Yoichi Tanibayashi
+#
+'''
+stand-in for the pigpio module (no daemon, for the checks)
+
+    import fake_pigpio
+    fake_pigpio.install()       # sys.modules['pigpio']
+    pi = fake_pigpio.FakePi()
+    sw = Switch(pi, 17)         # pigpio/Switch.py
+    pi.set_level(17, 0, tick)   # callbacks of the edge
+    pi.advance(tick)            # watchdog timeouts until tick
+
+FakePi: the pins, pi.callback(), set_watchdog() (level=TIMEOUT) and
+the notification handles. The ticks are given by the caller.
+'''
+import sys
+
+# pigpio.py
+INPUT        = 0
+OUTPUT       = 1
+PUD_OFF      = 0
+PUD_DOWN     = 1
+PUD_UP       = 2
+RISING_EDGE  = 0
+FALLING_EDGE = 1
+EITHER_EDGE  = 2
+TIMEOUT      = 2
+
+def install():
+    '''
+    use this module as pigpio
+    '''
+    sys.modules['pigpio'] = sys.modules[__name__]
+
+class FakeCallback:
+    def __init__(self, pi, pin, func):
+        self.pi   = pi
+        self.pin  = pin
+        self.func = func
+
+    def cancel(self):
+        if self in self.pi.cb.get(self.pin, []):
+            self.pi.cb[self.pin].remove(self)
+
+class FakePi:
+    connected = True
+
+    def __init__(self):
+        self.level    = {}	# pin -> level
+        self.cb       = {}	# pin -> [FakeCallback, ..]
+        self.watchdog = {}	# pin -> tick of the timeout
+        self.glitch   = {}	# pin -> usec
+        self.tick     = 0
+        self.notify   = {}	# handle -> bits
+        self.calls    = 0	# calls to the daemon (socket round trips)
+
+    def set_mode(self, pin, mode):
+        self.calls += 1
+
+    def set_pull_up_down(self, pin, pud):
+        self.calls += 1
+        self.level[pin] = 1 if pud == PUD_UP else 0
+
+    def set_glitch_filter(self, pin, usec):
+        self.calls += 1
+        self.glitch[pin] = usec
+
+    def read(self, pin):
+        self.calls += 1
+        return self.level.get(pin, 0)
+
+    def callback(self, pin, edge, func):
+        self.calls += 1
+        cb = FakeCallback(self, pin, func)
+        self.cb.setdefault(pin, []).append(cb)
+        return cb
+
+    def set_watchdog(self, pin, ms):
+        self.calls += 1
+        if ms == 0:
+            self.watchdog.pop(pin, None)
+            return
+        self.watchdog[pin] = (self.tick + ms * 1000) & 0xFFFFFFFF
+
+    def advance(self, tick):
+        '''
+        call back (level=TIMEOUT) the watchdogs that expire until tick
+        (ticks: no wrap around)
+        '''
+        while True:
+            due = [(t, p) for p, t in self.watchdog.items() if t <= tick]
+            if len(due) == 0:
+                break
+            t, pin = min(due)
+            del self.watchdog[pin]
+            self.tick = t
+            for cb in list(self.cb.get(pin, [])):
+                cb.func(pin, TIMEOUT, t)
+        self.tick = tick
+
+    def set_level(self, pin, level, tick):
+        self.advance(tick)
+        if self.level.get(pin) == level:
+            return
+        self.level[pin] = level
+        for cb in list(self.cb.get(pin, [])):
+            cb.func(pin, level, tick)
+
+    def notify_open(self):
+        h = len(self.notify)
+        self.notify[h] = 0
+        return h
+
+    def notify_begin(self, handle, bits):
+        self.notify[handle] = bits
+
+    def notify_close(self, handle):
+        self.notify.pop(handle, None)
+
+    def stop(self):
+        pass
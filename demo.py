@@ -2,9 +2,8 @@
 #
 # (c) 2019 Yoichi Tanibayashi
 
-import RPi.GPIO as GPIO
-from Led import Led
-from Switch import Switch, SwitchListener
+from Led import Led, LedPattern, LEVEL_MAX
+from Switch import Switch, SwitchListener, setup_GPIO, cleanup_GPIO
 import time
 import click
 
@@ -17,11 +16,14 @@ class demo:
         self.pin_sw  = pin_sw
 
         self.long_press = [
-            {'timeout':0.7, 'blink':{'on':1,    'off':0}},	# multi click
-            {'timeout':1,   'blink':{'on':0.2,  'off':0.04}},	# blink1
-            {'timeout':3,   'blink':{'on':0.1,  'off':0.04}},	# blink2
-            {'timeout':5,   'blink':{'on':0.02, 'off':0.04}},	# blink3
-            {'timeout':7,   'blink':{'on':0,    'off':0}}]	# end
+            {'timeout':0.7, 'pattern':None},			# multi click
+            {'timeout':1,   'pattern':LedPattern.blink(0.2, 0.04)},
+            {'timeout':3,   'pattern':LedPattern.heartbeat(120)},
+            {'timeout':5,   'pattern':LedPattern.morse('SOS', 0.06)},
+            {'timeout':7,   'pattern':None}]			# end
+
+        # マルチクリック回数の表示: 1回分
+        self.click_pattern = LedPattern([(0, 0.4), (LEVEL_MAX, 0.4)])
 
         self.timeout_sec = []
         for i in range(len(self.long_press)):
@@ -55,29 +57,18 @@ class demo:
 
             if idx == 0:		# マルチクリック回数確定
                 if event.value == Switch.OFF:
-                    self.led.off()
-                    for i in range(event.push_count):
-                        time.sleep(0.4)
-                        self.led.on()
-                        time.sleep(0.4)
-                        self.led.off()
+                    # コールバックの中で sleep しない
+                    self.led.play(self.click_pattern,
+                                  repeat=event.push_count)
 
             if idx >= 1:		# 長押し
                 if idx < len(self.long_press) - 1:
-                    self.led.off()
-                    self.led.blink(self.long_press[idx]['blink']['on'],
-                                   self.long_press[idx]['blink']['off'])
+                    self.led.play(self.long_press[idx]['pattern'],
+                                  repeat=None)
                 else:
                     self.led.off()
                     self.active = False
 
-def setup_GPIO():
-    GPIO.setwarnings(False)
-    GPIO.setmode(GPIO.BCM)
-
-def cleanup_GPIO():
-    GPIO.cleanup()
-
 CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
 @click.command(context_settings=CONTEXT_SETTINGS)
 @click.option('--led',    '-l', 'pin_led', type=int, default=26,
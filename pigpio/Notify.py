@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+#
+# (C) 2019 Yoichi Tanibayashi
+#
+'''
+Bulk edge stream from the pigpio notification pipe
+
+One thread reads the 12 byte reports (seqno, flags, tick, level) of
+all the pins from /dev/pigpioN in large chunks, decodes them with
+struct.iter_unpack(), and passes the changes to the switches and the
+other state machines in batches, instead of one socket round trip
+and one Python callback per edge.
+
+    notifier = Notifier(pi)
+    sl = SwitchListener(switches, cb, notifier=notifier)
+    notifier.add([pin_a, pin_b], cb_batch) # cb_batch([(tick, level), ..])
+    notifier.add_decoder(pin_a, pin_b, decoder) # RotaryEncoder.py
+    notifier.start_notify()
+'''
+import pigpio
+from Switch import tick_diff
+import threading
+import select
+import struct
+import time
+import os
+
+import click
+
+from logging import getLogger, StreamHandler, Formatter, DEBUG, INFO, WARN
+logger = getLogger(__name__)
+logger.setLevel(DEBUG)
+console_handler = StreamHandler()
+console_handler.setLevel(DEBUG)
+handler_fmt = Formatter(
+    '%(asctime)s %(levelname)s %(name)s.%(funcName)s()> %(message)s',
+    datefmt='%H:%M:%S')
+console_handler.setFormatter(handler_fmt)
+logger.addHandler(console_handler)
+logger.propagate = False
+def get_logger(name, debug=False):
+    l = logger.getChild(name)
+    if debug:
+        l.setLevel(DEBUG)
+    else:
+        l.setLevel(INFO)
+
+    return l
+
+#####
+class Notifier(threading.Thread):
+    '''
+    stop(): Don't forget to call stop() when finished
+
+    add_switch(sw)     : sw.cb_batch(pin, [(level, tick), ..]) is
+                         called once per read with the edges and the
+                         watchdog timeouts (level=pigpio.TIMEOUT) of
+                         sw.pin
+    add(pins, cb_batch): cb_batch([(tick, level), ..]) is called with
+                         the reports in which any of pins changed
+                         (level: all the pins, bit n = GPIO n)
+    add_decoder(pin_a, pin_b, decoder):
+                         decoder.update((A << 1) | B, now) for every
+                         change of the 2 pins, in the reader thread
+                         (e.g. RotaryEncoder.QuadratureDecoder)
+                         now: time(ns) from the ticks
+    start_notify()     : start notification of the added pins
+
+    fd: the pipe is read only when it is readable, and stop() wakes
+        up the reader with a self-pipe, so any fd can be given.
+    '''
+    REPORT_FMT  = '<HHII'	# seqno, flags, tick, level
+    REPORT_SIZE = struct.calcsize(REPORT_FMT)
+
+    # pigpio.h
+    NTFY_FLAGS_EVENT = 1 << 7
+    NTFY_FLAGS_ALIVE = 1 << 6
+    NTFY_FLAGS_WDOG  = 1 << 5
+    NTFY_FLAGS_GPIO  = 31
+
+    def __init__(self, pi, chunk=1024, fd=None, debug=False):
+        '''
+        chunk: max number of reports per read
+        fd   : notification pipe (default: open /dev/pigpioN)
+        '''
+        self.debug = debug
+        self.logger = get_logger(__class__.__name__, self.debug)
+        self.logger.debug('chunk=%d', chunk)
+
+        self.pi     = pi
+        self.chunk  = chunk
+        self.handle = None
+        if fd is None:
+            self.handle = self.pi.notify_open()
+            fd = os.open('/dev/pigpio%d' % self.handle, os.O_RDONLY)
+        self.fd = fd
+
+        self.bits    = 0
+        self.switch  = {}	# pin -> [sw, ..]
+        self.batch   = []	# [mask, cb_batch]
+        self.decoder = []	# [pin_a, pin_b, decoder]
+        self.level   = None
+        self.tick    = None	# last tick
+        self.tick_ns = 0	# ticks in ns (no wrap around)
+        self.report_count = 0
+
+        self.wake_r, self.wake_w = os.pipe()
+        self.poll = select.poll()
+        self.poll.register(self.wake_r, select.POLLIN)
+        self.poll.register(self.fd, select.POLLIN)
+
+        self.loop_flag = True
+        super().__init__(daemon=True)
+
+    def add_switch(self, sw):
+        self.logger.debug('pin=%d', sw.pin)
+        self.switch.setdefault(sw.pin, []).append(sw)
+        self.bits |= 1 << sw.pin
+
+    def add(self, pins, cb_batch):
+        self.logger.debug('pins=%s', pins)
+        mask = 0
+        for p in pins:
+            mask |= 1 << p
+        self.batch.append([mask, cb_batch])
+        self.bits |= mask
+
+    def add_decoder(self, pin_a, pin_b, decoder):
+        self.logger.debug('pin_a=%d, pin_b=%d', pin_a, pin_b)
+        self.decoder.append([pin_a, pin_b, decoder])
+        self.bits |= (1 << pin_a) | (1 << pin_b)
+
+    def start_notify(self):
+        self.logger.debug('bits=%08X', self.bits)
+        if self.handle is not None:
+            self.pi.notify_begin(self.handle, self.bits)
+        if not self.is_alive():
+            self.start()
+
+    def run(self):
+        self.logger.debug('start')
+
+        buf = b''
+        while self.loop_flag:
+            fds = [fd for fd, ev in self.poll.poll()]
+            if self.wake_r in fds:
+                break
+            data = os.read(self.fd, self.REPORT_SIZE * self.chunk)
+            if len(data) == 0:
+                break
+
+            buf += data
+            n = len(buf) - len(buf) % self.REPORT_SIZE
+            self.reports(struct.iter_unpack(self.REPORT_FMT, buf[:n]))
+            buf = buf[n:]
+
+        self.logger.debug('end')
+
+    def reports(self, reports):
+        '''
+        reports: [(seqno, flags, tick, level), ..]
+        '''
+        batch = [[] for b in self.batch]
+        sw_batch = {}	# pin -> [(level, tick), ..]
+        for seqno, flags, tick, level in reports:
+            self.report_count += 1
+
+            if self.tick is not None:
+                self.tick_ns += tick_diff(self.tick, tick) * 1000
+            self.tick = tick
+
+            if flags != 0:
+                if flags & self.NTFY_FLAGS_WDOG:
+                    pin = flags & self.NTFY_FLAGS_GPIO
+                    if pin in self.switch:
+                        sw_batch.setdefault(pin, []).append(
+                            (pigpio.TIMEOUT, tick))
+                continue
+
+            if self.level is None:
+                self.level = level ^ self.bits	# all pins changed
+            changed = (level ^ self.level) & self.bits
+            self.level = level
+            if changed == 0:
+                continue
+
+            for i, (mask, cb_batch) in enumerate(self.batch):
+                if changed & mask:
+                    batch[i].append((tick, level))
+
+            for pin_a, pin_b, decoder in self.decoder:
+                if changed >> pin_a & 1 or changed >> pin_b & 1:
+                    decoder.update((level >> pin_a & 1) << 1 |
+                                   (level >> pin_b & 1), self.tick_ns)
+
+            for pin in self.switch:
+                if changed >> pin & 1:
+                    sw_batch.setdefault(pin, []).append((level >> pin & 1,
+                                                         tick))
+
+        for i, (mask, cb_batch) in enumerate(self.batch):
+            if len(batch[i]) > 0:
+                cb_batch(batch[i])
+
+        for pin, changes in sw_batch.items():
+            for sw in self.switch[pin]:
+                sw.cb_batch(pin, changes)
+
+    def stop(self):
+        self.logger.debug('')
+        self.loop_flag = False
+        os.write(self.wake_w, b'w')
+        if self.handle is not None:
+            self.pi.notify_close(self.handle)
+        self.join()
+        if self.handle is not None:
+            os.close(self.fd)	# opened by __init__()
+        os.close(self.wake_r)
+        os.close(self.wake_w)
+        self.logger.debug('join()')
+
+#####
+class app:
+    def __init__(self, pi, pin, debug=False):
+        self.debug = debug
+        self.logger = get_logger(__class__.__name__, self.debug)
+        self.logger.debug('pin=%s', str(pin))
+
+        self.pi  = pi
+        self.pin = pin
+
+        self.count   = 0
+        self.t_start = None
+
+    def main(self):
+        for p in self.pin:
+            self.pi.set_mode(p, pigpio.INPUT)
+            self.pi.set_pull_up_down(p, pigpio.PUD_UP)
+
+        notifier = Notifier(self.pi, debug=self.debug)
+        notifier.add(self.pin, self.cb_batch)
+        notifier.start_notify()
+
+        print('Ready: pin=%s' % str(self.pin))
+        try:
+            while True:
+                time.sleep(1)
+                print('reports:%d, changes:%d' %
+                      (notifier.report_count, self.count))
+        finally:
+            notifier.stop()
+
+    def cb_batch(self, batch):
+        self.count += len(batch)
+        if self.t_start is None:
+            self.t_start = batch[0][0]
+        tick, level = batch[-1]
+        self.logger.debug('%d changes, +%d us, level=%08X',
+                          len(batch), tick_diff(self.t_start, tick), level)
+
+#####
+CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
+@click.command(context_settings=CONTEXT_SETTINGS)
+@click.argument('pin', metavar='<pin>', type=int, nargs=-1)
+@click.option('--debug', '-d', 'debug', is_flag=True, default=False,
+              help='debug flag')
+def main(pin, debug):
+    logger.setLevel(INFO)
+    if debug:
+        logger.setLevel(DEBUG)
+
+    pi = pigpio.pi()
+    try:
+        app(pi, pin, debug=debug).main()
+    finally:
+        pi.stop()
+
+if __name__ == '__main__':
+    main()
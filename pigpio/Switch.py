@@ -2,6 +2,17 @@
 #
 # (C) 2018 Yoichi Tanibayashi
 #
+'''
+Switch with pigpio
+
+The same events as ../Switch.py (pressed, released, timer:
+multi-click and long-press levels), without any polling thread.
+
+  debounce: set_glitch_filter() in the pigpio daemon
+  timing  : ticks (usec) of the pigpio callbacks
+  timer   : set_watchdog() ... the daemon calls back with
+            level=pigpio.TIMEOUT when the next timeout comes
+'''
 import pigpio
 import threading
 import queue
@@ -29,72 +40,245 @@ def get_logger(name, debug=False):
 
     return l
 
+def tick_diff(t1, t2):
+    '''
+    t2 - t1 (usec), tick wraps around every 2**32 usec
+    '''
+    return (t2 - t1) & 0xFFFFFFFF
+
 #####
-class SwitchListener:
-    def __init__(self, debug=False):
+class SwitchListener(threading.Thread):
+    '''
+    stop(): Don't forget to call stop() when finished
+
+    callback function: cb_func(event) ... event: SwitchEvent class
+
+    The events come from the pigpio callbacks of the switches
+    (or from notifier: Notify.Notifier), and cb_func is called in
+    this thread.
+    '''
+    def __init__(self, switch, cb_func, notifier=None, debug=False):
         self.debug = debug
-        self.logger = get_logger(self.__name__, self.debug)
+        self.logger = get_logger(__class__.__name__, self.debug)
         self.logger.debug('')
 
-        super().__init__()
+        self.switch  = switch
+        self.cb_func = cb_func
+
+        self.eventq = queue.Queue()
+        for sw in self.switch:
+            sw.start(self.eventq, notifier)
+
+        super().__init__(daemon=True)
+        self.start()
 
     def run(self):
-        self.logger.debug('')
-        
+        self.logger.debug('start')
         while True:
-            pass
+            event = self.eventq.get()
+            if event == SwitchEvent.NULL:
+                break
+            self.cb_func(event)
+        self.logger.debug('end')
 
-    def _send_msg(self, msg):
+    def stop(self):
         self.logger.debug('')
+        for sw in self.switch:
+            sw.end()
+        self.eventq.put(SwitchEvent.NULL)
+        self.join()
+        self.logger.debug('join()')
 
-    def send(self, msg_type, msg_data):
-        self.logger.debug('msg_type:%s, msg_data:%s', msg_type, msg_data)
-        msg = {'type': msg_type, 'data':msg_data}
-        _send_msg(msg)
+#####
+class SwitchEvent:
+    '''
+    read-only record
+
+    tick: pigpio tick(usec) when the change was detected
+          (or the timeout for 'timer')
+    '''
+    __slots__ = ('pin', 'name', 'timeout_idx', 'value', 'push_count',
+                 'tick')
+
+    NULL = 0
+
+    def __init__(self, pin, name, timeout_idx, value, push_count, tick):
+        self.pin         = pin
+        self.name        = name
+        self.timeout_idx = timeout_idx
+        self.value       = value
+        self.push_count  = push_count
+        self.tick        = tick
+
+    def click_count(self):
+        if self.name != 'timer':
+            return 0
+        if self.timeout_idx != 0:
+            return 0
+        if self.value == Switch.ON:
+            return 0
+        return self.push_count
+
+    def longpress_level(self):
+        if self.name != 'timer':
+            return 0
+        if self.value == Switch.OFF:
+            return 0
+        return self.timeout_idx
+
+    def print(self):
+        print('pin: %d' % self.pin)
+        print('  name       : %s' % self.name)
+        print('  timeout_idx: %d' % self.timeout_idx)
+        print('  value      : %s' % Switch.VAL2STR[self.value])
+        print('  push_count : %d' % self.push_count)
+        print('  tick       : %d' % self.tick)
 
-    def end(self):
-        self.logger.debug('')
-        self.send_msg
-        
-        
 #####
 class Switch:
+    '''
+    timeout_sec[0]  timeout(sec) for multi-click
+    timeout_sec[1:] timeouts(sec) for long-press (long-long-press ..)
+    glitch_usec     level must be steady for this time (debounce)
+    '''
     ON      = 0
     OFF     = 1
     VAL2STR = ['ON', 'OFF']
 
-    def __init__(self, pi, pin, debug=False):
+    WATCHDOG_MAX = 60000	# msec
+
+    def __init__(self, pi, pin, timeout_sec=[0.7, 1, 3, 5, 7],
+                 glitch_usec=10000, debug=False):
         self.debug = debug
         self.logger = get_logger(__class__.__name__, self.debug)
 
-        self.pi  = pi
-        self.pin = pin
+        self.pi          = pi
+        self.pin         = pin
+        self.timeout_sec = timeout_sec
+        self.timeout_us  = [int(t * 1000000) for t in timeout_sec]
         self.logger.debug('pin = %s', self.pin)
+        self.logger.debug('timeout_sec = %s', self.timeout_sec)
 
         self.pi.set_mode(self.pin, pigpio.INPUT)
         self.pi.set_pull_up_down(self.pin, pigpio.PUD_UP)
-        self.cb = self.pi.callback(self.pin, pigpio.EITHER_EDGE, self.cb_func)
+        self.pi.set_glitch_filter(self.pin, glitch_usec)
 
-        self.now_sec = time.time()
+        self.eventq      = None
+        self.cb          = None
+        self.onoff       = self.get()
+        self.push_count  = 0
+        self.timeout_idx = -1
+        self.start_tick  = 0
 
     def get(self):
         return self.pi.read(self.pin)
 
+    def start(self, eventq, notifier=None):
+        '''
+        start the callback. SwitchEvents are put to eventq
+
+        notifier: Notify.Notifier ... cb_batch() is called from the
+                  notification pipe reader, instead of pi.callback()
+        '''
+        self.logger.debug('')
+        self.eventq = eventq
+        if notifier is not None:
+            notifier.add_switch(self)
+            return
+        self.cb = self.pi.callback(self.pin, pigpio.EITHER_EDGE,
+                                   self.cb_func)
+
     def cb_func(self, pin, val, tick):
         self.logger.debug('pin=%d, val=%d, tick=%d', pin, val, tick)
 
-        if time.time() - self.now_sec < 0.01:
+        if val == pigpio.TIMEOUT:
+            self.expire(tick)
+        else:
+            self.update(val, tick)
+        self.set_watchdog(tick)
+
+    def cb_batch(self, pin, changes):
+        '''
+        changes: [(val, tick), ..] from Notify.Notifier
+        The watchdog is set once for the batch.
+        '''
+        self.logger.debug('pin=%d, %d changes', pin, len(changes))
+
+        for val, tick in changes:
+            if val == pigpio.TIMEOUT:
+                self.expire(tick)
+            else:
+                self.update(val, tick)
+        self.set_watchdog(changes[-1][1])
+
+    def update(self, onoff, tick):
+        if onoff == self.OFF:
+            if self.timeout_idx != 0:
+                self.push_count = 0 # push_countクリア
+            if self.timeout_idx >= 1:
+                self.timeout_idx = -1 # タイマーストップ
+
+        if onoff == self.onoff:
+            return
+        self.onoff = onoff
+
+        if onoff == self.ON: # pressed
+            self.push_count += 1
+            if self.push_count == 1 and len(self.timeout_us) > 0:
+                self.start_tick  = tick
+                self.timeout_idx = 0
+            self.put_event('pressed', tick)
+        else: # released
+            self.put_event('released', tick)
+
+        self.expire(tick)
+
+    def expire(self, tick):
+        '''
+        put 'timer' events of the expired timeouts
+        '''
+        while self.timeout_idx >= 0:
+            tout = self.timeout_us[self.timeout_idx]
+            if tick_diff(self.start_tick, tick) < tout:
+                break
+
+            self.put_event('timer', (self.start_tick + tout) & 0xFFFFFFFF)
+            self.timeout_idx += 1
+            if self.timeout_idx >= len(self.timeout_us):
+                self.timeout_idx = -1
+
+        if self.onoff == self.OFF and self.timeout_idx >= 1:
+            self.push_count  = 0
+            self.timeout_idx = -1
+
+    def set_watchdog(self, tick):
+        '''
+        the daemon calls back (level=TIMEOUT) at the next timeout
+        '''
+        if self.timeout_idx < 0:
+            self.pi.set_watchdog(self.pin, 0)
             return
-        
-        self.now_sec = time.time()
 
-        print('%d: %s' % (pin, self.VAL2STR[val]))
+        remain = (self.timeout_us[self.timeout_idx] -
+                  tick_diff(self.start_tick, tick))
+        ms = min(max((remain + 999) // 1000, 1), self.WATCHDOG_MAX)
+        self.pi.set_watchdog(self.pin, ms)
+
+    def put_event(self, name, tick):
+        self.logger.debug('%s', name)
+        if self.eventq is None:
+            return
+        self.eventq.put(SwitchEvent(self.pin, name, self.timeout_idx,
+                                    self.onoff, self.push_count, tick))
 
     def end(self):
         self.logger.debug('')
-        cb.cancel()
-        
-        
+        self.pi.set_watchdog(self.pin, 0)
+        if self.cb is not None:
+            self.cb.cancel()
+            self.cb = None
+
+
 #####
 class app:
     def __init__(self, pi, pin, debug=False):
@@ -109,19 +293,21 @@ class app:
         for p in self.pin:
             sw.append(Switch(self.pi, p, debug=self.debug))
 
-        #sl = SwitchListener(self.pi, sw, self.cb, debug=debug)
+        self.sl = SwitchListener(sw, self.cb, debug=debug)
 
     def main(self):
         self.logger.debug('')
-        
+
         if len(self.pin) < 1:
             print('no pin')
             return
-        
+
         print('Ready: pin=%s' % str(self.pin))
-        while True:
-            print()
-            time.sleep(3)
+        try:
+            while True:
+                time.sleep(3)
+        finally:
+            self.sl.stop()
 
     def cb(self, event):
         event.print()
@@ -138,7 +324,7 @@ def main(pin, debug):
         logger.setLevel(DEBUG)
 
     logger.debug('pin=%s', pin)
-    
+
     pi = pigpio.pi()
     try:
         app(pi, pin, debug=debug).main()